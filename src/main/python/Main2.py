@@ -3,6 +3,7 @@ from config.default_config import (mixture_sample_index, calculate_type, to_link
     main_LABELS, main_gradeEnabled)
 
 import reader
+import feature_store
 import statistics
 import numpy as np
 import math
@@ -10,7 +11,7 @@ import normal5
 import csv
 import os
 import datetime
-from functools import reduce
+from functools import reduce, lru_cache
 from zsh_methods import get_mx, diameter_gap_average, area_gap, physics_gap
 
 # 参与计算的标志
@@ -44,8 +45,10 @@ def calculate_mean_and_variance(rawDistributions=None,show_figure=True):
         if len(data)==0:
             distributions.append([0, 0,0])
             continue
+        # 所有图片的颗粒值拼接为一维数组（特征存储直接内存映射读取）
+        values = reader.flat_values(data, prop)
         if show_figure:
-            datas.append([item for sublist in data[prop] for item in sublist])
+            datas.append(values.tolist())
         # for imageIndex in range(5): 
         #     sum = 0
         #     cout = 0
@@ -53,31 +56,14 @@ def calculate_mean_and_variance(rawDistributions=None,show_figure=True):
         #         sum += np.sum(data[prop][i])
         #         cout += len(data[prop][i])            
         #     print(sum/cout)
-        sum = 0
-        cout = 0
-        varianceSum=0
-
         if distributions == None:
-            for i in range(0,len(data[prop])):
-                sum += np.sum(data[prop][i])
-                cout += len(data[prop][i])    
-            mean = sum/cout    
-            for i in range(0,len(data[prop])):
-                varianceSum += np.sum((x - mean)**2 for x in data[prop][i])
+            selected = values
         else:
             normalRange=(rawDistributions[j][0]- rawDistributions[j][1]*1.5,rawDistributions[j][0] + rawDistributions[j][1]*1.5)
-            for i in range(0,len(data[prop])):
-                for v in data[prop][i]:
-                    if v >= normalRange[0]  and v <=normalRange[1]  :                   
-                        sum += v
-                        cout += 1  
-            mean = sum/cout    
-            for i in range(0,len(data[prop])):
-                for v in data[prop][i]:
-                    if v >= normalRange[0]  and v <=normalRange[1]  :                  
-                        varianceSum += (v - mean)**2 
-
-        variance = varianceSum/cout
+            selected = values[(values >= normalRange[0]) & (values <= normalRange[1])]
+        cout = len(selected)
+        mean = np.sum(selected)/cout
+        variance = np.sum((selected - mean)**2)/cout
 
         distributions.append([mean, math.sqrt(variance),cout])
 
@@ -100,40 +86,21 @@ def calculate_sample_mean_and_variance(sampleIndex,show_figure=True):
     # prop = "area_list"
     # prop = "volume_list"
     prop =  "l_short_list" if view=="local" else "g_short_list"
-    sum = 0
-    cout = 0
-    varianceSum=0
+    values = []
     for fileIndex in range(1,100):
         file_path =fr"{data_path}/mixture/sample{sampleIndex}/value{fileIndex}.txt"
-        if not os.path.exists(file_path):        
+        if not feature_store.dataset_exists(file_path):
             break  
         data =  reader.load_dict_from_file(file_path) 
         # data =  reader.parse_txt_to_dict("/Users/chuanyunxu/Documents/DDD/workspace/Work/2025/09 砂级配/张世豪-砂级配实验数据/data_text/single/local/"+singleLoc+".txt")
-
-        # for imageIndex in range(5): 
-        #     sum = 0
-        #     cout = 0
-        #     for i in range(imageIndex,len(data[prop]),5):
-        #         sum += np.sum(data[prop][i])
-        #         cout += len(data[prop][i])            
-        #     print(sum/cout)
-
-        for i in range(0,len(data[prop])):
-            sum += np.sum(data[prop][i])
-            cout += len(data[prop][i])    
-    mean = sum/cout    
-    for fileIndex in range(1,100):
-        file_path =fr"{data_path}/mixture/sample{sampleIndex}/value{fileIndex}.txt"
-        if not os.path.exists(file_path):        
-            break  
-        data =  reader.load_dict_from_file(file_path) 
-
-        if show_figure:
-            datas=datas+[item for sublist in data[prop] for item in sublist]
-    
-        for i in range(0,len(data[prop])):
-            varianceSum += np.sum((x - mean)**2 for x in data[prop][i])
-    variance = varianceSum/cout
+        values.append(reader.flat_values(data, prop))
+    values = np.concatenate(values) if values else np.zeros(0)
+    if show_figure:
+        datas = values.tolist()
+
+    cout = len(values)
+    mean = np.sum(values)/cout
+    variance = np.sum((values - mean)**2)/cout
  
     return mean,math.sqrt(variance),cout,datas
 def gen_grades_range_by_intersection(intersection_cdf_values,distributions,extendStdRatio=0):
@@ -149,14 +116,80 @@ def gen_grades_range_by_intersection(intersection_cdf_values,distributions,exten
     return grades_ranges
 
 
+def assign_grades(sizes, grades_range):
+    """
+    向量化的粒级划分，与逐颗粒判断 lo < size <= hi 一致（一个颗粒可能落在多个重叠区间中）
+    :param sizes: 颗粒尺寸一维数组
+    :param grades_range: 粒级区间列表 [[lo, hi], ...]
+    :return: (颗粒下标, 粒级下标)，按颗粒顺序排列
+    """
+    sizes = np.asarray(sizes, dtype=np.float64)
+    ranges = np.asarray(grades_range, dtype=np.float64).reshape(-1, 2)
+    lows, highs = ranges[:, 0], ranges[:, 1]
+
+    # 区间有序且互不重叠时，二分查找第一个 hi >= size 的区间即可
+    if np.all(lows <= highs) and np.all(lows[1:] >= highs[:-1]):
+        grade_indexes = np.searchsorted(highs, sizes, side='left')
+        matched = grade_indexes < len(ranges)
+        matched[matched] = sizes[matched] > lows[grade_indexes[matched]]
+        return np.nonzero(matched)[0], grade_indexes[matched]
+
+    # 区间重叠时用广播得到颗粒-粒级匹配矩阵
+    matched = (sizes[:, np.newaxis] > lows) & (sizes[:, np.newaxis] <= highs)
+    return np.nonzero(matched)
+
+
+def accumulate_batches(sizes, areas, image_indexes, grades_range, batchInterval, grade_count=6):
+    """
+    按批次和粒级累加体积（尺寸 x 面积）和颗粒数
+    :param sizes: 颗粒尺寸一维数组
+    :param areas: 颗粒面积一维数组
+    :param image_indexes: 每个颗粒所属图片的序号（从0开始，跨文件连续）
+    :param grades_range: 粒级区间列表
+    :param batchInterval: 批次数，第 i 张图片属于第 i % batchInterval 批
+    :return: (volumes, counts)，形状均为 (batchInterval, grade_count)
+    """
+    grade_count = max(grade_count, len(grades_range))
+    particle_indexes, grade_indexes = assign_grades(sizes, grades_range)
+    bins = (image_indexes[particle_indexes] % batchInterval) * grade_count + grade_indexes
+    # bincount 按输入顺序累加，与逐颗粒相加的结果一致
+    volumes = np.bincount(bins, weights=sizes[particle_indexes] * areas[particle_indexes],
+                          minlength=batchInterval * grade_count)
+    counts = np.bincount(bins, minlength=batchInterval * grade_count)
+    return volumes.reshape(batchInterval, grade_count), counts.reshape(batchInterval, grade_count)
+
+
+@lru_cache(maxsize=32)
+def load_sample_particles(sampleIndex, keys):
+    """
+    读取一个样品全部 value 文件中指定键的颗粒数据，拼接为一维数组，结果缓存以便批次数扫描时复用
+    :param sampleIndex: 样品序号
+    :param keys: 需要读取的键，例如 ("l_short_list", "l_area_list")
+    :return: (文件数量, {key: 颗粒值数组}, {key: 颗粒所属图片序号数组})
+    """
+    values = {key: [] for key in keys}
+    image_indexes = {key: [] for key in keys}
+    image_counts = {key: 0 for key in keys}
+    file_count = 0
+    for fileIndex in range(1,100):
+        file_path =fr"{data_path}/mixture{mixture_sample_index - 1}/sample{sampleIndex}/value{fileIndex}.txt"
+        if not feature_store.dataset_exists(file_path):
+            break  
+        data =  reader.load_dict_from_file(file_path)  
+        file_count += 1
+        for key in keys:
+            lengths = reader.image_lengths(data, key)
+            values[key].append(reader.flat_values(data, key))
+            image_indexes[key].append(np.repeat(np.arange(len(lengths)) + image_counts[key], lengths))
+            image_counts[key] += len(lengths)
+
+    concat = lambda arrays, dtype: np.concatenate(arrays) if arrays else np.zeros(0, dtype=dtype)
+    return (file_count,
+            {key: concat(values[key], np.float64) for key in keys},
+            {key: concat(image_indexes[key], np.int64) for key in keys})
+
+
 def compute_volume_percentage(grades_range,sampleIndex,batchInterval):
-   
-    def computeGrade(size,grades_range):
-        sizeIndexes=[]
-        for sizeIndex in range(0,len(grades_range)):
-            if size>grades_range[sizeIndex][0] and size<=grades_range[sizeIndex][1]:
-                sizeIndexes.append(sizeIndex)
-        return sizeIndexes
 
     g_grades_range = []
     l_grades_range = grades_range
@@ -167,49 +200,22 @@ def compute_volume_percentage(grades_range,sampleIndex,batchInterval):
 
     prop =  "l_short_list" if view=="local" else "g_short_list"
     propArea =  "l_area_list" if view=="local" else "g_area_list"
-    valumes=[[0,0,0,0,0,0] for i in range(0,batchInterval)]
-    couts=[[0,0,0,0,0,0] for i in range(0,batchInterval)]
 
-    valumes1 = [[0, 0, 0, 0, 0, 0] for i in range(0, batchInterval)]
-    couts1 = [[0, 0, 0, 0, 0, 0] for i in range(0, batchInterval)]
-    l_currentImageIndex=0
-    g_currentImageIndex=0
-    for fileIndex in range(1,100):
-        file_path =fr"{data_path}/mixture{mixture_sample_index - 1}/sample{sampleIndex}/value{fileIndex}.txt"
-        if not os.path.exists(file_path):        
-            break  
-        data =  reader.load_dict_from_file(file_path)  
+    keys = (prop, propArea, "g_short_list", "g_area_list") if to_link else (prop, propArea)
+    keys = tuple(dict.fromkeys(keys))
+    file_count, values, image_indexes = load_sample_particles(sampleIndex, keys)
 
-        if to_link:
-            for imageIndex in range(0, len(data[prop])):
-                l_currentImageIndex += 1
-                for particleIndex in range(0, len(data[prop][imageIndex])):
-                    sizeIndexdes = computeGrade(data[prop][imageIndex][particleIndex], l_grades_range)
-                    for sizeIndex in sizeIndexdes:
-                        valumes[l_currentImageIndex % batchInterval - 1][sizeIndex] += data[prop][imageIndex][particleIndex] * data[propArea][imageIndex][particleIndex]
-                        couts[l_currentImageIndex % batchInterval - 1][sizeIndex] += 1
-
-            # todo 把全局的加上
-            for imageIndex in range(0, len(data["g_short_list"])):
-                g_currentImageIndex += 1
-                for particleIndex in range(0, len(data["g_short_list"][imageIndex])):
-                    sizeIndexdes = computeGrade(data["g_short_list"][imageIndex][particleIndex], g_grades_range)
-                    for sizeIndex in sizeIndexdes:
-                        valumes1[g_currentImageIndex % batchInterval - 1][sizeIndex] += data['g_short_list'][imageIndex][particleIndex] * data['g_area_list'][imageIndex][particleIndex]
-                        couts1[g_currentImageIndex % batchInterval - 1][sizeIndex] += 1
-
-            for t in range(batchInterval):
-                for index in range(4,6):
-                    valumes[t][index] = valumes1[t][index] * diameter_gap_average() * area_gap() / physics_gap()
+    valumes, couts = accumulate_batches(values[prop], values[propArea], image_indexes[prop],
+                                        l_grades_range if to_link else grades_range, batchInterval)
 
-        else:
-            for imageIndex in range(0,len(data[prop])):
-                l_currentImageIndex+=1
-                for particleIndex in range(0,len(data[prop][imageIndex])):
-                    sizeIndexdes = computeGrade(data[prop][imageIndex][particleIndex],grades_range)
-                    for sizeIndex in sizeIndexdes:
-                        valumes[l_currentImageIndex%batchInterval-1][sizeIndex]+= data[prop][imageIndex][particleIndex] * data[propArea][imageIndex][particleIndex]
-                        couts[l_currentImageIndex%batchInterval-1][sizeIndex]+=1
+    if to_link and file_count > 0:
+        # 把全局的加上：最后两个粒级使用全局视图的体积
+        valumes1, couts1 = accumulate_batches(values["g_short_list"], values["g_area_list"],
+                                              image_indexes["g_short_list"], g_grades_range, batchInterval)
+        valumes[:, 4:6] = valumes1[:, 4:6] * diameter_gap_average() * area_gap() / physics_gap()
+
+    valumes = valumes.tolist()
+    couts = couts.tolist()
 
     valumes =  [[volume*volume_correction  for volume,volume_correction in zip(valumes1,volume_corrections)] for valumes1 in valumes]
     total_volumes = [sum(valumes1) for valumes1 in valumes ] 
@@ -1,8 +1,10 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends, Query
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends, Query, Request
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from modbus_tk import modbus_tcp
 from pydantic import BaseModel
+import asyncio
+import hashlib
 import json
 import time
 import os
@@ -10,6 +12,7 @@ import logging
 import sys
 import socket
 import psutil  # 系统监控库
+import cv2
 # from camera.MvImport.MvCameraControl_class import *
 import serial
 import serial.tools.list_ports
@@ -32,6 +35,51 @@ logger = logging.getLogger("sand-control-api")
 # 定义路径
 RESULTS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "results")
 SCRIPT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "process_sand_images.py")
+RESULT_STORE_PATH = os.path.join(RESULTS_PATH, "results.db")
+
+# 后端根目录加入Python路径
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from utils.event_bus import event_bus, format_sse, publish, CLEAN_COMPLETED, ERROR
+from api.thumbnail_cache import ThumbnailCache, MIN_WIDTH, MAX_WIDTH
+from api.directory_index import DirectoryIndex
+from control.frame_archive import frame_identity, image_exists, is_raw_frame_path, read_image, split_member_path
+from utils.device_executor import (PLC, SCALE, IO_SOCKET, DEFAULT_TIMEOUT, DeviceBusyError, DeviceTimeoutError,
+                                   run_on_device, device_stats, shutdown_device_executors)
+from control.scale_sampler import ScaleSampler
+from utils.tracing import tracer
+from utils.metrics import registry as metrics_registry
+
+# 图片目录索引
+directory_index = DirectoryIndex()
+
+# 各设备执行器排队（含执行中）的操作数，导出 /metrics 时读取
+metrics_registry.gauge("device_pending", "设备执行器排队（含执行中）的操作数", ("device",),
+                       function=lambda: {(name,): stats["pending"] for name, stats in device_stats().items()})
+
+# 缩略图磁盘缓存
+THUMBNAIL_CACHE_PATH = os.path.join(RESULTS_PATH, ".thumbnails")
+THUMBNAIL_CACHE_MAX_BYTES = 512 * 1024 * 1024
+thumbnail_cache = ThumbnailCache(THUMBNAIL_CACHE_PATH, THUMBNAIL_CACHE_MAX_BYTES)
+
+# 原图、结果图片会以相同文件名重新写入（如重新分析），浏览器每次用 ETag 验证，未变化时返回 304
+IMAGE_CACHE_CONTROL = "no-cache"
+# URL 带原图版本（v 参数）的缩略图，原图变化后 URL 随之变化，可直接缓存（秒）
+VERSIONED_THUMBNAIL_CACHE_CONTROL = "public, max-age=3600"
+
+# 原始帧（归档帧、.npy）请求原图时编码的 JPEG 质量
+RAW_FRAME_JPEG_QUALITY = 95
+
+# 给料、清砂等长时间设备操作的超时时间（秒）
+DEVICE_LONG_TIMEOUT = 300
+
+# 电子秤采样超过该秒数未更新时直接读取
+SCALE_SAMPLE_MAX_AGE = 2.0
+
+# SSE 心跳间隔（秒），保持连接不被代理或客户端超时断开
+EVENTS_HEARTBEAT_INTERVAL = 15
 
 # 创建FastAPI应用
 app = FastAPI(
@@ -88,6 +136,7 @@ is_running = False
 current_config = None
 process_start_time = None
 scale_client = None
+scale_sampler = None  # API 自己连接电子秤时的后台采样
 scale_status = ScaleStatus(
     is_connected=False,
     port=None,
@@ -106,7 +155,8 @@ system_status = {
     "elapsed_time": None,
     "current_group": None,
     "current_photo": None,
-    "remaining_sand": None
+    "remaining_sand": None,
+    "analysis_backlog": 0
 }
 
 # 清砂任务状态管理
@@ -150,10 +200,13 @@ class CleanSandTask:
                 
                 # 执行清砂序列
                 success = self.cleaner.execute_clean_sequence()
+                publish(CLEAN_COMPLETED, task_id=self.task_id, cycle=self.current_cycle,
+                        total_cycles=self.total_cycles, success=bool(success))
                 
                 if not success:
                     self.status = "error"
                     self.message = "清砂操作执行失败"
+                    publish(ERROR, source="clean", task_id=self.task_id, message=self.message)
                     break
                     
                 if i < self.test_cycles - 1:
@@ -167,6 +220,7 @@ class CleanSandTask:
         except Exception as e:
             self.status = "error"
             self.message = f"清砂操作出错: {str(e)}"
+            publish(ERROR, source="clean", task_id=self.task_id, message=self.message)
     
     def stop(self):
         """请求停止任务"""
@@ -275,6 +329,8 @@ async def shutdown_event():
         if process_instance:
             process_instance.close()
             process_instance = None
+        stop_scale_sampler()
+        shutdown_device_executors()
         logger.info("服务关闭，资源已清理")
     except Exception as e:
         logger.error(f"清理资源时出错: {str(e)}")
@@ -301,45 +357,176 @@ async def root():
     """API根端点"""
     return {"message": "沙粒控制系统API正在运行"}
 
-@app.get("/results")
-async def get_results():
+async def device_call(device, func, *args, timeout=DEFAULT_TIMEOUT, **kwargs):
     """
-    获取自定义图像处理的结果
+    在设备的串行执行线程中执行阻塞的硬件操作，不阻塞事件循环
+    :param device: 设备名称（PLC、SCALE、SERVO、IO_SOCKET）
+    :param timeout: 超时时间（秒），None 表示一直等待
     """
     try:
-        # 结果文件路径
-        results_path = os.path.join(RESULTS_PATH, "processing_results.json")
-        
-        # 检查文件是否存在
-        if not os.path.exists(results_path):
-            return JSONResponse(
-                content={
-                    "success": False,
-                    "error": "未找到处理结果"
-                },
-                status_code=404
-            )
-        
-        # 检查文件大小
-        file_size = os.path.getsize(results_path)
-        if file_size > 10 * 1024 * 1024:  # 如果文件大于10MB
-            logger.warning(f"结果文件较大 ({file_size/1024/1024:.2f}MB)，可能需要优化")
-            
-        # 读取结果文件
-        try:
-            with open(results_path, 'r') as f:
+        return await run_on_device(device, func, *args, timeout=timeout, **kwargs)
+    except DeviceBusyError as e:
+        logger.warning(str(e))
+        raise HTTPException(status_code=503, detail=str(e))
+    except DeviceTimeoutError as e:
+        logger.error(str(e))
+        raise HTTPException(status_code=504, detail=str(e))
+
+
+def _ensure_backend_path():
+    """确保后端根目录在 Python 路径中"""
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if backend_dir not in sys.path:
+        sys.path.insert(0, backend_dir)
+
+
+def get_result_store_instance():
+    """结果存储（实验处理结果逐条写入的 SQLite 数据库），不存在时返回 None"""
+    if not os.path.exists(RESULT_STORE_PATH):
+        return None
+    _ensure_backend_path()
+    from result_store import get_result_store
+    store = get_result_store(RESULT_STORE_PATH)
+    return store if store.latest_session_id() is not None else None
+
+
+# processing_results.json 的解析缓存，文件未变化时不重复解析
+_results_file_cache = {"key": None, "results": None, "items": None}
+_results_file_lock = threading.Lock()
+
+
+def load_results_file(results_path):
+    """
+    读取 processing_results.json，按修改时间和大小缓存
+    :return: (文件版本, 结果字典, 带编号的结果条目列表)
+    """
+    stat = os.stat(results_path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    with _results_file_lock:
+        if _results_file_cache["key"] != key:
+            file_size = stat.st_size
+            if file_size > 10 * 1024 * 1024:  # 如果文件大于10MB
+                logger.warning(f"结果文件较大 ({file_size/1024/1024:.2f}MB)，可能需要优化")
+            with open(results_path, 'r', encoding='utf-8') as f:
                 results = json.load(f)
-        except json.JSONDecodeError as je:
-            logger.error(f"JSON解析错误: {str(je)}")
-            return JSONResponse(
-                content={
-                    "success": False,
-                    "error": "结果文件格式错误"
-                },
-                status_code=500
-            )
-        
-        return JSONResponse(content=results)
+            _ensure_backend_path()
+            from result_store import group_number_of
+            items = []
+            for image_type in ("global", "local"):
+                for item in results.get(image_type, []):
+                    items.append({**item, "id": len(items) + 1, "image_type": image_type,
+                                  "group_number": group_number_of(item.get("image_path"))})
+            _results_file_cache.update(key=key, results=results, items=items)
+        return key, _results_file_cache["results"], _results_file_cache["items"]
+
+
+def make_etag(*parts):
+    """由数据版本和查询参数生成 ETag"""
+    return '"' + hashlib.md5(repr(parts).encode("utf-8")).hexdigest() + '"'
+
+
+def etag_matches(request, etag):
+    """请求的 If-None-Match 是否与 ETag 一致"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def results_response(request, content, etag):
+    """带 ETag 的结果响应，数据未变化时返回 304"""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=content, headers=headers)
+
+
+@app.get("/results")
+async def get_results(
+        request: Request,
+        view: Optional[str] = Query(None, pattern="^(global|local)$", description="视图类型 global/local"),
+        group: Optional[int] = Query(None, ge=0, description="组号"),
+        since: Optional[int] = Query(None, ge=0, description="只返回编号大于该值的结果（上次响应的 next_since）"),
+        offset: int = Query(0, ge=0, description="跳过的条数"),
+        limit: Optional[int] = Query(None, ge=1, le=1000, description="每页条数"),
+        session: Optional[int] = Query(None, ge=1, description="实验会话编号，默认为最近一次实验")):
+    """
+    获取自定义图像处理的结果，实验进行中也可获取已处理的部分。
+    不带查询参数时返回与 processing_results.json 相同格式的全部结果；
+    带 view/group/since/offset/limit 任一参数时分页返回结果条目，since 用于只获取新结果。
+    响应带 ETag，请求带 If-None-Match 且数据未变化时返回 304。
+    """
+    try:
+        paged = any(value is not None for value in (view, group, since, limit)) or offset > 0
+        params = (view, group, since, offset, limit, session)
+
+        # 优先从结果存储读取
+        store = get_result_store_instance()
+        if store is not None:
+            session_id = session or store.latest_session_id()
+            version = store.version(session_id)
+            etag = make_etag("store", version, params)
+            if etag_matches(request, etag):
+                return results_response(request, None, etag)
+            if not paged:
+                return results_response(request, store.consolidated(session_id), etag)
+            items = store.results(session_id, view, since, limit, offset, group)
+            total = store.count_results(session_id, view, since, group)
+            summary = store.summary(session_id)
+            finished = version[2] is not None
+        else:
+            # 结果文件路径
+            results_path = os.path.join(RESULTS_PATH, "processing_results.json")
+
+            # 检查文件是否存在
+            if not os.path.exists(results_path):
+                return JSONResponse(
+                    content={
+                        "success": False,
+                        "error": "未找到处理结果"
+                    },
+                    status_code=404
+                )
+
+            # 读取结果文件（文件未变化时使用缓存）
+            try:
+                version, results, all_items = load_results_file(results_path)
+            except json.JSONDecodeError as je:
+                logger.error(f"JSON解析错误: {str(je)}")
+                return JSONResponse(
+                    content={
+                        "success": False,
+                        "error": "结果文件格式错误"
+                    },
+                    status_code=500
+                )
+            etag = make_etag("file", version, params)
+            if not paged:
+                return results_response(request, results, etag)
+            session_id = None
+            matched = [item for item in all_items
+                       if (view is None or item["image_type"] == view)
+                       and (group is None or item["group_number"] == group)
+                       and (since is None or item["id"] > since)]
+            total = len(matched)
+            items = matched[offset:None if limit is None else offset + limit]
+            summary = results.get("summaryStats", {})
+            finished = True
+
+        content = {
+            "success": True,
+            "session_id": session_id,
+            "items": items,
+            "total": total,
+            "offset": offset,
+            "limit": limit,
+            "since": since,
+            "next_since": items[-1]["id"] if items else (since or 0),
+            "finished": finished,
+            "summaryStats": summary
+        }
+        return results_response(request, content, etag)
     except Exception as e:
         return JSONResponse(
             content={
@@ -349,6 +536,38 @@ async def get_results():
             status_code=500
         )
 
+@app.get("/events")
+async def stream_events(
+        request: Request,
+        types: Optional[str] = Query(None, description="只推送这些类型的事件，逗号分隔"),
+        last_event_id: Optional[int] = Query(None, ge=0, description="补发编号大于该值的事件")):
+    """
+    实验事件推送（Server-Sent Events）：拍照完成、图片分析完成、清砂完成、出错等。
+    断线重连时浏览器会带上 Last-Event-ID，缺失的事件会从最近的事件记录中补发。
+    """
+    event_types = set(types.split(",")) if types else None
+    header_id = request.headers.get("last-event-id")
+    after_id = last_event_id if last_event_id is not None else (int(header_id) if header_id and header_id.isdigit() else None)
+
+    async def event_stream():
+        # 告知浏览器断线后的重连间隔
+        yield "retry: 3000\n\n"
+        events = event_bus.subscribe(after_id, event_types, heartbeat=EVENTS_HEARTBEAT_INTERVAL)
+        try:
+            async for event in events:
+                if await request.is_disconnected():
+                    break
+                yield ": keep-alive\n\n" if event is None else format_sse(event)
+        finally:
+            await events.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.get("/status")
 async def get_status():
     """获取系统状态"""
@@ -365,6 +584,16 @@ async def get_status():
             system_status["current_photo"] = process_instance.current_photo
             system_status["total_photos"] = process_instance.total_photos
 
+    # 等待分析的图片数量
+    if process_instance:
+        system_status["analysis_backlog"] = process_instance.analysis_backlog()
+        # 给料精度和耗时
+        if getattr(process_instance, "feeding_controller", None) is not None:
+            system_status["feeding"] = process_instance.feeding_controller.stats()
+
+    # 各设备排队的操作
+    system_status["devices"] = device_stats()
+
     return system_status
 
 
@@ -372,8 +601,8 @@ async def get_status():
 async def get_system_monitor():
     """获取系统监控数据"""
     try:
-        # 获取CPU使用率(1秒间隔)
-        cpu_percent = psutil.cpu_percent(interval=0.5)
+        # 获取CPU使用率(0.5秒间隔，在线程中采样，不阻塞其他请求)
+        cpu_percent = await asyncio.to_thread(psutil.cpu_percent, 0.5)
         
         # 获取内存使用情况
         memory = psutil.virtual_memory()
@@ -394,6 +623,43 @@ async def get_system_monitor():
         raise HTTPException(status_code=500, detail=f"获取系统监控数据失败: {str(e)}")
 
 
+@app.get("/metrics")
+async def get_metrics():
+    """运行指标（Prometheus 文本格式）：相机保存队列、分析任务、JPEG 编码和 Modbus 往返耗时等"""
+    return Response(content=metrics_registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/trace/stats")
+async def get_trace_stats(category: Optional[str] = Query(None, description="只返回该分类的阶段，如 phase、camera")):
+    """各阶段最近耗时的 p50/p95（毫秒），按 p95 从大到小排列，最慢的阶段在最前"""
+    stats = tracer.phase_stats()
+    if category:
+        stats = [item for item in stats if item["category"] == category]
+    return {"recording": tracer.run_id, "data": stats}
+
+
+@app.get("/trace/runs")
+async def get_trace_runs():
+    """已保存的实验 trace 文件"""
+    return {"data": await asyncio.to_thread(tracer.runs)}
+
+
+@app.get("/trace/{run_id}")
+async def get_trace(run_id: str):
+    """
+    下载实验的 Chrome trace 文件（chrome://tracing 或 ui.perfetto.dev 打开），run_id 为 latest 时返回最近一次实验
+    """
+    if run_id == "latest":
+        runs = await asyncio.to_thread(tracer.runs)
+        if not runs:
+            raise HTTPException(status_code=404, detail="没有已保存的实验计时记录")
+        run_id = runs[0]["run_id"]
+    path = tracer.trace_path(run_id)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail=f"实验计时记录不存在: {run_id}")
+    return FileResponse(path=path, media_type="application/json", filename=os.path.basename(path))
+
+
 @app.post("/initialize")
 async def initialize_system():
     """初始化系统"""
@@ -409,7 +675,9 @@ async def initialize_system():
 async def open_light(process=Depends(get_process)):
     """初始化系统"""
     try:
-        process.light_open()
+        await device_call(PLC, process.light_open)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"灯光打开失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"灯光打开失败: {str(e)}")
@@ -418,7 +686,9 @@ async def open_light(process=Depends(get_process)):
 async def open_light(process=Depends(get_process)):
     """初始化系统"""
     try:
-        process.light_close()
+        await device_call(PLC, process.light_close)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"灯光关闭失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"灯光关闭失败: {str(e)}")
@@ -456,8 +726,8 @@ async def stop_process(process=Depends(get_process)):
     system_status["is_running"] = False
 
     try:
-        # 首先调用停止流程方法
-        process.stop_process()
+        # 首先调用停止流程方法（停止是紧急操作，不在控制台线程中排队；modbus_tk 的请求本身是线程安全的）
+        await asyncio.to_thread(process.stop_process)
         
         # 重置进度状态
         system_status["current_group"] = 0
@@ -468,11 +738,10 @@ async def stop_process(process=Depends(get_process)):
         process.total_photos = 0
         
         # 等待一下让停止信号生效
-        import asyncio
         await asyncio.sleep(1)
         
         # 然后关闭资源
-        process.close()
+        await asyncio.to_thread(process.close)
         
         is_running = False
         system_status["is_running"] = False
@@ -504,12 +773,14 @@ async def configure_camera(config: CameraConfig, process=Depends(get_process)):
 async def test_feeding(amount: float = Query(1.0, description="测试给料量（克）")):
     """测试给料功能"""
     try:
-        process = get_process()
-        # 执行给料测试
-        if process.start_feeding(amount):
+        process = await asyncio.to_thread(get_process)
+        # 执行给料测试（控制台、舵机、传感器的操作在控制台线程中依次执行）
+        if await device_call(PLC, process.start_feeding, amount, timeout=DEVICE_LONG_TIMEOUT):
             return {"status": "success", "message": f"成功下料 {amount} 克"}
         else:
             raise HTTPException(status_code=500, detail="给料测试失败")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"给料测试失败: {str(e)}")
 
@@ -544,19 +815,40 @@ async def test_cleaning(process=Depends(get_process)):
 
     try:
         # 执行清砂操作
-        result = process.cleaner.execute_clean_sequence()
+        result = await device_call(PLC, process.cleaner.execute_clean_sequence, timeout=DEVICE_LONG_TIMEOUT)
 
         if result:
             return {"status": "success", "message": "清砂测试成功"}
         else:
             raise HTTPException(status_code=500, detail="清砂操作失败")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"清砂测试失败: {str(e)}")
 
 
+# 各组件初始化测试使用的设备
+COMPONENT_DEVICES = {
+    "modbus": PLC,
+    "socket": IO_SOCKET,
+    "serial": SCALE,
+}
+
+
 @app.post("/test/init/{component}")
 @app.get("/test/init/{component}")
 async def test_component_init(component: str):
+    """测试各个组件的初始化，参见 run_component_init_test"""
+    device = COMPONENT_DEVICES.get(component)
+    if device is None:
+        # 相机不属于串口/Modbus设备，在线程池中执行
+        return await asyncio.to_thread(run_component_init_test, component)
+    # socket 测试要等待有人设备连接，给更长的时间
+    timeout = 60 if component == "socket" else DEFAULT_TIMEOUT
+    return await device_call(device, run_component_init_test, component, timeout=timeout)
+
+
+def run_component_init_test(component: str):
     """测试各个组件的初始化
     component可以是：
     - modbus: 测试控制台连接 http://localhost:8000/test/init/modbus
@@ -681,6 +973,26 @@ def get_scale_client():
     
     return scale_client
 
+def current_scale_sampler(client):
+    """电子秤的后台采样：共享系统 COM5 连接时使用系统的采样，否则为 API 的连接启动采样"""
+    global scale_sampler
+    if process_instance is not None and getattr(process_instance, "scale_sampler", None) is not None \
+            and client is process_instance.client:
+        return process_instance.scale_sampler
+    if scale_sampler is None or scale_sampler.client is not client:
+        stop_scale_sampler()
+        scale_sampler = ScaleSampler(client).start()
+    return scale_sampler
+
+
+def stop_scale_sampler():
+    """停止 API 自己启动的电子秤采样"""
+    global scale_sampler
+    if scale_sampler is not None:
+        scale_sampler.stop()
+        scale_sampler = None
+
+
 def process_weight(registers):
     """处理寄存器数据为重量值"""
     # 从两个寄存器中获取32位整数，高位在前
@@ -707,6 +1019,11 @@ async def get_scale_status():
 @app.post("/scale/connect/{port}")
 async def connect_scale(port: str):
     """连接指定串口的电子秤"""
+    return await device_call(SCALE, connect_scale_port, port)
+
+
+def connect_scale_port(port: str):
+    """连接指定串口的电子秤（阻塞，在电子秤设备线程中执行）"""
     global scale_client, scale_status, process_instance
     
     try:
@@ -803,12 +1120,14 @@ async def calibrate_zero(scale_client=Depends(get_scale_client)):
     """执行零点校准"""
     try:
         # 使用关键字参数而不是位置参数
-        result = scale_client.write_registers(address=0x26, values=[0, 0], slave=0x01)
+        result = await device_call(SCALE, scale_client.write_registers, address=0x26, values=[0, 0], slave=0x01)
         if result and not result.isError():
             scale_status.last_calibration = time.strftime("%Y-%m-%d %H:%M:%S")
             return {"status": "success", "message": "零点校准完成"}
         else:
             raise HTTPException(status_code=500, detail="零点校准失败")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"校准错误: {str(e)}")
 
@@ -822,15 +1141,77 @@ async def calibrate_gain(config: ScaleCalibration, scale_client=Depends(get_scal
         low = weight_g & 0xFFFF
         
         # 使用关键字参数而不是位置参数
-        result = scale_client.write_registers(address=0x2A, values=[high, low], slave=config.slave_address)
+        result = await device_call(SCALE, scale_client.write_registers, address=0x2A, values=[high, low],
+                                   slave=config.slave_address)
         if result and not result.isError():
             scale_status.last_calibration = time.strftime("%Y-%m-%d %H:%M:%S")
             return {"status": "success", "message": "增益校准完成"}
         else:
             raise HTTPException(status_code=500, detail="增益校准失败")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"校准错误: {str(e)}")
 
+def read_scale_weight(client):
+    """读取电子秤重量（阻塞，在电子秤设备线程中执行）"""
+    logger.info(f"尝试读取电子秤重量，使用串口：{scale_status.port}")
+    
+    # 从站地址
+    slave_address = 0x01
+    
+    # 重量数据寄存器地址 - 使用0x50（十进制80）
+    register_address = 0x50
+    
+    # 读取保持寄存器（功能码03H）
+    try:
+        # 详细记录通信过程
+        logger.info(f"准备读取电子秤重量，寄存器地址: 0x{register_address:X}, 从站地址: 0x{slave_address:X}")
+        
+        # 尝试使用不同的参数组合
+        try:
+            # 方法1: 使用关键字参数
+            logger.info("尝试方法1: 使用关键字参数")
+            result = client.read_holding_registers(address=register_address, count=2, slave=slave_address)
+            logger.info(f"方法1结果: {result}")
+        except Exception as e1:
+            logger.error(f"方法1失败: {str(e1)}")
+            
+            try:
+                # 方法2: 使用位置参数
+                logger.info("尝试方法2: 使用位置参数")
+                result = client.read_holding_registers(register_address, 2)
+                logger.info(f"方法2结果: {result}")
+            except Exception as e2:
+                logger.error(f"方法2失败: {str(e2)}")
+                
+                try:
+                    # 方法3: 使用slave_id参数
+                    logger.info("尝试方法3: 使用slave_id参数")
+                    result = client.read_holding_registers(address=register_address, count=2, slave_id=slave_address)
+                    logger.info(f"方法3结果: {result}")
+                except Exception as e3:
+                    logger.error(f"方法3失败: {str(e3)}")
+                    
+                    # 所有方法都失败
+                    logger.error("所有尝试方法都失败")
+                    return {"weight": 0, "unit": "g", "status": "error", "message": "无法读取电子秤重量，所有尝试方法都失败"}
+        
+        # 如果执行到这里，说明某个方法成功了
+        if result and not result.isError():
+            weight = process_weight(result.registers)
+            scale_status.current_weight = weight
+            logger.info(f"成功读取重量: {weight}g")
+            return {"weight": weight, "unit": "g", "status": "success"}
+        else:
+            logger.error(f"读取重量失败: {result}")
+            # 返回错误但不抛出异常，让前端能够继续操作
+            return {"weight": 0, "unit": "g", "status": "error", "message": f"读取重量失败: {result}"}
+    except Exception as e:
+        logger.error(f"读取重量时发生异常: {str(e)}")
+        # 返回错误但不抛出异常，让前端能够继续操作
+        return {"weight": 0, "unit": "g", "status": "error", "message": f"读取重量异常: {str(e)}"}
+
 @app.get("/scale/weight")
 async def get_weight(scale_client=Depends(get_scale_client)):
     """获取当前重量"""
@@ -859,63 +1240,21 @@ async def get_weight(scale_client=Depends(get_scale_client)):
         if not scale_status.is_connected:
             logger.error("电子秤未连接")
             return {"weight": 0, "unit": "g", "status": "error", "message": "电子秤未连接"}
-            
-        logger.info(f"尝试读取电子秤重量，使用串口：{port}")
-        
-        # 从站地址
-        slave_address = 0x01
-        
-        # 重量数据寄存器地址 - 使用0x50（十进制80）
-        register_address = 0x50
-        
-        # 读取保持寄存器（功能码03H）
-        try:
-            # 详细记录通信过程
-            logger.info(f"准备读取电子秤重量，寄存器地址: 0x{register_address:X}, 从站地址: 0x{slave_address:X}")
-            
-            # 尝试使用不同的参数组合
-            try:
-                # 方法1: 使用关键字参数
-                logger.info("尝试方法1: 使用关键字参数")
-                result = client.read_holding_registers(address=register_address, count=2, slave=slave_address)
-                logger.info(f"方法1结果: {result}")
-            except Exception as e1:
-                logger.error(f"方法1失败: {str(e1)}")
-                
-                try:
-                    # 方法2: 使用位置参数
-                    logger.info("尝试方法2: 使用位置参数")
-                    result = client.read_holding_registers(register_address, 2)
-                    logger.info(f"方法2结果: {result}")
-                except Exception as e2:
-                    logger.error(f"方法2失败: {str(e2)}")
-                    
-                    try:
-                        # 方法3: 使用slave_id参数
-                        logger.info("尝试方法3: 使用slave_id参数")
-                        result = client.read_holding_registers(address=register_address, count=2, slave_id=slave_address)
-                        logger.info(f"方法3结果: {result}")
-                    except Exception as e3:
-                        logger.error(f"方法3失败: {str(e3)}")
-                        
-                        # 所有方法都失败
-                        logger.error("所有尝试方法都失败")
-                        return {"weight": 0, "unit": "g", "status": "error", "message": "无法读取电子秤重量，所有尝试方法都失败"}
-            
-            # 如果执行到这里，说明某个方法成功了
-            if result and not result.isError():
-                weight = process_weight(result.registers)
-                scale_status.current_weight = weight
-                logger.info(f"成功读取重量: {weight}g")
-                return {"weight": weight, "unit": "g", "status": "success"}
-            else:
-                logger.error(f"读取重量失败: {result}")
-                # 返回错误但不抛出异常，让前端能够继续操作
-                return {"weight": 0, "unit": "g", "status": "error", "message": f"读取重量失败: {result}"}
-        except Exception as e:
-            logger.error(f"读取重量时发生异常: {str(e)}")
-            # 返回错误但不抛出异常，让前端能够继续操作
-            return {"weight": 0, "unit": "g", "status": "error", "message": f"读取重量异常: {str(e)}"}
+
+        # 优先使用后台采样的最新值，不再单独读取串口
+        sampler = current_scale_sampler(client)
+        sample = sampler.latest()
+        if sample is None or time.time() - sample.timestamp > SCALE_SAMPLE_MAX_AGE:
+            # 采样刚启动或持续读取失败时直接读取一次
+            return await device_call(SCALE, read_scale_weight, client)
+        scale_status.current_weight = sample.weight
+        return {
+            "weight": sample.weight,
+            "unit": "g",
+            "status": "success",
+            "timestamp": sample.timestamp,
+            "rate": sampler.rate_of_change()  # 最近1秒的重量变化速度（g/s）
+        }
     except Exception as e:
         logger.error(f"获取重量错误: {str(e)}")
         # 返回错误但不抛出异常，让前端能够继续操作
@@ -938,7 +1277,8 @@ async def disconnect_scale():
         # 常规断开连接
         if scale_client:
             try:
-                scale_client.close()
+                await asyncio.to_thread(stop_scale_sampler)
+                await device_call(SCALE, scale_client.close)
                 logger.info("电子秤连接已关闭")
             except Exception as e:
                 logger.error(f"关闭电子秤连接时出错: {str(e)}")
@@ -952,43 +1292,84 @@ async def disconnect_scale():
         raise HTTPException(status_code=500, detail=f"断开连接错误: {str(e)}")
 
 @app.get("/images/list")
-async def get_images_list(directory: str):
-    """获取指定目录下的图片列表"""
+async def get_images_list(
+        request: Request,
+        directory: str,
+        offset: int = Query(0, ge=0, description="跳过的条数"),
+        limit: Optional[int] = Query(None, ge=1, le=5000, description="每页条数，为空时返回全部"),
+        sort: str = Query("name", pattern="^(name|mtime|size|group)$", description="排序方式，group 按组号、照片号"),
+        order: str = Query("asc", pattern="^(asc|desc)$", description="升序/降序")):
+    """获取指定目录下的图片列表（内存索引，目录变化时增量更新）"""
     try:
         # 确保目录存在
         if not os.path.exists(directory) or not os.path.isdir(directory):
             raise HTTPException(status_code=404, detail=f"目录不存在: {directory}")
-        
-        # 获取目录中的所有文件
-        image_files = []
-        for filename in os.listdir(directory):
-            file_path = os.path.join(directory, filename)
-            # 只处理文件（不包括子目录）和图片文件
-            if os.path.isfile(file_path) and filename.lower().endswith(('.jpg', '.jpeg', '.png', '.gif', '.bmp')):
-                # 获取文件信息
-                file_stat = os.stat(file_path)
-                
-                # 确定图片来源（global或local）
-                source = "global" if "global" in directory.lower() else "local"
-                
-                # 规范化路径，确保使用正斜杠作为分隔符（适合URL）
-                normalized_path = file_path.replace("\\", "/")
-                
-                image_files.append({
-                    "name": filename,
-                    "path": normalized_path,
-                    "size": file_stat.st_size,
-                    "modifiedTime": datetime.fromtimestamp(file_stat.st_mtime).isoformat(),
-                    "source": source
-                })
-        
-        return {"data": image_files}
+
+        total, image_files, version = directory_index.list(directory, offset, limit, sort, order == "desc")
+        etag = make_etag("images", os.path.normpath(directory), version, offset, limit, sort, order)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+        return JSONResponse(
+            content={"data": image_files, "total": total, "offset": offset, "limit": limit},
+            headers=headers
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取图片列表错误: {str(e)}")
 
+def encode_raw_frame(file_path):
+    """原始帧（归档帧或 .npy）去马赛克后编码为 JPEG"""
+    image = read_image(file_path)
+    if image is None:
+        raise ValueError(f"无法读取原始帧: {file_path}")
+    ok, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, RAW_FRAME_JPEG_QUALITY])
+    if not ok:
+        raise ValueError(f"原始帧编码失败: {file_path}")
+    return buffer.tobytes()
+
+
+async def image_response(request, file_path, media_type, width=None, filename=None, version=None):
+    """
+    返回图片文件，width 不为空时返回该宽度的缩略图（磁盘缓存）；带 ETag，未变化时返回 304
+    原始帧（归档帧或 .npy）在请求时才去马赛克并编码为 JPEG
+    :param version: URL 中的原图版本，带版本的缩略图允许浏览器直接缓存，其他响应每次验证 ETag
+    """
+    if width is None and is_raw_frame_path(file_path):
+        etag = make_etag("raw", frame_identity(file_path), RAW_FRAME_JPEG_QUALITY)
+        headers = {"ETag": etag, "Cache-Control": IMAGE_CACHE_CONTROL}
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+        content = await asyncio.to_thread(encode_raw_frame, file_path)
+        if filename:
+            headers["Content-Disposition"] = f'inline; filename="{os.path.splitext(filename)[0]}.jpg"'
+        return Response(content=content, media_type="image/jpeg", headers=headers)
+
+    if width is None:
+        stat = os.stat(file_path)
+        etag = make_etag("image", os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+        headers = {"ETag": etag, "Cache-Control": IMAGE_CACHE_CONTROL}
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+        return FileResponse(path=file_path, media_type=media_type, filename=filename, headers=headers)
+
+    # 缩略图在线程池中生成，不阻塞事件循环
+    thumbnail_path, key = await asyncio.to_thread(thumbnail_cache.get, file_path, width)
+    etag = f'"{key}"'
+    headers = {"ETag": etag, "Cache-Control": VERSIONED_THUMBNAIL_CACHE_CONTROL if version else IMAGE_CACHE_CONTROL}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path=thumbnail_path, media_type="image/jpeg", headers=headers)
+
+
 @app.get("/images/file")
-async def get_image_file(path: str):
-    """获取图片文件"""
+async def get_image_file(
+        request: Request,
+        path: str,
+        w: Optional[int] = Query(None, ge=MIN_WIDTH, le=MAX_WIDTH, description="缩略图宽度，为空时返回原图"),
+        v: Optional[str] = Query(None, description="原图版本（如 /images/list 的 modifiedTime），带版本的缩略图可长期缓存")):
+    """获取图片文件，带 w 参数时返回缩略图"""
     try:
         # URL解码路径
         decoded_path = urllib.parse.unquote(path)
@@ -999,10 +1380,17 @@ async def get_image_file(path: str):
         # 基本路径安全检查
         if not decoded_path or '..' in decoded_path:
             raise HTTPException(status_code=400, detail="无效的文件路径")
-            
+
+        # 原始帧归档中的一帧（"<段文件>::<帧名称>"），请求时才去马赛克
+        member = split_member_path(decoded_path)
+        if member is not None:
+            if not image_exists(decoded_path):
+                raise HTTPException(status_code=404, detail=f"图片文件不存在")
+            return await image_response(request, decoded_path, "image/jpeg", w, member[1], v)
+
         # 获取文件扩展名
         file_ext = os.path.splitext(decoded_path)[1].lower()
-        if file_ext not in ['.jpg', '.jpeg', '.png', '.bmp']:
+        if file_ext not in ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.npy']:
             raise HTTPException(status_code=400, detail="不支持的文件类型")
 
         # 验证路径是否存在
@@ -1013,15 +1401,11 @@ async def get_image_file(path: str):
         if not os.path.isfile(decoded_path):
             raise HTTPException(status_code=400, detail="请求的路径不是文件")
         
-        # 获取正确的MIME类型
-        mime_type = 'image/jpeg' if file_ext in ['.jpg', '.jpeg'] else f'image/{file_ext[1:]}'
+        # 获取正确的MIME类型（.npy 原始帧编码为 JPEG 返回）
+        mime_type = 'image/jpeg' if file_ext in ['.jpg', '.jpeg', '.npy'] else f'image/{file_ext[1:]}'
         
         # 返回文件
-        return FileResponse(
-            path=decoded_path,
-            media_type=mime_type,
-            filename=os.path.basename(decoded_path)
-        )
+        return await image_response(request, decoded_path, mime_type, w, os.path.basename(decoded_path), v)
     except HTTPException:
         raise
     except Exception as e:
@@ -1029,8 +1413,11 @@ async def get_image_file(path: str):
 
 
 @app.get("/images/{filename}")
-async def get_result_image(filename: str):
-    """获取结果文件夹中的可视化图像"""
+async def get_result_image(
+        request: Request,
+        filename: str,
+        w: Optional[int] = Query(None, ge=MIN_WIDTH, le=MAX_WIDTH, description="缩略图宽度，为空时返回原图")):
+    """获取结果文件夹中的可视化图像，带 w 参数时返回缩略图"""
     try:
         # 设置结果目录路径
         results_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "results")
@@ -1048,9 +1435,11 @@ async def get_result_image(filename: str):
             raise HTTPException(status_code=400, detail="请求的文件不是图片格式")
         
         # 返回文件
-        return FileResponse(
+        return await image_response(
+            request,
             file_path,
-            media_type=f"image/{os.path.splitext(file_path)[1][1:].lower().replace('jpg', 'jpeg')}"
+            f"image/{os.path.splitext(file_path)[1][1:].lower().replace('jpg', 'jpeg')}",
+            w
         )
     except HTTPException:
         raise
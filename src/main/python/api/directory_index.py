@@ -0,0 +1,239 @@
+"""
+图片目录索引
+
+/images/list 以前每次请求都 os.listdir 再逐个 os.stat，实验进行中 global/local 目录有几千张图片，
+界面又在反复请求。这里为每个目录在内存中保留文件列表：
+目录的修改时间不变时直接使用索引，变化时只对新增文件取文件信息、去掉已删除的文件；
+刚写入的文件（修改时间在 SETTLE_SECONDS 以内）每次请求重新取一次文件信息，保证大小和时间是写完后的值。
+原始帧归档的段文件（segment_*.bayer）追加写入时目录的修改时间不变，每次请求检查段文件大小，
+变大时只读取新增的帧记录，每一帧作为一个列表项（path 为 "<段文件>::<帧名称>"）。
+按名称、修改时间、大小、组号/照片号排序的结果分别缓存，支持分页。
+"""
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from control.frame_archive import is_segment_file, member_path, open_archive
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.npy')
+
+# 刚写入的文件在这段时间内每次重新获取文件信息
+SETTLE_SECONDS = 5.0
+
+# 实验图片按 <组号>_<照片号>.jpg 命名，归档帧名称为 <组号>_<照片号>
+_GROUP_PHOTO_PATTERN = re.compile(r"^(\d+)_(\d+)(?:\.|$)")
+
+SORT_KEYS = {
+    "name": lambda item: item["name"],
+    "mtime": lambda item: (item["mtime"], item["name"]),
+    "size": lambda item: (item["size"], item["name"]),
+    "group": lambda item: (item["group"], item["photo"], item["name"]),
+}
+
+
+def _image_info(directory, name, stat, source):
+    """单个图片文件的列表项"""
+    match = _GROUP_PHOTO_PATTERN.match(name)
+    file_path = os.path.join(directory, name)
+    return {
+        "name": name,
+        # 规范化路径，确保使用正斜杠作为分隔符（适合URL）
+        "path": file_path.replace("\\", "/"),
+        "size": stat.st_size,
+        "modifiedTime": datetime.fromtimestamp(stat.st_mtime).isoformat(),
+        "source": source,
+        "group": int(match.group(1)) if match else 0,
+        "photo": int(match.group(2)) if match else 0,
+        "mtime": stat.st_mtime,
+    }
+
+
+def _frame_info(segment, info, source):
+    """原始帧归档中一帧的列表项"""
+    match = _GROUP_PHOTO_PATTERN.match(info.name)
+    return {
+        "name": info.name,
+        "path": member_path(segment, info.name).replace("\\", "/"),
+        "size": info.length,
+        "modifiedTime": datetime.fromtimestamp(info.timestamp).isoformat(),
+        "source": source,
+        "group": int(match.group(1)) if match else 0,
+        "photo": int(match.group(2)) if match else 0,
+        "mtime": info.timestamp,
+    }
+
+
+class _DirectoryEntry:
+    """一个目录的索引"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.source = "global" if "global" in directory.lower() else "local"
+        self.dir_mtime = None
+        self.files = {}  # 文件名 -> 列表项
+        self.unsettled = set()  # 刚写入、可能还在写的文件名
+        self.segments = {}  # 段文件名 -> 已索引的段文件大小
+        self.frames = {}  # 段文件名 -> {帧名称: 列表项}
+        self.frame_offsets = {}  # 段文件名 -> 已索引的最后一帧的数据偏移
+        self.sorted = {}  # (排序键, 是否降序) -> 列表项列表
+        self.version = 0
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        """目录变化时增量更新索引，返回是否有变化"""
+        dir_mtime = os.stat(self.directory).st_mtime_ns
+        changed = False
+        if dir_mtime != self.dir_mtime:
+            names = set()
+            segments = set()
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if is_segment_file(entry.name):
+                        segments.add(entry.name)
+                        continue
+                    if not entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                        continue
+                    names.add(entry.name)
+                    if entry.name in self.files:
+                        continue
+                    try:
+                        # 只处理文件（不包括子目录）
+                        if not entry.is_file():
+                            continue
+                        self.files[entry.name] = _image_info(self.directory, entry.name, entry.stat(), self.source)
+                        self.unsettled.add(entry.name)
+                        changed = True
+                    except OSError:
+                        names.discard(entry.name)
+            for name in set(self.files) - names:
+                del self.files[name]
+                self.unsettled.discard(name)
+                changed = True
+            for name in set(self.segments) - segments:
+                del self.segments[name]
+                self.frames.pop(name, None)
+                self.frame_offsets.pop(name, None)
+                changed = True
+            for name in segments - set(self.segments):
+                self.segments[name] = 0
+            self.dir_mtime = dir_mtime
+
+        # 段文件追加了新的帧
+        for name, indexed_size in list(self.segments.items()):
+            segment = os.path.join(self.directory, name)
+            try:
+                size = os.path.getsize(segment)
+                if size == indexed_size:
+                    continue
+                if size < indexed_size:
+                    # 段文件被重新写入，重新索引全部帧
+                    self.frames.pop(name, None)
+                    self.frame_offsets.pop(name, None)
+                    changed = True
+                frames = open_archive(segment).frames(self.frame_offsets.get(name, 0))
+            except (OSError, ValueError):
+                del self.segments[name]
+                self.frames.pop(name, None)
+                self.frame_offsets.pop(name, None)
+                changed = True
+                continue
+            self.segments[name] = size
+            if not frames:
+                # 新增的记录还没写完
+                continue
+            indexed = self.frames.setdefault(name, {})
+            for info in frames:
+                indexed[info.name] = _frame_info(segment, info, self.source)
+            self.frame_offsets[name] = frames[-1].offset
+            changed = True
+
+        # 刚写入的文件可能还在写，重新获取文件信息
+        settle_after = time.time() - SETTLE_SECONDS
+        for name in list(self.unsettled):
+            item = self.files[name]
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                del self.files[name]
+                self.unsettled.discard(name)
+                changed = True
+                continue
+            if stat.st_size != item["size"] or stat.st_mtime != item["mtime"]:
+                self.files[name] = _image_info(self.directory, name, stat, self.source)
+                changed = True
+            if stat.st_mtime < settle_after:
+                self.unsettled.discard(name)
+
+        if changed:
+            self.sorted.clear()
+            self.version += 1
+        return changed
+
+    def sorted_items(self, sort, descending):
+        key = (sort, descending)
+        items = self.sorted.get(key)
+        if items is None:
+            items = list(self.files.values())
+            for frames in self.frames.values():
+                items.extend(frames.values())
+            items = sorted(items, key=SORT_KEYS[sort], reverse=descending)
+            self.sorted[key] = items
+        return items
+
+
+class DirectoryIndex:
+    """
+    多个目录的图片索引，可在多个线程中同时使用
+    """
+
+    def __init__(self, max_directories=64):
+        """
+        :param max_directories: 最多保留索引的目录数量，超过时淘汰最久未使用的目录
+        """
+        self.max_directories = max_directories
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, directory):
+        directory = os.path.normpath(directory)
+        with self._lock:
+            entry = self._entries.get(directory)
+            if entry is None:
+                entry = _DirectoryEntry(directory)
+                self._entries[directory] = entry
+                while len(self._entries) > self.max_directories:
+                    self._entries.popitem(last=False)
+            else:
+                self._entries.move_to_end(directory)
+            return entry
+
+    def list(self, directory, offset=0, limit=None, sort="name", descending=False):
+        """
+        分页获取目录中的图片
+        :param directory: 目录路径
+        :param offset: 跳过的条数
+        :param limit: 最多返回条数，None 不限制
+        :param sort: 排序方式 name/mtime/size/group（组号、照片号）
+        :param descending: 是否降序
+        :return: (图片总数, 当前页列表项, 索引版本)
+        """
+        if sort not in SORT_KEYS:
+            raise ValueError(f"不支持的排序方式: {sort}")
+        entry = self._entry(directory)
+        with entry.lock:
+            entry.refresh()
+            items = entry.sorted_items(sort, descending)
+            page = items[offset:None if limit is None else offset + limit]
+            page = [{key: value for key, value in item.items() if key != "mtime"} for item in page]
+            return len(items), page, (entry.dir_mtime, entry.version)
+
+    def invalidate(self, directory=None):
+        """丢弃目录的索引，directory 为 None 时丢弃全部"""
+        with self._lock:
+            if directory is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(os.path.normpath(directory), None)
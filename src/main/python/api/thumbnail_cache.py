@@ -0,0 +1,171 @@
+"""
+图片缩略图磁盘缓存
+
+画廊只需要几百像素宽的预览，但 /images/file 每次返回 2000 万像素的原图。
+这里按 (路径, 修改时间, 文件大小, 宽度) 生成缩略图并缓存在磁盘上：
+JPEG 使用 Pillow 的 draft 模式按 1/2、1/4、1/8 缩小解码，不需要解出全分辨率像素；
+原始 Bayer 帧（归档帧、.npy）按 2x2 块直接得到半尺寸 BGR，不做全尺寸去马赛克；
+缓存总大小超过上限时按最近使用时间淘汰。
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import cv2
+from PIL import Image
+
+from control.frame_archive import frame_identity, is_raw_frame_path, read_image
+
+# 缩略图宽度范围
+MIN_WIDTH = 16
+MAX_WIDTH = 2048
+
+# 常用宽度，请求宽度向上取到这些值，减少缓存的变体数量
+WIDTH_STEPS = (64, 128, 160, 240, 320, 480, 640, 800, 1024, 1280, 1600, 2048)
+
+THUMBNAIL_QUALITY = 80
+
+
+def normalize_width(width):
+    """将请求的宽度向上取到最近的常用宽度"""
+    width = max(MIN_WIDTH, min(int(width), MAX_WIDTH))
+    for step in WIDTH_STEPS:
+        if width <= step:
+            return step
+    return MAX_WIDTH
+
+
+def create_thumbnail(source_path, output_path, width, quality=THUMBNAIL_QUALITY):
+    """
+    生成宽度不超过 width 的 JPEG 缩略图（不放大）
+    :param source_path: 原图路径，也可以是原始帧（归档帧或 .npy）
+    :param output_path: 缩略图保存路径
+    :param width: 最大宽度
+    :param quality: JPEG 质量
+    """
+    if is_raw_frame_path(source_path):
+        frame = read_image(source_path, half=True)
+        if frame is None:
+            raise ValueError(f"无法读取原始帧: {source_path}")
+        source = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    else:
+        source = Image.open(source_path)
+    with source as image:
+        src_width, src_height = image.size
+        height = max(1, round(src_height * width / src_width))
+        # JPEG 按 DCT 缩放解码，得到不小于目标尺寸的最小图像
+        image.draft("RGB", (width, height))
+        image = image.convert("RGB")
+        image.thumbnail((width, height), Image.BILINEAR)
+        tmp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        image.save(tmp_path, "JPEG", quality=quality, optimize=True)
+    os.replace(tmp_path, output_path)
+
+
+class ThumbnailCache:
+    """
+    缩略图的磁盘 LRU 缓存，可在多个线程中同时使用
+    """
+
+    def __init__(self, cache_dir, max_bytes=512 * 1024 * 1024):
+        """
+        :param cache_dir: 缓存目录
+        :param max_bytes: 缓存总大小上限（字节）
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._entries = OrderedDict()  # 缓存键 -> 文件大小，按最近使用排序
+        self._total_bytes = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        """扫描已有的缓存文件，按修改时间（即最近使用时间）排序"""
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".jpg"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            files.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    @staticmethod
+    def cache_key(source_path, width):
+        """由原图路径、修改时间、大小（归档帧为帧记录）和缩略图宽度计算缓存键，原图变化后自动失效"""
+        identity = f"{frame_identity(source_path)}|{width}|{THUMBNAIL_QUALITY}"
+        return hashlib.sha1(identity.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".jpg")
+
+    def get(self, source_path, width):
+        """
+        获取缩略图，缓存中没有时生成
+        :param source_path: 原图路径
+        :param width: 缩略图宽度（会取到常用宽度）
+        :return: (缩略图路径, 缓存键)，缓存键可直接作为 ETag
+        """
+        width = normalize_width(width)
+        key = self.cache_key(source_path, width)
+        path = self._path(key)
+
+        with self._lock:
+            if key in self._entries and os.path.exists(path):
+                self._touch(key, path)
+                return path, key
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # 同一缩略图只生成一次，其他请求等待
+        with key_lock:
+            if not os.path.exists(path):
+                create_thumbnail(source_path, path, width)
+            size = os.path.getsize(path)
+            with self._lock:
+                self._key_locks.pop(key, None)
+                self._total_bytes += size - self._entries.get(key, 0)
+                self._entries[key] = size
+                self._entries.move_to_end(key)
+                self._evict()
+        return path, key
+
+    def _touch(self, key, path):
+        """更新最近使用时间（持有 self._lock）"""
+        self._entries.move_to_end(key)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _evict(self):
+        """淘汰最久未使用的缩略图直到不超过上限（持有 self._lock），保留最新的一个"""
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def stats(self):
+        """缓存状态"""
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._total_bytes, "max_bytes": self.max_bytes}
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            for key in list(self._entries):
+                try:
+                    os.remove(self._path(key))
+                except OSError:
+                    pass
+            self._entries.clear()
+            self._total_bytes = 0
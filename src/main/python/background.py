@@ -1,4 +1,6 @@
 import os
+import threading
+from multiprocessing import shared_memory
 import cv2
 import numpy as np
 import logging
@@ -7,6 +9,235 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 背景图片文件名
+GLOBAL_BACKGROUND_FILE = "G1.bmp"
+LOCAL_BACKGROUND_FILE = "L1.bmp"
+
+
+class BackgroundModel:
+    """
+    Background image loaded once per process.
+
+    Holds the BGR image (optionally rescaled) and lazily built variants resized
+    to the shapes of incoming images. The model is reloaded when the file's
+    modification time changes.
+    """
+
+    def __init__(self, path, scale=1.0, interpolation=cv2.INTER_CUBIC):
+        """
+        Args:
+            path: Path to the background image
+            scale: Scale factor applied after loading (global backgrounds are upscaled 5x)
+            interpolation: Interpolation used for the scale factor
+        """
+        self.path = path
+        self.scale = scale
+        self.interpolation = interpolation
+        self.mtime = None
+        self.image = None
+        self._variants = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """Read the image from disk and rebuild the cached data."""
+        mtime = os.path.getmtime(self.path)
+        image = cv2.imread(self.path)
+        if image is None:
+            raise ValueError(f"Could not load background image from {self.path}")
+        if self.scale != 1.0:
+            image = cv2.resize(image, None, fx=self.scale, fy=self.scale, interpolation=self.interpolation)
+        with self._lock:
+            self.image = image
+            self._variants = {}
+            self.mtime = mtime
+        logger.info(f"Loaded background model from {self.path} (scale={self.scale})")
+
+    def is_stale(self):
+        """Return True if the file on disk changed since it was loaded."""
+        try:
+            return os.path.getmtime(self.path) != self.mtime
+        except OSError:
+            return False
+
+    def refresh(self):
+        """Reload the model if the file on disk changed."""
+        if self.is_stale():
+            self.load()
+        return self
+
+    @property
+    def shape(self):
+        return self.image.shape
+
+    def resized(self, shape, interpolation=cv2.INTER_LINEAR):
+        """
+        Get the BGR background resized to the given image shape.
+
+        Args:
+            shape: Target shape, (height, width) or (height, width, channels)
+            interpolation: Interpolation used for resizing
+
+        Returns:
+            The cached resized background, or the original image when the size already matches
+        """
+        height, width = shape[:2]
+        if self.image.shape[:2] == (height, width):
+            return self.image
+        key = (height, width, interpolation)
+        with self._lock:
+            variant = self._variants.get(key)
+            if variant is None:
+                variant = cv2.resize(self.image, (width, height), interpolation=interpolation)
+                self._variants[key] = variant
+        return variant
+
+
+_background_registry = {}
+_background_registry_lock = threading.Lock()
+
+
+def load_background(path, scale=1.0):
+    """
+    Get the process-wide BackgroundModel for a file, loading it on first use.
+
+    Args:
+        path: Path to the background image
+        scale: Scale factor applied after loading
+
+    Returns:
+        BackgroundModel, reloaded if the file changed since it was cached
+    """
+    key = (os.path.abspath(path), float(scale))
+    with _background_registry_lock:
+        model = _background_registry.get(key)
+        if model is None:
+            model = BackgroundModel(path, scale)
+            _background_registry[key] = model
+            return model
+    return model.refresh()
+
+
+def load_view_background(background_path, view_type, scale=1.0):
+    """
+    Get the BackgroundModel of a view from the background directory.
+
+    Args:
+        background_path: Path to the directory containing background images
+        view_type: 'global' or 'local'
+        scale: Scale factor applied after loading
+
+    Returns:
+        BackgroundModel of G1.bmp for 'global', L1.bmp otherwise
+    """
+    filename = GLOBAL_BACKGROUND_FILE if view_type == "global" else LOCAL_BACKGROUND_FILE
+    return load_background(os.path.join(background_path, filename), scale)
+
+
+def background_image(background):
+    """Return the BGR ndarray of a BackgroundModel or pass an ndarray through."""
+    if isinstance(background, BackgroundModel):
+        return background.image
+    return background
+
+
+class SharedBackgrounds:
+    """
+    Background images placed once in shared memory for process pool workers.
+
+    Arrays referenced by several keys (read_backgrounds_* map many keys to the same
+    image) are copied only once. Pass ``specs`` to ``attach_shared_backgrounds`` as the
+    pool initializer; tasks then only need to carry the key.
+    """
+
+    def __init__(self, background_models):
+        """
+        Args:
+            background_models: Dictionary of key -> BGR ndarray or BackgroundModel
+        """
+        self.specs = {}
+        self._segments = []
+        segment_by_id = {}
+        try:
+            for key, background in background_models.items():
+                image = background_image(background)
+                if image is None:
+                    continue
+                image_id = id(image)
+                spec = segment_by_id.get(image_id)
+                if spec is None:
+                    image = np.ascontiguousarray(image)
+                    segment = shared_memory.SharedMemory(create=True, size=max(image.nbytes, 1))
+                    self._segments.append(segment)
+                    np.ndarray(image.shape, dtype=image.dtype, buffer=segment.buf)[...] = image
+                    spec = (segment.name, image.shape, image.dtype.str)
+                    segment_by_id[image_id] = spec
+                self.specs[key] = spec
+        except Exception:
+            self.close()
+            raise
+        logger.info(f"Placed {len(self._segments)} background images in shared memory for {len(self.specs)} keys")
+
+    def close(self):
+        """Release and unlink the shared memory segments."""
+        for segment in self._segments:
+            try:
+                segment.close()
+                segment.unlink()
+            except FileNotFoundError:
+                pass
+        self._segments = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# Background images attached in a pool worker, key -> read-only ndarray
+_shared_backgrounds = {}
+_shared_segments = []
+
+
+def attach_segment(name):
+    """Attach an existing shared memory segment without taking ownership of it."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13: pool workers share the parent's resource tracker, where the
+        # segment is already registered, so attaching does not add another owner
+        return shared_memory.SharedMemory(name=name)
+
+
+def attach_shared_backgrounds(specs):
+    """
+    Process pool initializer: attach the shared background images read-only.
+
+    Args:
+        specs: SharedBackgrounds.specs from the parent process
+    """
+    segments = {}
+    for key, (name, shape, dtype) in specs.items():
+        segment = segments.get(name)
+        if segment is None:
+            segment = attach_segment(name)
+            segments[name] = segment
+        image = np.ndarray(shape, dtype=np.dtype(dtype), buffer=segment.buf)
+        image.flags.writeable = False
+        _shared_backgrounds[key] = image
+    _shared_segments.extend(segments.values())
+
+
+def get_shared_background(key):
+    """Get a background image attached by attach_shared_backgrounds."""
+    try:
+        return _shared_backgrounds[key]
+    except KeyError:
+        available_keys = list(_shared_backgrounds.keys())[:5]
+        raise KeyError(f"Shared background '{key}' not attached. Available keys (partial): {available_keys}")
+
+
 def read_backgrounds_single(background_path):
     """
     Read background images for single grading samples.
@@ -23,9 +254,9 @@ def read_backgrounds_single(background_path):
         background_models = {}
         
         # Load the global background from G1.bmp
-        global_bg_path = os.path.join(background_path, "G1.bmp")
+        global_bg_path = os.path.join(background_path, GLOBAL_BACKGROUND_FILE)
         if os.path.exists(global_bg_path):
-            global_bg = cv2.imread(global_bg_path)
+            global_bg = load_background(global_bg_path).image
             
             # Add the same global background for all sample indices
             for sample_index in ["0.075", "0.15", "0.3", "0.6", "1.18", "2.36"]:
@@ -41,9 +272,9 @@ def read_backgrounds_single(background_path):
             logger.error(f"Global background file not found: {global_bg_path}")
             
         # Load the local background from L1.bmp
-        local_bg_path = os.path.join(background_path, "L1.bmp")
+        local_bg_path = os.path.join(background_path, LOCAL_BACKGROUND_FILE)
         if os.path.exists(local_bg_path):
-            local_bg = cv2.imread(local_bg_path)
+            local_bg = load_background(local_bg_path).image
             
             # Add the same local background for all sample indices
             for sample_index in ["0.075", "0.15", "0.3", "0.6", "1.18", "2.36"]:
@@ -80,9 +311,9 @@ def read_backgrounds_mixture(background_path):
         background_models = {}
         
         # Load the global background from G1.bmp
-        global_bg_path = os.path.join(background_path, "G1.bmp")
+        global_bg_path = os.path.join(background_path, GLOBAL_BACKGROUND_FILE)
         if os.path.exists(global_bg_path):
-            global_bg = cv2.imread(global_bg_path)
+            global_bg = load_background(global_bg_path).image
             
             # Add global background for mixture samples (1-6)
             for i in range(1, 7):
@@ -94,9 +325,9 @@ def read_backgrounds_mixture(background_path):
             logger.error(f"Global background file not found: {global_bg_path}")
             
         # Load the local background from L1.bmp
-        local_bg_path = os.path.join(background_path, "L1.bmp")
+        local_bg_path = os.path.join(background_path, LOCAL_BACKGROUND_FILE)
         if os.path.exists(local_bg_path):
-            local_bg = cv2.imread(local_bg_path)
+            local_bg = load_background(local_bg_path).image
             
             # Add local background for mixture samples (1-6)
             for i in range(1, 7):
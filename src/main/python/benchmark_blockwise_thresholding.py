@@ -0,0 +1,101 @@
+"""
+分块阈值化性能对比：直方图向量化实现 vs 逐块 scipy.stats.mode 实现
+
+用法：
+    python benchmark_blockwise_thresholding.py [图片路径 ...] [--repeat N]
+
+未提供图片时，使用与全局(3072x2048)、局部(5472x3648)相机分辨率一致的合成灰度图；
+提供图片时，按 pictures_handle 中的预处理（灰度化 + 线性对比度增强）后参与测试。
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+# 添加项目根目录到路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.insert(0, current_dir)
+
+from zsh_image_handle import (blockwise_thresholding, blockwise_thresholding_mode,
+                              enhance_contrast_linear_transform)
+
+# 全局与局部相机的图像尺寸 (height, width)
+IMAGE_SIZES = {
+    "global": (2048, 3072),
+    "local": (3648, 5472),
+}
+
+# 参与测试的块网格，包含不能整除图像尺寸的情况
+BLOCK_GRIDS = [8, (7, 9), 16]
+
+
+def create_synthetic_gray(shape, seed=0):
+    """生成模拟砂粒图像的灰度图：低灰度背景上叠加亮斑和噪声"""
+    rng = np.random.default_rng(seed)
+    height, width = shape
+    gray = rng.normal(20, 4, size=shape).clip(0, 255).astype(np.uint8)
+    for _ in range(2000):
+        center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        radius = int(rng.integers(3, 30))
+        cv2.circle(gray, center, radius, int(rng.integers(40, 110)), -1)
+    return gray
+
+
+def load_gray(image_path):
+    """按 pictures_handle 的预处理流程得到灰度图"""
+    image = cv2.imread(image_path)
+    if image is None:
+        raise ValueError(f"无法加载图像: {image_path}")
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return enhance_contrast_linear_transform(gray, alpha=0.4, beta=5)
+
+
+def time_function(func, gray, block_size, repeat):
+    """返回最优耗时（秒）和最后一次结果"""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(gray, block_size)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run_benchmark(name, gray, repeat):
+    print(f"\n=== {name}: {gray.shape[1]}x{gray.shape[0]} ===")
+    all_identical = True
+    for block_size in BLOCK_GRIDS:
+        t_mode, r_mode = time_function(blockwise_thresholding_mode, gray, block_size, repeat)
+        t_hist, r_hist = time_function(blockwise_thresholding, gray, block_size, repeat)
+        identical = np.array_equal(r_mode, r_hist)
+        all_identical = all_identical and identical
+        print(f"块网格 {str(block_size):>8}: scipy.mode {t_mode * 1000:8.1f} ms | "
+              f"直方图 {t_hist * 1000:8.1f} ms | 加速 {t_mode / t_hist:5.1f}x | "
+              f"结果一致: {identical}")
+    return all_identical
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分块阈值化性能对比")
+    parser.add_argument("images", nargs="*", help="待测试的图片路径")
+    parser.add_argument("--repeat", type=int, default=3, help="每项测试重复次数，取最优值")
+    args = parser.parse_args()
+
+    all_identical = True
+    if args.images:
+        for image_path in args.images:
+            all_identical &= run_benchmark(os.path.basename(image_path), load_gray(image_path), args.repeat)
+    else:
+        for name, shape in IMAGE_SIZES.items():
+            all_identical &= run_benchmark(name, create_synthetic_gray(shape), args.repeat)
+
+    print("\n所有结果逐位一致" if all_identical else "\n警告：存在不一致的结果！")
+    return 0 if all_identical else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
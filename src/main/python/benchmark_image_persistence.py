@@ -0,0 +1,126 @@
+"""
+相机图片保存方式性能对比：各保存后端（control/image_persistence.py）的拍摄到落盘延迟与每帧字节数
+
+用法：
+    python benchmark_image_persistence.py [--frames N] [--workers N] [--backends jpeg,png ...] [--size 5472x3648]
+                                          [--fsync] [--output 目录]
+
+生成背光下颗粒的合成 Bayer 帧（默认局部相机分辨率 5472x3648），与 CameraControl 相同：
+帧按拍摄间隔放入保存队列，由 --workers 个保存线程取帧编码写入。
+拍摄到落盘延迟为帧放入队列到文件改名完成（--fsync 时为 fsync 完成）的时间。
+"""
+import argparse
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# 添加项目根目录到路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.insert(0, current_dir)
+
+from control.image_persistence import BACKENDS, create_backend
+from utils.tracing import percentile
+
+
+def create_bayer_frame(shape=(3648, 5472), particles=3000, seed=0):
+    """生成合成 Bayer GB 帧：亮背景上的深色颗粒，带少量噪声"""
+    rng = np.random.default_rng(seed)
+    height, width = shape
+    frame = np.full(shape, 220, dtype=np.uint8)
+    for _ in range(particles):
+        center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        axes = (int(rng.integers(3, 25)), int(rng.integers(3, 25)))
+        cv2.ellipse(frame, center, axes, float(rng.uniform(0, 180)), 0, 360, int(rng.integers(30, 90)), -1)
+    noise = rng.integers(0, 6, size=shape, dtype=np.uint8)
+    return cv2.add(frame, noise)
+
+
+def run_backend(name, raw, image, frames, workers, interval, fsync, output_dir):
+    backend = create_backend(name, fsync=fsync)
+    directory = os.path.join(output_dir, name)
+    os.makedirs(directory, exist_ok=True)
+    save_queue = queue.Queue()
+    latencies = []
+    paths = []
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            item = save_queue.get()
+            if item is None:
+                return
+            count, queued_time = item
+            path = backend.save(image, raw, os.path.join(directory, f"1_{count}"), queued_time)
+            done = time.perf_counter()
+            with lock:
+                latencies.append(done - queued_time)
+                paths.append(path)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    start = time.perf_counter()
+    for count in range(1, frames + 1):
+        save_queue.put((count, time.perf_counter()))
+        if interval:
+            time.sleep(interval)
+    for _ in threads:
+        save_queue.put(None)
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    backend.close()
+
+    # 每种保存方式单独一个目录，按目录总大小平均（段文件包含记录头）
+    total = sum(os.path.getsize(os.path.join(directory, filename)) for filename in os.listdir(directory))
+    latencies.sort()
+    return {
+        "name": name,
+        "mean": sum(latencies) / len(latencies) * 1000,
+        "p95": percentile(latencies, 95) * 1000,
+        "fps": frames / elapsed,
+        "bytes": total / len(paths),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="相机图片保存方式性能对比")
+    parser.add_argument("--frames", type=int, default=20, help="每种保存方式保存的帧数")
+    parser.add_argument("--workers", type=int, default=2, help="保存线程数（CAMERA_SAVE_WORKERS）")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help="逗号分隔的保存方式")
+    parser.add_argument("--size", default="5472x3648", help="帧尺寸，宽x高")
+    parser.add_argument("--interval", type=float, default=0.0, help="拍摄间隔（秒），0 为一次放入全部帧")
+    parser.add_argument("--fsync", action="store_true", help="每帧写入后 fsync")
+    parser.add_argument("--output", help="保存目录，默认使用临时目录并在结束后删除")
+    args = parser.parse_args()
+
+    width, height = (int(value) for value in args.size.lower().split("x"))
+    raw = create_bayer_frame((height, width))
+    image = cv2.cvtColor(raw, cv2.COLOR_BAYER_GB2BGR)
+    output_dir = args.output or tempfile.mkdtemp(prefix="sand_persistence_")
+    print(f"帧尺寸 {width}x{height}, BGR {image.nbytes / 1024 / 1024:.1f} MB, {args.frames} 帧, "
+          f"{args.workers} 个保存线程, fsync={args.fsync}, 保存到 {output_dir}")
+
+    try:
+        print(f"\n{'保存方式':<12}{'平均延迟(ms)':>14}{'p95(ms)':>10}{'帧/秒':>9}{'每帧(KB)':>12}")
+        for name in args.backends.split(","):
+            result = run_backend(name.strip(), raw, image, args.frames, args.workers, args.interval, args.fsync,
+                                 output_dir)
+            print(f"{result['name']:<12}{result['mean']:>14.1f}{result['p95']:>10.1f}{result['fps']:>9.1f}"
+                  f"{result['bytes'] / 1024:>12.0f}")
+    finally:
+        if not args.output:
+            shutil.rmtree(output_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""
+粘连颗粒分割性能对比：显式栈 + 向量化筛选实现 vs 原递归实现
+
+用法：
+    python benchmark_split_contours.py [二值图路径 ...] [--particles N] [--repeat N]
+
+未提供图片时，生成局部相机分辨率(5472x3648)下的密集合成二值图（大量相互粘连的圆形颗粒）；
+提供图片时，直接对二值图（如 pictures_handle 返回的 binary）提取外轮廓后测试。
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+# 添加项目根目录到路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.insert(0, current_dir)
+
+import image_config
+from config.default_config import local_mm_per_pixel
+from zsh_image_handle import split_contours, split_contour_recursive
+
+
+def create_dense_binary(shape=(3648, 5472), particles=6000, seed=0):
+    """生成密集的合成二值图，颗粒之间随机粘连"""
+    rng = np.random.default_rng(seed)
+    height, width = shape
+    binary = np.zeros(shape, dtype=np.uint8)
+    for _ in range(particles):
+        center = (int(rng.integers(20, width - 20)), int(rng.integers(20, height - 20)))
+        axes = (int(rng.integers(4, 30)), int(rng.integers(4, 30)))
+        cv2.ellipse(binary, center, axes, float(rng.uniform(0, 180)), 0, 360, 255, -1)
+    return binary
+
+
+def load_binary(image_path):
+    binary = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    if binary is None:
+        raise ValueError(f"无法加载图像: {image_path}")
+    return cv2.threshold(binary, 127, 255, cv2.THRESH_BINARY)[1]
+
+
+def split_recursive(contours, angle_threshold, mm_per_pixel):
+    contours_splited = []
+    for contour in contours:
+        split_contour_recursive(contour, contours_splited, 0, angle_threshold, mm_per_pixel)
+    return contours_splited
+
+
+def same_contours(a, b):
+    return len(a) == len(b) and all(np.array_equal(x, y) for x, y in zip(a, b))
+
+
+def run_benchmark(name, binary, repeat):
+    contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    contours = list(contours)
+    angle_k = image_config.local_angle_k
+    print(f"\n=== {name}: {binary.shape[1]}x{binary.shape[0]}, {len(contours)} 个轮廓 ===")
+
+    timings = {}
+    results = {}
+    for label, func in [("递归实现", split_recursive), ("向量化实现", split_contours)]:
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            results[label] = func(contours, angle_k, local_mm_per_pixel)
+            best = min(best, time.perf_counter() - start)
+        timings[label] = best
+        print(f"{label}: {best * 1000:9.1f} ms, 分割后 {len(results[label])} 个颗粒")
+
+    identical = same_contours(results["递归实现"], results["向量化实现"])
+    print(f"加速 {timings['递归实现'] / timings['向量化实现']:.2f}x | 结果一致: {identical}")
+    return identical
+
+
+def main():
+    parser = argparse.ArgumentParser(description="粘连颗粒分割性能对比")
+    parser.add_argument("images", nargs="*", help="待测试的二值图路径")
+    parser.add_argument("--particles", type=int, default=6000, help="合成图像中的颗粒数量")
+    parser.add_argument("--repeat", type=int, default=3, help="每项测试重复次数，取最优值")
+    args = parser.parse_args()
+
+    all_identical = True
+    if args.images:
+        for image_path in args.images:
+            all_identical &= run_benchmark(os.path.basename(image_path), load_binary(image_path), args.repeat)
+    else:
+        binary = create_dense_binary(particles=args.particles)
+        all_identical &= run_benchmark("synthetic", binary, args.repeat)
+
+    print("\n所有结果一致" if all_identical else "\n警告：存在不一致的结果！")
+    return 0 if all_identical else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
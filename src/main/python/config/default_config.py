@@ -51,6 +51,32 @@ RESULTS_PATH = r"C:\Users\ASUS\Desktop\SandControl\results"
 # 视图设置
 main_view = 'global'
 
+# 实验分析进程池
+ANALYSIS_WORKERS = None  # 分析进程数，None 使用 CPU 核数
+ANALYSIS_MAX_PENDING = 16  # 最多等待分析的帧数，达到后拍照线程等待（背压）
+
+# 电子秤后台采样
+SCALE_SAMPLE_RATE = 20  # 采样频率（Hz）
+SCALE_BUFFER_SIZE = 600  # 环形缓冲保留的采样数
+SCALE_SLAVE = 0x01  # 电子秤从站地址
+
+# 预测式给料
+FEEDING_INITIAL_LAG = 0.0  # 初始滞后时间（秒），0 即首次给料与以前一样到达目标才关闭
+FEEDING_LEARNING_RATE = 0.3  # 滞后时间、流量逐次学习的指数加权系数
+FEEDING_DOSE_TIMEOUT = 60.0  # 尚未学到流量时单次给料的最长时间（秒），超时关闭给料并视为给料失败
+FEEDING_TIMEOUT_FACTOR = 3.0  # 学到流量后单次给料最长时间 = 目标值 / 流量 × 该系数
+FEEDING_MIN_DOSE_TIMEOUT = 10.0  # 按流量计算的给料最长时间的下限（秒）
+
+# 相机图片保存
+CAMERA_SAVE_TIMEOUT = 10.0  # 拍照后等待图片写入磁盘的最长时间（秒）
+CAMERA_SAVE_BACKEND = "jpeg"  # 保存方式：pil_jpeg、jpeg、png、tiff、npy、raw_append（见 control/image_persistence.py）
+# raw_append 为原始 Bayer 帧归档模式：只写入单通道原始数据（约为 BGR 的 1/3），分析和图片 API 读取时才去马赛克
+CAMERA_SAVE_WORKERS = 2  # 每个相机的保存（编码）线程数
+CAMERA_FRAME_RING_SLOTS = 4  # 每个相机预分配的帧缓冲槽位数，应大于同时在保存、分析中的帧数
+
+# 实验阶段调度
+EXPERIMENT_OVERLAP_FEEDING = True  # 下一组的给料称量与本组拍照、清砂同时进行；振动影响称量时设为 False
+
 # 主分布列表 (从旧config.py合并)
 main_distributions = []
 
@@ -0,0 +1,254 @@
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# 添加项目根目录到路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from config.default_config import ANALYSIS_WORKERS, ANALYSIS_MAX_PENDING
+from background import attach_segment
+from control.frame_archive import image_exists
+from result_store import get_result_store
+from utils.tracing import tracer
+from utils.metrics import registry as metrics_registry, ANALYSIS_QUEUE_WAIT_SECONDS, ANALYSIS_IMAGE_SECONDS
+
+
+def analyze_image(image_path, image_type, image=None, session_id=None):
+    """
+    处理单张图片并将结果追加写入结果存储
+    :param image_path: 图片路径，image 不为空时只用于命名结果
+    :param image_type: 图片类型，global 或 local
+    :param image: 相机直接传入的 BGR 帧，为空时从 image_path 读取
+    :param session_id: 结果存储中的实验会话编号，None 时不保存结果
+    :return: 处理成功时返回结果编号（未保存时返回 True），失败时返回 None
+    """
+    try:
+        # 导入图片处理模块（进程内只导入一次）
+        from process_sand_images import process_image, load_background_model
+
+        print(f"开始异步处理单张图片: {image_path} (类型: {image_type})")
+
+        # 检查图片文件是否存在
+        if image is None and not image_exists(image_path):
+            print(f"图片文件不存在: {image_path}")
+            return None
+
+        # 加载背景模型（进程内缓存，只在首次或背景文件变化时读取磁盘）
+        with tracer.span("analysis.load_background", "analysis"):
+            background = load_background_model(image_type)
+        if background is None:
+            print(f"无法加载 {image_type} 背景模型")
+            return None
+
+        # 处理单张图片
+        with tracer.span("analysis.process_image", "analysis", image_type=image_type), \
+                ANALYSIS_IMAGE_SECONDS.time(image_type=image_type):
+            result = process_image(image_path, background, image_type, debug=False, image=image)
+
+        # 构建单张图片的结果数据，失败的图片同样记录，计入 totalImages
+        single_result = {
+            "image_path": image_path,
+            "image_type": image_type,
+            "original_path": result.get("original_path"),
+            "classified_path": result.get("classified_path"),
+            "segmented_path": result.get("segmented_path"),
+            "contours_count": result.get("contours_count", 0),
+            "grade_statistics": result.get("grade_statistics", []),
+            "success": result["success"],
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "processing_id": datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]  # 包含毫秒
+        }
+        result_id = None
+        if session_id is not None:
+            with tracer.span("analysis.store_result", "analysis"):
+                result_id = get_result_store().add_result(session_id, single_result)
+
+        if result["success"]:
+            print(f"单张图片处理完成，结果编号: {result_id}")
+            return result_id if result_id is not None else True
+        else:
+            print(f"单张图片处理失败: {result.get('error', 'Unknown error')}")
+            return None
+
+    except Exception as e:
+        print(f"异步处理单张图片出错: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return None
+
+
+def _init_analysis_worker():
+    """分析进程初始化：预先导入处理模块并加载全局、局部背景模型"""
+    from process_sand_images import load_background_model
+    for image_type in ("global", "local"):
+        if load_background_model(image_type) is None:
+            print(f"分析进程 {os.getpid()}: 无法预加载 {image_type} 背景模型")
+    print(f"分析进程 {os.getpid()} 已就绪")
+
+
+def _analyze_shared_frame(image_path, image_type, frame_spec, session_id, submit_time):
+    """
+    在分析进程中处理共享内存中的帧，frame_spec 为 (共享内存名, 形状, dtype)
+    :param submit_time: 提交时间（time.time()），用于记录排队耗时
+    :return: (结果编号, 本次分析的计时记录, 指标更新)，由主进程合并到实验 trace 和指标中
+    """
+    with tracer.capture(f"analysis-worker-{os.getpid()}") as events, metrics_registry.capture() as updates:
+        start = time.time()
+        tracer.record("analysis.queue_wait", submit_time, start - submit_time, "analysis",
+                      image=os.path.basename(image_path))
+        ANALYSIS_QUEUE_WAIT_SECONDS.observe(start - submit_time)
+        with tracer.span("analysis.frame", "analysis", image=os.path.basename(image_path), image_type=image_type):
+            result = _analyze_frame(image_path, image_type, frame_spec, session_id)
+    return result, events, updates
+
+
+def _analyze_frame(image_path, image_type, frame_spec, session_id):
+    """frame_spec 为空时从磁盘读取图片，否则映射共享内存中的帧进行分析"""
+    if frame_spec is None:
+        return analyze_image(image_path, image_type, session_id=session_id)
+    name, shape, dtype = frame_spec
+    segment = attach_segment(name)
+    try:
+        image = np.ndarray(shape, dtype=np.dtype(dtype), buffer=segment.buf)
+        image.flags.writeable = False
+        try:
+            return analyze_image(image_path, image_type, image, session_id)
+        finally:
+            del image
+    finally:
+        segment.close()
+
+
+class AnalysisPool:
+    """
+    实验期间常驻的分析进程池：
+    每个进程启动时预加载背景模型，帧通过共享内存传递，不经过 pickle 复制；
+    等待分析的帧数达到 max_pending 时 submit 阻塞，拍照流程随之放慢（背压）
+    """
+
+    def __init__(self, max_workers=None, max_pending=None, session_id=None):
+        """
+        :param max_workers: 分析进程数，None 使用 ANALYSIS_WORKERS 配置（再为 None 时使用 CPU 核数）
+        :param max_pending: 最多等待分析（排队和处理中）的帧数，None 使用 ANALYSIS_MAX_PENDING 配置
+        :param session_id: 结果存储中的实验会话编号
+        """
+        self.session_id = session_id
+        self.max_workers = max_workers or ANALYSIS_WORKERS or os.cpu_count() or 1
+        self.max_pending = max_pending or ANALYSIS_MAX_PENDING
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.completed = 0
+        self.failed = 0
+
+    def start(self):
+        """启动分析进程，每次实验启动一次"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_analysis_worker)
+            print(f"分析进程池已启动: {self.max_workers} 个进程, 最多 {self.max_pending} 帧排队")
+        return self
+
+    def submit(self, image_path, image_type, image=None, timeout=None):
+        """
+        提交一帧分析任务，排队已满时阻塞等待
+        :param image_path: 图片路径，image 不为空时只用于命名结果
+        :param image_type: 图片类型，global 或 local
+        :param image: 相机内存帧，为空时分析进程从 image_path 读取
+        :param timeout: 排队已满时的最长等待秒数，None 表示一直等待
+        :return: Future，结果为结果编号（失败时为 None）；等待超时返回 None
+        """
+        submit_time = time.time()
+        if self._executor is None:
+            self.start()
+        if not self._slots.acquire(timeout=timeout):
+            print(f"分析队列已满({self.max_pending})，放弃处理: {image_path}")
+            return None
+
+        segment = None
+        try:
+            frame_spec = None
+            if image is not None:
+                image = np.ascontiguousarray(image)
+                segment = shared_memory.SharedMemory(create=True, size=max(image.nbytes, 1))
+                np.ndarray(image.shape, dtype=image.dtype, buffer=segment.buf)[...] = image
+                frame_spec = (segment.name, image.shape, image.dtype.str)
+            future = self._executor.submit(_analyze_shared_frame, image_path, image_type, frame_spec,
+                                           self.session_id, submit_time)
+        except Exception:
+            self._slots.release()
+            if segment is not None:
+                segment.close()
+                segment.unlink()
+            raise
+
+        with self._lock:
+            self._pending += 1
+        # 分析进程返回 (结果编号, 计时记录, 指标更新)，对外的 Future 只给出结果编号
+        result_future = Future()
+        future.add_done_callback(lambda f: self._task_done(f, segment, result_future))
+        return result_future
+
+    def _task_done(self, future, segment, result_future):
+        """任务结束：释放共享内存和排队名额，合并分析进程的计时记录和指标"""
+        if segment is not None:
+            segment.close()
+            segment.unlink()
+        result = None
+        if future.cancelled():
+            result_future.cancel()
+        elif future.exception() is not None:
+            result_future.set_exception(future.exception())
+        else:
+            result, events, updates = future.result()
+            tracer.merge(events)
+            metrics_registry.apply(updates)
+        with self._lock:
+            self._pending -= 1
+            if result:
+                self.completed += 1
+            else:
+                self.failed += 1
+            backlog = self._pending
+        self._slots.release()
+        tracer.counter("analysis.backlog", "analysis", frames=backlog)
+        if not result_future.done():
+            result_future.set_result(result)
+
+    def backlog(self):
+        """等待分析（排队和处理中）的帧数"""
+        with self._lock:
+            return self._pending
+
+    def stats(self):
+        """分析进程池状态"""
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "backlog": self._pending,
+                "completed": self.completed,
+                "failed": self.failed,
+            }
+
+    def shutdown(self, wait=True):
+        """关闭分析进程，wait 为 True 时等待已提交的任务完成"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=not wait)
+            self._executor = None
+            print("分析进程池已关闭")
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
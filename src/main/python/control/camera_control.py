@@ -3,19 +3,24 @@ import os
 import queue
 import threading
 import time
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from ctypes import cast, memset, c_ubyte, memmove
 from _ctypes import POINTER, byref, sizeof
 
 import cv2
 import numpy as np
 from modbus_tk import modbus_tcp
-from PIL import Image
 from camera.MvImport.CameraParams_const import MV_GIGE_DEVICE, MV_USB_DEVICE, MV_ACCESS_Exclusive
 from camera.MvImport.CameraParams_header import MV_CC_DEVICE_INFO_LIST, MV_CC_DEVICE_INFO, MV_FRAME_OUT
 from camera.MvImport.MvCameraControl_class import MvCamera
-from config.default_config import WGD_IP, WGD_PORT
+from config.default_config import (WGD_IP, WGD_PORT, CAMERA_SAVE_TIMEOUT, CAMERA_FRAME_RING_SLOTS,
+                                   CAMERA_SAVE_BACKEND, CAMERA_SAVE_WORKERS)
+from control.frame_ring import FrameRing
+from control.image_persistence import create_backend
 from utils.modbus_utils import triggle_single_action, stop_single_action
+from utils.tracing import tracer
+from utils.metrics import (FRAMES_CAPTURED, CAPTURE_ERRORS, GRAB_SECONDS, SAVE_QUEUE_DEPTH, SAVE_QUEUE_WAIT_SECONDS,
+                           ENCODE_SECONDS, FRAMES_SAVED)
 
 
 # 直接从Camera.MvImport导入，这里假设您已经将相机SDK文件迁移到相应位置
@@ -28,19 +33,29 @@ class CameraControl:
         self.b_is_grab = False
         self.thread_pool = ThreadPoolExecutor(max_workers=4)
         self.image_queues = [queue.Queue() for _ in range(2)]  # 为每个相机创建一个队列
+        # 每个相机预分配的帧缓冲，取图不再逐帧分配内存
+        self.frame_rings = [FrameRing(CAMERA_FRAME_RING_SLOTS, str(i)) for i in range(2)]
+        self.analysis_queue = None  # 分析队列，设置后解码后的帧直接送入分析，不再经过磁盘
         self.is_running = True
         self.save_threads = []
+        # 图片保存方式（JPEG、无损 PNG/TIFF、原始 Bayer 等）
+        self.persistence = create_backend(CAMERA_SAVE_BACKEND)
         self.tlayerType = MV_GIGE_DEVICE | MV_USB_DEVICE
         self.deviceList = MV_CC_DEVICE_INFO_LIST()
         self._enum_devices()
         self._open_devices()
 
         # 启动保存工作线程
+        self._start_save_workers()
+
+    def _start_save_workers(self):
+        """每个相机启动 CAMERA_SAVE_WORKERS 个保存线程，从该相机的保存队列取帧并行编码"""
         for i in range(len(self.cameras)):
-            save_thread = threading.Thread(target=self._save_worker, args=(i,))
-            save_thread.daemon = True
-            save_thread.start()
-            self.save_threads.append(save_thread)
+            for _ in range(max(1, CAMERA_SAVE_WORKERS)):
+                save_thread = threading.Thread(target=self._save_worker, args=(i,))
+                save_thread.daemon = True
+                save_thread.start()
+                self.save_threads.append(save_thread)
 
     def initialize(self):
         """初始化相机"""
@@ -54,11 +69,7 @@ class CameraControl:
             self._open_devices()
             
             # 启动保存工作线程
-            for i in range(len(self.cameras)):
-                save_thread = threading.Thread(target=self._save_worker, args=(i,))
-                save_thread.daemon = True
-                save_thread.start()
-                self.save_threads.append(save_thread)
+            self._start_save_workers()
                 
             return True
         except Exception as e:
@@ -133,9 +144,39 @@ class CameraControl:
 
         self.b_is_open = True if self.cameras else False
 
+    @staticmethod
+    def image_type(cam_index):
+        """相机对应的图片类型"""
+        return "global" if cam_index == 1 else "local"  # 修复local和global的对应关系
+
+    def image_stem(self, cam_index, base_path, count):
+        """相机图片不含扩展名的保存路径"""
+        return f"{base_path}/{self.image_type(cam_index)}/{count}"
+
+    def image_path(self, cam_index, base_path, count):
+        """
+        按当前保存方式预计的保存路径；原始帧归档（raw_append）保存后才知道所在段文件，
+        实际路径以保存结果（save_future.result()）为准
+        """
+        return self.image_stem(cam_index, base_path, count) + self.persistence.extension
+
+    def set_analysis_queue(self, analysis_queue):
+        """
+        设置分析队列，每帧以 (image, image_path, image_type, release, save_future) 放入队列，与磁盘保存并行进行；
+        image_path 为预计的保存路径，save_future 完成后的结果为实际保存路径（归档帧为 "<段文件>::<帧名称>"）。
+        image 在帧缓冲环中，分析不再使用后必须调用 release()（可为 None）归还缓冲。传入 None 关闭内存直通
+        """
+        self.analysis_queue = analysis_queue
+
     # 捕获图像
-    def capture_images(self, base_path, count):
-        """捕获图像并保存，返回拍摄的图片路径列表"""
+    def capture_images(self, base_path, count, wait_saved=True, timeout=None):
+        """
+        捕获图像并保存
+        :param wait_saved: 为 True 时等待图片完整写入磁盘后返回路径列表；为 False 时拍摄完成即返回保存 Future 列表
+        :param timeout: 等待写入磁盘的最长秒数，None 使用 CAMERA_SAVE_TIMEOUT 配置
+        :return: 已写入磁盘的图片路径列表（没有时为 None）；wait_saved 为 False 时返回 Future 列表，
+                 结果为图片路径，保存失败时为异常
+        """
         try:
             # 确保目录存在
             for folder_name in ["global", "local"]:
@@ -150,80 +191,119 @@ class CameraControl:
             sync_event = threading.Event()
             
             futures = []
-            captured_image_paths = []
+            save_futures = []
             
             # 获取图像数据并提交到线程池，确保同步拍摄
             def prepare_capture(cam_index):
                 nonlocal sync_event
                 # 等待同步事件，确保所有相机线程准备就绪
                 sync_event.wait()
-                # 开始捕获
-                self._capture_single_camera(cam_index, self.cameras[cam_index], base_path, count)
-                
-                # 构建图片路径
-                folder_name = "global" if cam_index == 1 else "local"  # 修复local和global的对应关系
-                image_path = f"{base_path}/{folder_name}/{count}.jpg"
-                return image_path
-            
-            # 提交所有捕获任务到线程池
-            for i in range(len(self.cameras)):
-                future = self.thread_pool.submit(prepare_capture, i)
-                futures.append(future)
-            
-            # 设置同步事件，触发所有相机同时开始捕获
-            sync_event.set()
+                # 开始捕获，返回该帧的保存 Future
+                return self._capture_single_camera(cam_index, self.cameras[cam_index], base_path, count)
             
-            # 等待所有捕获操作完成并收集图片路径
-            for future in futures:
-                image_path = future.result()
-                if image_path:
-                    captured_image_paths.append(image_path)
-
-            # 等待图片保存完成（给保存线程一些时间）
-            time.sleep(0.8)
-            
-            # 返回实际存在的图片路径
-            existing_paths = []
-            for path in captured_image_paths:
-                if os.path.exists(path):
-                    existing_paths.append(path)
+            with tracer.span("camera.capture", "camera", photo=str(count)):
+                # 提交所有捕获任务到线程池
+                for i in range(len(self.cameras)):
+                    future = self.thread_pool.submit(prepare_capture, i)
+                    futures.append(future)
+
+                # 设置同步事件，触发所有相机同时开始捕获
+                sync_event.set()
+
+                # 等待所有捕获操作完成并收集保存 Future
+                for future in futures:
+                    save_future = future.result()
+                    if save_future is not None:
+                        save_futures.append(save_future)
+
+            if not wait_saved:
+                return save_futures
+
+            # 等待保存线程把图片完整写入磁盘（以前固定等待 0.8 秒）
+            timeout = CAMERA_SAVE_TIMEOUT if timeout is None else timeout
+            with tracer.span("camera.save_wait", "camera"):
+                _, not_done = wait(save_futures, timeout=timeout)
+
+            saved_paths = []
+            for save_future in save_futures:
+                if save_future in not_done:
+                    print(f"警告：图片在 {timeout} 秒内未保存完成")
+                elif save_future.exception() is not None:
+                    print(f"警告：图片保存失败: {save_future.exception()}")
                 else:
-                    print(f"警告：图片文件不存在: {path}")
-            
-            return existing_paths if existing_paths else None
+                    saved_paths.append(save_future.result())
+
+            return saved_paths if saved_paths else None
 
         except Exception as e:
             print(f"图像捕获失败: {str(e)}")
             return None
 
     def _capture_single_camera(self, cam_index, cam, base_path, count):
-        """处理单个相机的图像捕获"""
+        """
+        处理单个相机的图像捕获
+        :return: 保存 Future，图片完整写入磁盘后结果为图片路径；取图失败时返回 None
+        """
+        slot = None
         try:
             stOutFrame = MV_FRAME_OUT()
             memset(byref(stOutFrame), 0, sizeof(stOutFrame))
+            grab_start = time.perf_counter()
 
-            ret = cam.MV_CC_GetImageBuffer(stOutFrame, 1000)
+            with tracer.span("camera.grab", "camera", camera=cam_index) as span_args:
+                ret = cam.MV_CC_GetImageBuffer(stOutFrame, 1000)
+                span_args["ret"] = ret
             if ret != 0:
                 print(f"相机 {cam_index} 获取图像缓冲失败! ret[0x%x]" % ret)
+                CAPTURE_ERRORS.inc(camera=cam_index)
                 return
 
-            # 创建图像数据的深拷贝
-            frame_data = (c_ubyte * stOutFrame.stFrameInfo.nFrameLen)()
-            memmove(frame_data, cast(stOutFrame.pBufAddr, POINTER(c_ubyte)), stOutFrame.stFrameInfo.nFrameLen)
-            
-            # 将图像数据转换为numpy数组并进行处理
-            image = np.asarray(frame_data)
-            image = image.reshape((stOutFrame.stFrameInfo.nHeight, stOutFrame.stFrameInfo.nWidth, 1))
-            image = cv2.cvtColor(image, cv2.COLOR_BAYER_GB2BGR)  # Bayer格式转换为BGR
-            
-            # 立即释放原始图像缓冲
-            cam.MV_CC_FreeImageBuffer(stOutFrame)
-
-            # 将处理后的图像数据放入队列
-            self.image_queues[cam_index].put((image, stOutFrame.stFrameInfo, base_path, count))
+            frame_info = stOutFrame.stFrameInfo
+            height, width, frame_len = frame_info.nHeight, frame_info.nWidth, frame_info.nFrameLen
+            try:
+                if frame_len == height * width:
+                    # 8 位 Bayer 帧：复制一次到预分配的槽位，BGR 直接写入槽位的数组
+                    slot = self.frame_rings[cam_index].acquire(height, width)
+                    with tracer.span("camera.demosaic", "camera", camera=cam_index):
+                        image = slot.fill(stOutFrame.pBufAddr, frame_len)  # Bayer格式转换为BGR
+                else:
+                    # 其他像素格式按原方式逐帧分配
+                    frame_data = (c_ubyte * frame_len)()
+                    memmove(frame_data, cast(stOutFrame.pBufAddr, POINTER(c_ubyte)), frame_len)
+                    image = np.asarray(frame_data).reshape((height, width, 1))
+                    with tracer.span("camera.demosaic", "camera", camera=cam_index):
+                        image = cv2.cvtColor(image, cv2.COLOR_BAYER_GB2BGR)  # Bayer格式转换为BGR
+            finally:
+                # 立即释放原始图像缓冲
+                cam.MV_CC_FreeImageBuffer(stOutFrame)
+            GRAB_SECONDS.observe(time.perf_counter() - grab_start, camera=cam_index)
+            FRAMES_CAPTURED.inc(camera=cam_index)
+
+            # 将处理后的图像数据放入保存队列，磁盘保存与分析并行，附带入队时间用于统计排队耗时
+            save_future = Future()
+            self.image_queues[cam_index].put((image, frame_info, base_path, count, time.time(),
+                                              slot.retain() if slot else None, save_future))
+            save_queue_depth = self.image_queues[cam_index].qsize()
+            SAVE_QUEUE_DEPTH.set(save_queue_depth, camera=cam_index)
+            tracer.counter(f"camera.save_queue.{cam_index}", "camera", frames=save_queue_depth)
+
+            # 帧直接送入分析队列，分析使用未经JPEG压缩的像素，结果关联 save_future 给出的实际保存路径
+            if self.analysis_queue is not None:
+                # 分析排队已满时在这里等待（背压）
+                with tracer.span("camera.analysis_handoff", "camera", camera=cam_index):
+                    self.analysis_queue.put((image, self.image_path(cam_index, base_path, count),
+                                             self.image_type(cam_index), slot.retain().release if slot else None,
+                                             save_future))
+            return save_future
 
         except Exception as e:
             print(f"相机 {cam_index} 捕获图像时出错: {str(e)}")
+            CAPTURE_ERRORS.inc(camera=cam_index)
+            return None
+        finally:
+            # 释放取图线程自己的引用，保存、分析用完后槽位归还缓冲环
+            if slot is not None:
+                slot.release()
 
     def _save_worker(self, cam_index):
         """处理图像保存的工作线程"""
@@ -234,34 +314,39 @@ class CameraControl:
                 if save_data is None:
                     continue
                 
-                image, frame_info, base_path, count = save_data
-                
+                image, frame_info, base_path, count, queued_time, slot, save_future = save_data
+                save_start = time.time()
+                SAVE_QUEUE_WAIT_SECONDS.observe(save_start - queued_time, camera=cam_index)
+
                 try:
                     # 根据相机索引选择不同的文件夹名称
-                    folder_name = "global" if cam_index == 1 else "local"  # 修复local和global的对应关系
-                    file_path = f"{base_path}/{folder_name}/{count}"
+                    file_path = self.image_stem(cam_index, base_path, count)
                     
                     # 确保目录存在
                     os.makedirs(os.path.dirname(file_path), exist_ok=True)
                     
-                    # OpenCV使用BGR格式，需要转换为RGB
-                    rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-                    
-                    # 使用Pillow进行高效压缩和保存
-                    pil_image = Image.fromarray(rgb_image)
-                    # 使用优化的JPEG压缩设置
-                    pil_image.save(
-                        file_path + ".jpg",
-                        "JPEG",
-                        quality=85,  # 较好的质量与压缩比平衡
-                        optimize=True,  # 启用优化
-                        subsampling=0  # 更好的色彩质量
-                    )
+                    # 按配置的保存方式编码并写入（先写临时文件再改名，其他进程不会读到写了一半的图片）
+                    raw = slot.raw if slot is not None else None
+                    with ENCODE_SECONDS.time(camera=cam_index, backend=self.persistence.name):
+                        saved_path = self.persistence.save(image, raw, file_path, queued_time)
                     
-                    print(f"相机 {cam_index} 图像已保存到 {file_path}.jpg")
+                    print(f"相机 {cam_index} 图像已保存到 {saved_path}")
+                    FRAMES_SAVED.inc(camera=cam_index, result="success")
+                    save_future.set_result(saved_path)
                     
                 except Exception as e:
                     print(f"相机 {cam_index} 保存图像时出错: {str(e)}")
+                    FRAMES_SAVED.inc(camera=cam_index, result="failure")
+                    save_future.set_exception(e)
+                finally:
+                    # 保存完成，归还帧缓冲
+                    if slot is not None:
+                        slot.release()
+                    tracer.record("camera.save", save_start, time.time() - save_start, "camera", camera=cam_index,
+                                  queue_wait_ms=round((save_start - queued_time) * 1000, 1))
+                    save_queue_depth = self.image_queues[cam_index].qsize()
+                    SAVE_QUEUE_DEPTH.set(save_queue_depth, camera=cam_index)
+                    tracer.counter(f"camera.save_queue.{cam_index}", "camera", frames=save_queue_depth)
                 
             except queue.Empty:
                 continue
@@ -315,6 +400,22 @@ class CameraControl:
                     if thread.is_alive():
                         thread.join(timeout=1)
 
+            # 保存线程已退出，队列中未保存的帧通知等待者
+            for image_queue in self.image_queues:
+                while True:
+                    try:
+                        save_data = image_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if save_data is None:
+                        continue
+                    *_, slot, save_future = save_data
+                    if slot is not None:
+                        slot.release()
+                    if not save_future.done():
+                        save_future.set_exception(RuntimeError("相机已关闭，图片未保存"))
+            self.persistence.close()
+
             if hasattr(self, 'cameras'):
                 # 停止抓取
                 self.stop_grabbing()
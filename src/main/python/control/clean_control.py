@@ -1,6 +1,7 @@
 import time
 
 from utils.socket_utils import valve_controller
+from utils.tracing import traced
 
 
 # 清砂控制类
@@ -12,6 +13,7 @@ class CleanSandControl:
         self.addr = None
         self.socket_client = None
 
+    @traced("clean.sequence", "clean")
     def execute_clean_sequence(self):
         """执行完整的清砂流程"""
         try:
@@ -27,6 +29,7 @@ class CleanSandControl:
             print(f"清砂序列执行出错: {str(e)}")
             return False
 
+    @traced("clean.open_valves", "clean")
     def _open_valves_sequence(self):
         """按顺序打开阀门"""
         # 出料口控制
@@ -45,6 +48,7 @@ class CleanSandControl:
         valve_controller(self.conn, '03', True)
         time.sleep(3.5)
 
+    @traced("clean.close_valves", "clean")
     def _close_valves_sequence(self):
         """按相反顺序关闭阀门"""
         # 第二个风机控制
@@ -0,0 +1,225 @@
+"""
+实验阶段调度
+
+execute_process 以前严格按 给料 → 振动 → 5 次（振动、拍照）→ 清砂 → 等待 8 秒 顺序执行，
+舵机复位、下一组的给料称量等不依赖当前振动盘的动作也要排队等待。
+这里把每组实验拆成若干阶段，按真实的依赖关系调度，没有依赖的阶段同时进行：
+
+    prepare  舵机转到给料位置并称量下一份砂      依赖上一组 reset（料斗已倒空复位）
+    dump     倒砂到振动盘                      依赖本组 prepare、上一组 settle（振动盘已清理）
+    reset    舵机复位                          依赖本组 dump
+    spread   等待砂落稳、向左振动               依赖本组 dump
+    photos   振动、拍照循环                     依赖本组 spread
+    clean    清砂阀门序列                       依赖本组 photos
+    settle   清砂后等待                        依赖本组 clean
+
+下一组的 prepare 因此与本组的拍照、清砂同时进行，倒砂后舵机复位与拍照同时进行。
+共享执行机构用资源锁保证同一时间只有一个阶段使用：舵机（SERVO）、给料称量（FEEDER）、
+振动盘（PLATE，振动、倒砂、清砂都作用在振动盘上）、清砂阀门（VALVES）、相机（CAMERA）。
+每个阶段的执行时间和等待执行机构的时间记录为 phase.<阶段> span（utils.tracing），可在 trace 中查看。
+"""
+import os
+import sys
+import threading
+import time
+
+# 添加项目根目录到路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from utils.tracing import tracer
+
+# 共享执行机构
+SERVO = "servo"
+FEEDER = "feeder"
+PLATE = "plate"
+VALVES = "valves"
+CAMERA = "camera"
+
+# 阶段状态
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+# 每组的阶段，按提交顺序
+GROUP_PHASES = ("prepare", "dump", "reset", "spread", "photos", "clean", "settle")
+
+# 各阶段独占的执行机构
+PHASE_RESOURCES = {
+    "prepare": (SERVO, FEEDER),
+    "dump": (SERVO, PLATE),
+    "reset": (SERVO,),
+    "spread": (PLATE,),
+    "photos": (PLATE, CAMERA),
+    "clean": (PLATE, VALVES),
+    "settle": (PLATE,),
+}
+
+
+class Phase:
+    """一个调度阶段"""
+
+    def __init__(self, name, func, deps, resources, label=None):
+        self.name = name
+        self.label = label or name
+        self.func = func
+        self.deps = tuple(dep for dep in deps if dep is not None)
+        self.resources = tuple(sorted(set(resources)))  # 固定加锁顺序，避免死锁
+        self.status = PENDING
+        self.result = None
+        self.error = None
+        self.start_time = None
+        self.end_time = None
+        self._done = threading.Event()
+
+    def wait(self, timeout=None):
+        """等待阶段结束（完成、失败或跳过）"""
+        return self._done.wait(timeout)
+
+    @property
+    def finished(self):
+        return self._done.is_set()
+
+    @property
+    def succeeded(self):
+        return self.status == DONE
+
+    def __repr__(self):
+        return f"Phase({self.name!r}, {self.status})"
+
+
+class ExperimentScheduler:
+    """
+    按依赖关系和资源锁并行执行阶段，每个阶段在自己的线程中等待依赖、获取资源后执行。
+    依赖的阶段失败或跳过、或 should_stop 返回 True 时，尚未开始的阶段被跳过
+    """
+
+    def __init__(self, should_stop=None):
+        """
+        :param should_stop: 返回 True 时不再开始新的阶段
+        """
+        self.should_stop = should_stop or (lambda: False)
+        self.phases = []
+        self._locks = {}
+        self._lock = threading.Lock()
+        self.start_time = time.time()
+
+    def _resource_lock(self, resource):
+        with self._lock:
+            return self._locks.setdefault(resource, threading.Lock())
+
+    def add(self, name, func, deps=(), resources=(), label=None):
+        """
+        提交一个阶段
+        :param name: 阶段名称
+        :param func: 阶段执行的函数（无参数）
+        :param deps: 必须先完成的阶段
+        :param resources: 执行期间独占的执行机构
+        :param label: 计时统计使用的名称（同类阶段相同），None 使用 name
+        :return: Phase
+        """
+        phase = Phase(name, func, deps, resources, label)
+        with self._lock:
+            self.phases.append(phase)
+        threading.Thread(target=self._run, args=(phase,), name=f"phase-{name}", daemon=True).start()
+        return phase
+
+    def _run(self, phase):
+        try:
+            for dep in phase.deps:
+                dep.wait()
+            if self.should_stop() or any(not dep.succeeded for dep in phase.deps):
+                phase.status = SKIPPED
+                return
+            locks = [self._resource_lock(resource) for resource in phase.resources]
+            wait_start = time.time()
+            for lock in locks:
+                lock.acquire()
+            try:
+                if self.should_stop():
+                    phase.status = SKIPPED
+                    return
+                phase.status = RUNNING
+                phase.start_time = time.time()
+                phase.result = phase.func()
+                phase.status = DONE
+            finally:
+                phase.end_time = time.time()
+                for lock in reversed(locks):
+                    lock.release()
+                if phase.start_time is not None:
+                    tracer.record(f"phase.{phase.label}", phase.start_time, phase.end_time - phase.start_time,
+                                  "phase", phase=phase.name, status=DONE if phase.succeeded else FAILED,
+                                  resource_wait_ms=round((phase.start_time - wait_start) * 1000, 1))
+        except Exception as e:
+            phase.status = FAILED
+            phase.error = e
+            print(f"阶段 {phase.name} 执行出错: {str(e)}")
+        finally:
+            phase._done.set()
+
+    def wait_all(self, timeout=None):
+        """等待所有已提交的阶段结束，全部结束返回 True"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for phase in list(self.phases):
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not phase.wait(remaining):
+                return False
+        return True
+
+    def timeline(self):
+        """各阶段相对调度开始的起止时间（秒）"""
+        return [
+            {
+                "name": phase.name,
+                "status": phase.status,
+                "start": round(phase.start_time - self.start_time, 3) if phase.start_time else None,
+                "end": round(phase.end_time - self.start_time, 3) if phase.end_time else None,
+            }
+            for phase in self.phases
+        ]
+
+
+def schedule_group(scheduler, group, actions, previous=None, overlap_feeding=True):
+    """
+    提交一组实验的全部阶段
+    :param scheduler: ExperimentScheduler
+    :param group: 组号（用于阶段名称）
+    :param actions: 阶段名称（GROUP_PHASES）-> 无参数函数
+    :param previous: 上一组 schedule_group 的返回值，None 表示第一组
+    :param overlap_feeding: 为 False 时给料称量等上一组清砂等待结束后才开始（振动盘振动会影响称量时使用）
+    :return: 阶段名称 -> Phase
+    """
+    previous = previous or {}
+    prepare_deps = [previous.get("reset")]
+    if not overlap_feeding:
+        prepare_deps.append(previous.get("settle"))
+    phases = {}
+    deps = {
+        "prepare": lambda: prepare_deps,
+        "dump": lambda: [phases["prepare"], previous.get("settle")],
+        "reset": lambda: [phases["dump"]],
+        "spread": lambda: [phases["dump"]],
+        "photos": lambda: [phases["spread"]],
+        "clean": lambda: [phases["photos"]],
+        "settle": lambda: [phases["clean"]],
+    }
+    for name in GROUP_PHASES:
+        phases[name] = scheduler.add(f"{group}.{name}", actions[name], deps[name](), PHASE_RESOURCES[name],
+                                     label=name)
+    return phases
+
+
+def group_cycle_time(phases, previous=None):
+    """一组实验的周期：相邻两组 settle 结束的间隔，第一组为从给料开始到 settle 结束"""
+    end = phases["settle"].end_time
+    if end is None:
+        return None
+    if previous is not None and previous["settle"].end_time is not None:
+        return end - previous["settle"].end_time
+    start = phases["prepare"].start_time
+    return end - start if start is not None else None
@@ -0,0 +1,215 @@
+"""
+预测式闭环给料控制
+
+以前给料在传感器读数达到目标值后才关闭给料（寄存器 5），关闭时仍在下落的砂子使每次给料都偏多；
+关闭后再固定等待 1 秒。这里根据电子秤采样的重量时间序列：
+    流量        给料过程中重量的增长速度（最小二乘斜率）
+    滞后时间    关闭给料后继续落下的量 / 关闭时的流量，按指数加权平均逐次学习
+读数加上预测的滞后量（流量 × 滞后时间）达到目标时提前关闭给料；关闭后等读数稳定即结束，不再固定等待。
+每次给料记录目标值、实际值、误差和耗时。
+电子秤不再返回读数时不会一直等待：每 STOP_CHECK_INTERVAL 秒检查一次停止信号，
+超过最长给料时间（由目标值和学到的流量计算）后关闭给料，视为给料失败。
+"""
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+# 添加项目根目录到路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from config.default_config import (FEEDING_INITIAL_LAG, FEEDING_LEARNING_RATE, FEEDING_DOSE_TIMEOUT,
+                                   FEEDING_TIMEOUT_FACTOR, FEEDING_MIN_DOSE_TIMEOUT)
+from utils.tracing import tracer
+
+# 当读数为大的负数时，可能为数据溢出，也视为达到目标；小的负数（如-1, -10）被视为噪声
+OVERFLOW_THRESHOLD = -5000
+
+# 计算流量使用的时间窗口（秒）
+RATE_WINDOW = 0.5
+# 读数比开始时增加超过该值后认为砂子开始落下，流量只用此后的采样计算
+FLOW_START_DELTA = 5
+# 滞后时间上限（秒），防止个别异常的给料把模型带偏
+MAX_LAG = 3.0
+# 关闭给料后读数稳定的判断：至少等待 SETTLE_MIN 秒，最多等待 SETTLE_MAX 秒（以前固定等待 1 秒），
+# 读数变化速度低于关闭时流量的 SETTLE_RATE_RATIO 倍（且不低于 SETTLE_RATE_MIN）时视为稳定
+SETTLE_MIN = 0.3
+SETTLE_MAX = 1.0
+SETTLE_RATE_RATIO = 0.05
+SETTLE_RATE_MIN = 20.0
+# 等待采样时检查停止信号、给料超时的间隔（秒），采样中断时停止信号也能及时生效
+STOP_CHECK_INTERVAL = 0.2
+
+
+class FeedingController:
+    """
+    给料控制器，读数使用 ScaleSampler 的 raw（给料传感器原始值，目标值 = 克数 × 1000）
+    """
+
+    def __init__(self, sampler, start_feed, stop_feed, lag=None, learning_rate=None, history_size=100):
+        """
+        :param sampler: ScaleSampler 电子秤后台采样
+        :param start_feed: 打开给料的函数
+        :param stop_feed: 关闭给料的函数
+        :param lag: 初始滞后时间（秒），None 使用 FEEDING_INITIAL_LAG 配置
+        :param learning_rate: 滞后时间、流量的指数加权系数，None 使用 FEEDING_LEARNING_RATE 配置
+        :param history_size: 保留的给料记录数
+        """
+        self.sampler = sampler
+        self.start_feed = start_feed
+        self.stop_feed = stop_feed
+        self.lag = FEEDING_INITIAL_LAG if lag is None else lag
+        self.learning_rate = learning_rate or FEEDING_LEARNING_RATE
+        self.flow_rate = None  # 学习到的平均流量（每秒原始值）
+        self.history = deque(maxlen=history_size)
+        # 给料线程追加记录、接口线程读取统计，共用此锁
+        self._history_lock = threading.Lock()
+
+    def predicted_overshoot(self, rate):
+        """按当前流量预测关闭给料后还会落下的量"""
+        if rate is None or rate <= 0:
+            return 0.0
+        return rate * self.lag
+
+    def dose_timeout(self, target):
+        """单次给料的最长时间（秒）：已学到流量时按目标值 / 流量计算，否则使用 FEEDING_DOSE_TIMEOUT"""
+        if not self.flow_rate or self.flow_rate <= 0:
+            return FEEDING_DOSE_TIMEOUT
+        return max(FEEDING_MIN_DOSE_TIMEOUT, target / self.flow_rate * FEEDING_TIMEOUT_FACTOR)
+
+    def _wait_dose(self, reached, start_time, timeout, should_stop):
+        """
+        分段等待给料达到目标，每段之间检查停止信号和超时
+        :return: (达到目标的采样, 是否超时)；收到停止信号或采样停止时采样为 None
+        """
+        deadline = start_time + timeout
+        since = start_time
+        while True:
+            if should_stop is not None and should_stop():
+                return None, False
+            now = time.time()
+            if now >= deadline:
+                return None, True
+            # 与上一段重叠一段时间，段之间到达的采样也会被判断
+            sample = self.sampler.wait_for(reached, timeout=min(STOP_CHECK_INTERVAL, deadline - now), since=since)
+            if sample is not None:
+                return sample, False
+            if not self.sampler.is_running:
+                return None, False
+            since = now
+
+    def dose(self, target, should_stop=None, timeout=None):
+        """
+        给料直到读数达到目标值
+        :param target: 目标读数（原始值）
+        :param should_stop: 返回 True 时提前结束的函数
+        :param timeout: 最长给料时间（秒），None 使用 dose_timeout(target)
+        :return: 给料记录字典；采样停止、收到停止信号或给料超时时返回 None
+        """
+        timeout = self.dose_timeout(target) if timeout is None else timeout
+        start_time = time.time()
+        initial = self.sampler.latest()
+        self.start_feed()
+        stop_state = {}
+
+        def reached(sample):
+            if should_stop is not None and should_stop():
+                return True
+            if sample.raw < OVERFLOW_THRESHOLD:
+                return True
+            # 打开给料到砂子落到秤上有延迟，流量只用开始落下之后的采样计算
+            if "flow_start" not in stop_state:
+                if initial is not None and sample.raw - initial.raw < FLOW_START_DELTA:
+                    return sample.raw >= target
+                stop_state["flow_start"] = sample.timestamp
+            rate = self.sampler.rate_of_change(RATE_WINDOW, field="raw", since=stop_state["flow_start"])
+            if sample.raw + self.predicted_overshoot(rate) >= target:
+                stop_state["rate"] = rate
+                return True
+            return False
+
+        try:
+            sample, timed_out = self._wait_dose(reached, start_time, timeout, should_stop)
+        finally:
+            # 任何情况下都关闭给料
+            self.stop_feed()
+        stop_time = time.time()
+        tracer.record("feeding.flow", start_time, stop_time - start_time, "feeding", target=target,
+                      stop_raw=sample.raw if sample is not None else None, timed_out=timed_out)
+
+        if timed_out:
+            latest = self.sampler.latest()
+            print(f"给料超时（{timeout:.1f} 秒未达到目标 {target}，最新读数 "
+                  f"{latest.raw if latest is not None else '无'}），已关闭给料")
+            return None
+        if sample is None or (should_stop is not None and should_stop()):
+            return None
+        if sample.raw < OVERFLOW_THRESHOLD:
+            print(f"检测到溢出值 {sample.raw}，执行倒沙。")
+            return {"target": target, "stop_raw": sample.raw, "overflow": True,
+                    "duration": round(stop_time - start_time, 3)}
+
+        stop_rate = stop_state.get("rate")
+        with tracer.span("feeding.settle", "feeding"):
+            final = self._settle(stop_time, stop_rate)
+        final_raw = final.raw if final is not None else sample.raw
+        self._learn(sample.raw, final_raw, stop_rate)
+
+        record = {
+            "target": target,
+            "stop_raw": sample.raw,
+            "final_raw": final_raw,
+            "error": final_raw - target,
+            "error_percent": round((final_raw - target) / target * 100, 2) if target else None,
+            "predicted_overshoot": round(self.predicted_overshoot(stop_rate), 1),
+            "overshoot": final_raw - sample.raw,
+            "flow_rate": round(stop_rate, 1) if stop_rate is not None else None,
+            "lag": round(self.lag, 3),
+            "duration": round(time.time() - start_time, 3),
+            "overflow": False,
+        }
+        with self._history_lock:
+            self.history.append(record)
+        print(f"给料完成: 目标 {target}, 实际 {final_raw}, 误差 {record['error']} ({record['error_percent']}%), "
+              f"耗时 {record['duration']}s, 滞后时间 {record['lag']}s")
+        return record
+
+    def _settle(self, stop_time, stop_rate):
+        """关闭给料后等待读数稳定，返回稳定后的采样"""
+        threshold = max(SETTLE_RATE_MIN, SETTLE_RATE_RATIO * (stop_rate or 0))
+        self.sampler.wait_for(lambda s: s.timestamp >= stop_time + SETTLE_MIN, timeout=SETTLE_MAX)
+        while time.time() < stop_time + SETTLE_MAX:
+            rate = self.sampler.rate_of_change(SETTLE_MIN, field="raw")
+            if rate is not None and abs(rate) < threshold:
+                break
+            if self.sampler.wait_for(lambda s: True, timeout=stop_time + SETTLE_MAX - time.time()) is None:
+                break
+        return self.sampler.latest()
+
+    def _learn(self, stop_raw, final_raw, stop_rate):
+        """由本次关闭给料后落下的量更新滞后时间和流量"""
+        if stop_rate is None or stop_rate <= 0:
+            return
+        alpha = self.learning_rate
+        lag = min(max((final_raw - stop_raw) / stop_rate, 0.0), MAX_LAG)
+        self.lag = (1 - alpha) * self.lag + alpha * lag
+        self.flow_rate = stop_rate if self.flow_rate is None else (1 - alpha) * self.flow_rate + alpha * stop_rate
+
+    def stats(self):
+        """最近给料的精度和耗时统计"""
+        with self._history_lock:
+            records = [record for record in self.history if not record["overflow"]]
+        if not records:
+            return {"doses": 0, "lag": self.lag, "flow_rate": self.flow_rate}
+        return {
+            "doses": len(records),
+            "mean_abs_error": sum(abs(record["error"]) for record in records) / len(records),
+            "mean_error_percent": sum(record["error_percent"] or 0 for record in records) / len(records),
+            "mean_duration": sum(record["duration"] for record in records) / len(records),
+            "lag": self.lag,
+            "flow_rate": self.flow_rate,
+        }
@@ -0,0 +1,362 @@
+"""
+原始 Bayer 帧归档（追加写入的段文件）
+
+每个段文件以文件头开始，之后依次追加帧记录：
+    文件头    MAGIC（8 字节）+ 版本（uint32）+ 保留（uint32）
+    帧记录    记录头（RECORD_HEADER）+ 原始帧数据
+记录头包含帧名称、宽、高、像素格式、时间戳和数据长度，数据不做任何编码，写入只是一次顺序追加。
+段文件超过 max_bytes 后开始写下一个段（segment_0001.bayer ...）。
+归档中的一帧用 "<段文件路径>::<帧名称>" 表示，作为保存结果的图片路径。
+
+读取时 FrameArchive 以只读方式 mmap 段文件，原始帧直接是映射内存上的 numpy 视图（不复制），
+只有访问 image() 时才去马赛克为 BGR；缩略图可用 half=True 按 2x2 块直接得到半尺寸 BGR，不做全尺寸插值。
+read_image() 统一读取归档帧、.npy 原始帧和普通图片文件，供 pictures_handle、图片分析和图片 API 使用。
+"""
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import cv2
+import numpy as np
+
+# 添加项目根目录到路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from utils.image_paths import (SEGMENT_PREFIX, SEGMENT_SUFFIX, MEMBER_SEPARATOR, member_path, split_member_path,
+                               is_segment_file, frame_stem)
+
+MAGIC = b"SANDBAYR"
+VERSION = 1
+FILE_HEADER = struct.Struct("<8sII")
+# 记录标记、宽、高、像素格式、保留、时间戳、数据长度、帧名称
+RECORD_MAGIC = b"FRM0"
+RECORD_HEADER = struct.Struct("<4sIIIIdQ64s")
+
+# 单个段文件的最大字节数
+DEFAULT_SEGMENT_BYTES = 4 * 1024 * 1024 * 1024
+
+# 像素格式
+PIXEL_BAYER_GB8 = 1  # 8 位 Bayer GB（相机默认输出）
+PIXEL_BGR8 = 2  # 已转换的 8 位 BGR（取图时不是 8 位 Bayer 帧的情况）
+
+# 同时保持打开的段文件数
+MAX_OPEN_ARCHIVES = 16
+
+# 帧记录信息，offset 为帧数据在段文件中的位置
+FrameInfo = namedtuple("FrameInfo", "name width height pixel_type timestamp offset length")
+
+
+def segment_path(directory, index):
+    return os.path.join(directory, f"{SEGMENT_PREFIX}{index:04d}{SEGMENT_SUFFIX}")
+
+
+def demosaic(frame, pixel_type=PIXEL_BAYER_GB8, half=False):
+    """
+    原始帧转换为 BGR
+    :param frame: 原始帧（Bayer 为单通道）
+    :param pixel_type: 像素格式
+    :param half: 为 True 时按 2x2 Bayer 块直接合成半尺寸 BGR（用于缩略图，比全尺寸插值快得多）
+    """
+    if pixel_type == PIXEL_BGR8:
+        # 复制一份，映射内存上的数组是只读的
+        return np.array(frame[::2, ::2] if half else frame)
+    if pixel_type != PIXEL_BAYER_GB8:
+        raise ValueError(f"不支持的像素格式: {pixel_type}")
+    if not half:
+        return cv2.cvtColor(frame, cv2.COLOR_BAYER_GB2BGR)
+    height, width = frame.shape[0] // 2 * 2, frame.shape[1] // 2 * 2
+    frame = frame[:height, :width]
+    # 与 cv2.COLOR_BAYER_GB2BGR 相同的排列：每个 2x2 块中 (0,1) 为 R，(1,0) 为 B，对角为 G
+    image = np.empty((height // 2, width // 2, 3), dtype=np.uint8)
+    image[..., 0] = frame[1::2, 0::2]
+    image[..., 1] = ((frame[0::2, 0::2].astype(np.uint16) + frame[1::2, 1::2]) // 2).astype(np.uint8)
+    image[..., 2] = frame[0::2, 1::2]
+    return image
+
+
+class FrameArchiveWriter:
+    """
+    一个目录下的段文件追加写入，可在多个线程中同时调用 append
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_SEGMENT_BYTES, fsync=False):
+        """
+        :param directory: 段文件所在目录
+        :param max_bytes: 单个段文件的最大字节数
+        :param fsync: 每帧写入后是否 fsync（断电也不丢帧，写入变慢）
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._file = None
+        self._index = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _open_segment(self):
+        """打开最后一个段文件继续追加，已满时开始新的段（持有 self._lock）"""
+        if self._index is None:
+            existing = [name for name in os.listdir(self.directory) if is_segment_file(name)]
+            indexes = []
+            for name in existing:
+                try:
+                    indexes.append(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+                except ValueError:
+                    continue
+            self._index = max(indexes) if indexes else 0
+        path = segment_path(self.directory, self._index)
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(FILE_HEADER.pack(MAGIC, VERSION, 0))
+        return path
+
+    def append(self, name, data, width, height, pixel_type=PIXEL_BAYER_GB8, timestamp=None):
+        """
+        追加一帧
+        :param name: 帧名称（如 "1_1"），最长 64 字节
+        :param data: 帧数据（bytes 或 C 连续的 numpy 数组）
+        :param width: 宽
+        :param height: 高
+        :param pixel_type: 像素格式
+        :param timestamp: 拍摄时间（time.time()），None 为当前时间
+        :return: 归档帧路径
+        """
+        encoded_name = name.encode("utf-8")
+        if len(encoded_name) > 64:
+            raise ValueError(f"帧名称过长: {name}")
+        view = memoryview(data).cast("B")
+        header = RECORD_HEADER.pack(RECORD_MAGIC, width, height, pixel_type, 0,
+                                    time.time() if timestamp is None else timestamp, view.nbytes, encoded_name)
+        with self._lock:
+            if self._file is None:
+                path = self._open_segment()
+            else:
+                path = self._file.name
+            if self._file.tell() > FILE_HEADER.size and self._file.tell() + len(header) + view.nbytes > self.max_bytes:
+                self._file.close()
+                self._index += 1
+                path = self._open_segment()
+            self._file.write(header)
+            self._file.write(view)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+        return member_path(path, name)
+
+    def close(self):
+        """释放映射，之后再访问时重新映射"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class FrameArchive:
+    """
+    一个段文件的只读访问，可在多个线程中使用；写入方仍在追加时 refresh() 读取新增的帧
+    """
+
+    def __init__(self, path):
+        """
+        :param path: 段文件路径
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._map = None
+        self._size = 0  # 已建立索引的字节数
+        self._frames = {}  # 帧名称 -> FrameInfo，同名的帧以最后写入的为准
+        self.refresh()
+
+    def refresh(self):
+        """段文件变大时重新映射，并索引新增的完整记录"""
+        with self._lock:
+            size = os.path.getsize(self.path)
+            if size < FILE_HEADER.size:
+                raise ValueError(f"不是帧归档文件: {self.path}")
+            if self._map is not None and size <= len(self._map):
+                return False
+            with open(self.path, "rb") as f:
+                # 旧的映射可能还被返回的帧数组引用，不主动关闭，由引用计数释放
+                self._map = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+            if self._size == 0:
+                magic, version, _ = FILE_HEADER.unpack_from(self._map, 0)
+                if magic != MAGIC:
+                    raise ValueError(f"不是帧归档文件: {self.path}")
+                if version != VERSION:
+                    raise ValueError(f"不支持的帧归档版本: {version}")
+                self._size = FILE_HEADER.size
+            self._scan(size)
+            return True
+
+    def _scan(self, size):
+        """从已索引的位置继续读取记录头（持有 self._lock），写了一半的记录留到下次"""
+        offset = self._size
+        while offset + RECORD_HEADER.size <= size:
+            magic, width, height, pixel_type, _, timestamp, length, name = RECORD_HEADER.unpack_from(self._map, offset)
+            if magic != RECORD_MAGIC:
+                print(f"帧归档 {self.path} 在 {offset} 处记录损坏，忽略之后的数据")
+                break
+            data_offset = offset + RECORD_HEADER.size
+            if data_offset + length > size:
+                break
+            name = name.rstrip(b"\0").decode("utf-8")
+            self._frames[name] = FrameInfo(name, width, height, pixel_type, timestamp, data_offset, length)
+            offset = data_offset + length
+        self._size = offset
+
+    def names(self):
+        """归档中的帧名称，按写入顺序"""
+        with self._lock:
+            return [info.name for info in sorted(self._frames.values(), key=lambda info: info.offset)]
+
+    def frames(self, after=0):
+        """
+        归档中帧的 FrameInfo，按写入顺序
+        :param after: 只返回数据偏移大于该值的帧（上次取到的最后一帧的 offset），0 为全部
+        """
+        with self._lock:
+            return sorted((info for info in self._frames.values() if info.offset > after),
+                          key=lambda info: info.offset)
+
+    def info(self, name):
+        """
+        :return: 帧的 FrameInfo，没有该帧时 KeyError
+        """
+        with self._lock:
+            info = self._frames.get(name)
+        if info is None:
+            # 可能是打开之后才写入的帧
+            if not self.refresh():
+                raise KeyError(name)
+            with self._lock:
+                info = self._frames.get(name)
+            if info is None:
+                raise KeyError(name)
+        return info
+
+    def raw(self, name):
+        """
+        原始帧，映射内存上的只读数组（不复制）
+        :return: Bayer 为 (高, 宽)，BGR 为 (高, 宽, 3)
+        """
+        info = self.info(name)
+        shape = (info.height, info.width) if info.pixel_type == PIXEL_BAYER_GB8 else (info.height, info.width, 3)
+        with self._lock:
+            mapped = self._map
+            if mapped is not None:
+                # 持锁建立视图，close() 不会在这之间关闭映射
+                return np.frombuffer(mapped, dtype=np.uint8, count=info.length, offset=info.offset).reshape(shape)
+        # 已被 open_archive 淘汰关闭，重新映射
+        self.refresh()
+        return self.raw(name)
+
+    def image(self, name, half=False):
+        """
+        访问时才去马赛克的 BGR 帧
+        :param half: 为 True 时返回半尺寸 BGR（缩略图用）
+        """
+        info = self.info(name)
+        return demosaic(self.raw(name), info.pixel_type, half)
+
+    def close(self):
+        with self._lock:
+            mapped, self._map = self._map, None
+            self._frames = {}
+            self._size = 0
+        if mapped is not None:
+            try:
+                mapped.close()
+            except BufferError:
+                # 仍有帧数组引用该映射，由引用计数释放
+                pass
+
+
+_archives = OrderedDict()
+_archives_lock = threading.Lock()
+
+
+def open_archive(path):
+    """
+    打开段文件（进程内缓存最近使用的 MAX_OPEN_ARCHIVES 个），已打开时读取新增的帧
+    :param path: 段文件路径
+    :return: FrameArchive
+    """
+    key = os.path.abspath(path)
+    with _archives_lock:
+        archive = _archives.get(key)
+        if archive is not None:
+            _archives.move_to_end(key)
+    if archive is None:
+        opened = FrameArchive(path)
+        evicted = []
+        with _archives_lock:
+            archive = _archives.setdefault(key, opened)
+            while len(_archives) > MAX_OPEN_ARCHIVES:
+                evicted.append(_archives.popitem(last=False)[1])
+        if archive is not opened:
+            # 其他线程已同时打开
+            evicted.append(opened)
+        # 释放淘汰的段文件映射（仍被帧数组引用的映射由 close() 留给引用计数释放）
+        for old in evicted:
+            old.close()
+    else:
+        archive.refresh()
+    return archive
+
+
+def is_raw_frame_path(path):
+    """是否为需要去马赛克读取的原始帧（归档帧或 .npy）"""
+    return split_member_path(path) is not None or path.lower().endswith(".npy")
+
+
+def image_exists(path):
+    """图片（含归档帧）是否存在"""
+    member = split_member_path(path)
+    if member is None:
+        return os.path.isfile(path)
+    if not os.path.isfile(member[0]):
+        return False
+    try:
+        open_archive(member[0]).info(member[1])
+        return True
+    except (KeyError, ValueError, OSError):
+        return False
+
+
+def frame_identity(path):
+    """
+    图片内容的标识（用于缓存键、ETag），内容变化后改变
+    归档帧按帧记录的位置和时间戳，段文件继续追加时不变；其他文件按修改时间和大小
+    """
+    member = split_member_path(path)
+    if member is None:
+        stat = os.stat(path)
+        return f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}"
+    info = open_archive(member[0]).info(member[1])
+    return f"{os.path.abspath(member[0])}|{member[1]}|{info.offset}|{info.timestamp}"
+
+
+def read_image(path, half=False):
+    """
+    读取 BGR 图片，支持归档帧（"<段文件>::<帧名称>"）、.npy 原始帧和普通图片文件
+    :param half: 为 True 时原始帧返回半尺寸（普通图片文件不受影响）
+    :return: BGR 图像，无法读取时返回 None（与 cv2.imread 相同）
+    """
+    member = split_member_path(path)
+    try:
+        if member is not None:
+            return open_archive(member[0]).image(member[1], half)
+        if path.lower().endswith(".npy"):
+            frame = np.load(path, mmap_mode="r")
+            return demosaic(frame, PIXEL_BAYER_GB8 if frame.ndim == 2 else PIXEL_BGR8, half)
+    except (KeyError, ValueError, OSError) as e:
+        print(f"读取原始帧 {path} 失败: {str(e)}")
+        return None
+    return cv2.imread(path)
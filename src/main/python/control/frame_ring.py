@@ -0,0 +1,136 @@
+"""
+相机帧缓冲环
+
+以前每拍一帧都要新建 (c_ubyte * nFrameLen)() 数组、memmove、np.asarray 包装，cv2.cvtColor 再分配一个 BGR 数组，
+2000 万像素的相机每帧要分配约 80 MB 内存。这里为每个相机预先分配若干个槽位（按第一帧的宽高分配）：
+SDK 缓冲用 ctypes.memmove 复制一次到槽位的 Bayer 数组，Bayer→BGR 直接写入槽位预分配的 BGR 数组。
+槽位按引用计数回收：保存线程、分析各持有一个引用，都用完（release）后槽位才会被下一帧使用。
+槽位都在使用中时等待，超时后临时分配一个不回收的槽位，拍照不会因此停止。
+"""
+import ctypes
+import os
+import sys
+import threading
+
+import cv2
+import numpy as np
+
+# 添加项目根目录到路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from utils.metrics import FRAME_RING_OVERFLOWS
+
+
+class FrameSlot:
+    """
+    缓冲环中的一个槽位：raw 为单通道 Bayer 帧，image 为转换后的 BGR 帧
+    """
+
+    def __init__(self, ring, index, height, width):
+        """
+        :param ring: 所属 FrameRing，临时槽位为 None
+        :param index: 槽位编号，临时槽位为 -1
+        """
+        self.ring = ring
+        self.index = index
+        self.raw = np.empty((height, width), dtype=np.uint8)
+        self.image = np.empty((height, width, 3), dtype=np.uint8)
+        self._refs = 0
+        self._lock = threading.Lock()
+
+    @property
+    def shape(self):
+        return self.raw.shape
+
+    def fill(self, address, length, bayer_code=cv2.COLOR_BAYER_GB2BGR):
+        """
+        从 SDK 缓冲复制一帧并转换为 BGR（写入预分配的数组，不再分配内存）
+        :param address: SDK 帧缓冲地址（stOutFrame.pBufAddr）
+        :param length: 帧数据字节数（stFrameInfo.nFrameLen）
+        :param bayer_code: Bayer 转换代码
+        :return: BGR 帧（self.image）
+        """
+        if length != self.raw.nbytes:
+            raise ValueError(f"帧长度 {length} 与槽位大小 {self.raw.nbytes} 不一致")
+        ctypes.memmove(self.raw.ctypes.data, address, length)
+        cv2.cvtColor(self.raw, bayer_code, dst=self.image)
+        return self.image
+
+    def retain(self, count=1):
+        """增加使用者（保存、分析各一个）"""
+        with self._lock:
+            self._refs += count
+        return self
+
+    def release(self):
+        """使用者用完槽位，全部用完后归还缓冲环"""
+        with self._lock:
+            self._refs -= 1
+            refs = self._refs
+        if refs == 0 and self.ring is not None:
+            self.ring._recycle(self)
+        elif refs < 0:
+            print(f"帧缓冲槽位 {self.index} 重复释放")
+
+
+class FrameRing:
+    """
+    单个相机的帧缓冲环，可在多个线程中获取、释放槽位
+    """
+
+    def __init__(self, slots=4, name=""):
+        """
+        :param slots: 槽位数，应大于同时在保存、分析中的帧数
+        :param name: 名称，用于日志
+        """
+        self.slots = slots
+        self.name = name
+        self.frame_shape = None
+        self._free = []
+        self._condition = threading.Condition()
+        self.overflows = 0  # 槽位都在使用中、临时分配的次数
+
+    def _allocate(self, height, width):
+        """按帧尺寸分配全部槽位（持有 self._condition）"""
+        self.frame_shape = (height, width)
+        self._free = [FrameSlot(self, i, height, width) for i in range(self.slots)]
+        print(f"相机 {self.name} 帧缓冲已分配: {self.slots} 个槽位, {width}x{height}, "
+              f"{self.slots * height * width * 4 / 1024 / 1024:.0f} MB")
+
+    def acquire(self, height, width, timeout=1.0):
+        """
+        获取一个空闲槽位，尺寸与第一帧不同时（如修改了相机 ROI）重新分配
+        :param height: 帧高度
+        :param width: 帧宽度
+        :param timeout: 槽位都在使用中时的最长等待秒数
+        :return: FrameSlot，已持有一个引用
+        """
+        with self._condition:
+            if self.frame_shape != (height, width):
+                # 尺寸变化后旧槽位释放时不再回收
+                self._allocate(height, width)
+            if not self._condition.wait_for(lambda: self._free, timeout):
+                self.overflows += 1
+                FRAME_RING_OVERFLOWS.inc(camera=self.name)
+                print(f"相机 {self.name} 帧缓冲槽位已用完，临时分配")
+                return FrameSlot(None, -1, height, width).retain()
+            return self._free.pop().retain()
+
+    def _recycle(self, slot):
+        with self._condition:
+            if slot.shape == self.frame_shape and len(self._free) < self.slots:
+                self._free.append(slot)
+                self._condition.notify()
+
+    def stats(self):
+        """缓冲环状态"""
+        with self._condition:
+            return {
+                "slots": self.slots,
+                "free": len(self._free),
+                "frame_shape": self.frame_shape,
+                "overflows": self.overflows,
+            }
@@ -0,0 +1,218 @@
+"""
+相机图片保存后端
+
+以前保存线程（每个相机一个）把 BGR 转为 RGB、构建 PIL 图片、以 optimize=True, subsampling=0 保存 JPEG，
+2000 万像素的帧编码很慢。这里把保存方式做成可选的后端，由 CAMERA_SAVE_BACKEND 配置：
+    pil_jpeg    原来的 Pillow JPEG（.jpg）
+    jpeg        cv2.imencode JPEG（.jpg），编码时释放 GIL，多个保存线程可以并行
+    png         cv2.imencode 快速无损 PNG（.png，压缩级别 1）
+    tiff        cv2.imencode 无损 TIFF（.tiff，不压缩）
+    npy         原始 Bayer 帧 .npy（单通道，数据量为 BGR 的 1/3，不做任何编码）
+    raw_append  原始 Bayer 帧追加写入段文件（control.frame_archive），一个目录一个段文件
+每个相机由 CAMERA_SAVE_WORKERS 个保存线程从同一个保存队列取帧，组成该相机的编码线程池。
+单帧文件都先写临时文件再 os.replace，其他进程不会读到写了一半的文件。
+"""
+import os
+import sys
+import threading
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# 添加项目根目录到路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from control.frame_archive import FrameArchiveWriter, PIXEL_BAYER_GB8, PIXEL_BGR8
+
+
+def write_atomic(path, data, fsync=False):
+    """
+    先写入临时文件再改名为 path
+    :param data: bytes、numpy 数组或以临时文件路径为参数的写入函数
+    :param fsync: 改名前是否 fsync
+    """
+    temp_path = path + ".part"
+    if callable(data):
+        data(temp_path)
+    else:
+        with open(temp_path, "wb") as f:
+            f.write(data)
+    if fsync:
+        fd = os.open(temp_path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    os.replace(temp_path, path)
+    return path
+
+
+class PersistenceBackend:
+    """保存后端基类"""
+
+    name = None
+    extension = None
+
+    def __init__(self, fsync=False):
+        """
+        :param fsync: 每帧写入后是否 fsync
+        """
+        self.fsync = fsync
+
+    def encode(self, image):
+        """把 BGR 帧编码为文件内容"""
+        raise NotImplementedError
+
+    def save(self, image, raw, file_path, timestamp=None):
+        """
+        保存一帧
+        :param image: BGR 帧
+        :param raw: 原始 Bayer 帧（单通道），没有时为 None
+        :param file_path: 不含扩展名的保存路径
+        :param timestamp: 拍摄时间（time.time()）
+        :return: 保存后的文件路径
+        """
+        return write_atomic(file_path + self.extension, self.encode(image), self.fsync)
+
+    def close(self):
+        """释放后端资源"""
+
+
+class PilJpegBackend(PersistenceBackend):
+    name = "pil_jpeg"
+    extension = ".jpg"
+
+    def __init__(self, quality=85, fsync=False):
+        super().__init__(fsync)
+        self.quality = quality
+
+    def save(self, image, raw, file_path, timestamp=None):
+        # OpenCV使用BGR格式，需要转换为RGB
+        pil_image = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+        return write_atomic(file_path + self.extension, lambda temp_path: pil_image.save(
+            temp_path,
+            "JPEG",
+            quality=self.quality,  # 较好的质量与压缩比平衡
+            optimize=True,  # 启用优化
+            subsampling=0  # 更好的色彩质量
+        ), self.fsync)
+
+
+class JpegBackend(PersistenceBackend):
+    name = "jpeg"
+    extension = ".jpg"
+
+    def __init__(self, quality=85, fsync=False):
+        super().__init__(fsync)
+        # 与原 Pillow 保存相同的质量，色度不降采样（4:4:4，OpenCV 4.5.5 起支持）
+        self.params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+        if hasattr(cv2, "IMWRITE_JPEG_SAMPLING_FACTOR"):
+            self.params += [cv2.IMWRITE_JPEG_SAMPLING_FACTOR, cv2.IMWRITE_JPEG_SAMPLING_FACTOR_444]
+
+    def encode(self, image):
+        ok, buffer = cv2.imencode(self.extension, image, self.params)
+        if not ok:
+            raise IOError("JPEG 编码失败")
+        return buffer
+
+
+class PngBackend(PersistenceBackend):
+    name = "png"
+    extension = ".png"
+
+    def __init__(self, compression=1, fsync=False):
+        super().__init__(fsync)
+        self.params = [cv2.IMWRITE_PNG_COMPRESSION, compression]
+
+    def encode(self, image):
+        ok, buffer = cv2.imencode(self.extension, image, self.params)
+        if not ok:
+            raise IOError("PNG 编码失败")
+        return buffer
+
+
+class TiffBackend(PersistenceBackend):
+    name = "tiff"
+    extension = ".tiff"
+
+    def __init__(self, compression=1, fsync=False):
+        """
+        :param compression: TIFF 压缩方式，1 不压缩，5 LZW
+        """
+        super().__init__(fsync)
+        self.params = [cv2.IMWRITE_TIFF_COMPRESSION, compression]
+
+    def encode(self, image):
+        ok, buffer = cv2.imencode(self.extension, image, self.params)
+        if not ok:
+            raise IOError("TIFF 编码失败")
+        return buffer
+
+
+class NpyBackend(PersistenceBackend):
+    name = "npy"
+    extension = ".npy"
+
+    def save(self, image, raw, file_path, timestamp=None):
+        frame = raw if raw is not None else image
+        return write_atomic(file_path + self.extension, lambda temp_path: _save_npy(temp_path, frame), self.fsync)
+
+
+def _save_npy(path, frame):
+    # np.save 会给不以 .npy 结尾的路径加上扩展名，这里直接写入文件对象
+    with open(path, "wb") as f:
+        np.save(f, frame)
+
+
+class RawAppendBackend(PersistenceBackend):
+    name = "raw_append"
+    extension = ""
+
+    def __init__(self, fsync=False, max_bytes=None):
+        super().__init__(fsync)
+        self.max_bytes = max_bytes
+        self._writers = {}
+        self._lock = threading.Lock()
+
+    def _writer(self, directory):
+        with self._lock:
+            writer = self._writers.get(directory)
+            if writer is None:
+                kwargs = {"max_bytes": self.max_bytes} if self.max_bytes else {}
+                writer = self._writers[directory] = FrameArchiveWriter(directory, fsync=self.fsync, **kwargs)
+            return writer
+
+    def save(self, image, raw, file_path, timestamp=None):
+        directory, name = os.path.split(file_path)
+        if raw is not None:
+            frame, pixel_type = np.ascontiguousarray(raw), PIXEL_BAYER_GB8
+        else:
+            frame, pixel_type = np.ascontiguousarray(image), PIXEL_BGR8
+        return self._writer(directory).append(name, frame, frame.shape[1], frame.shape[0], pixel_type, timestamp)
+
+    def close(self):
+        with self._lock:
+            writers = list(self._writers.values())
+            self._writers = {}
+        for writer in writers:
+            writer.close()
+
+
+BACKENDS = {backend.name: backend for backend in
+            (PilJpegBackend, JpegBackend, PngBackend, TiffBackend, NpyBackend, RawAppendBackend)}
+
+
+def create_backend(name, **options):
+    """
+    按名称创建保存后端
+    :param name: BACKENDS 中的名称
+    :param options: 后端参数，如 quality、compression、fsync
+    """
+    backend_class = BACKENDS.get(name)
+    if backend_class is None:
+        raise ValueError(f"未知的图片保存方式: {name}，可选: {', '.join(BACKENDS)}")
+    return backend_class(**options)
@@ -1,4 +1,6 @@
 import os
+import queue
+import threading
 import time
 import json
 import serial
@@ -9,11 +11,22 @@ from modbus_tk import modbus_tcp
 import modbus_tk.defines as cst
 from concurrent.futures import ThreadPoolExecutor, Future
 from control.camera_control import CameraControl
-from config.default_config import WGD_IP, WGD_PORT
+from config.default_config import WGD_IP, WGD_PORT, EXPERIMENT_OVERLAP_FEEDING
 from control.clean_control import CleanSandControl
-from utils.modbus_utils import triggle_or_save_action, triggle_single_action, stop_single_action, stop_action
+from control.analysis_pool import AnalysisPool, analyze_image
+from control.frame_archive import is_segment_file, open_archive
+from control.scale_sampler import ScaleSampler
+from control.feeding_controller import FeedingController
+from control.experiment_scheduler import ExperimentScheduler, schedule_group, group_cycle_time, FAILED
+from result_store import get_result_store, group_number_of, PROCESSING_RESULTS_PATH
+from utils.modbus_utils import (triggle_or_save_action, triggle_single_action, stop_single_action, stop_action,
+                                write_register)
+from utils.metrics import PROCESSING_TASKS, ANALYSIS_BACKLOG, ANALYSIS_RESULTS
 from utils.sensor_utils import connect_device
 from utils.socket_utils import connect_socket
+from utils.tracing import tracer
+from utils.event_bus import (publish, PHOTO_CAPTURED, IMAGE_ANALYZED, CLEAN_COMPLETED, EXPERIMENT_STARTED,
+                             EXPERIMENT_FINISHED, ERROR)
 from camera.MvImport.MvCameraControl_class import *
 import socket
 
@@ -27,10 +40,17 @@ class ProcessControl:
         self.addr = None
         self.ser = None
         self.client = None
+        self.scale_sampler = None  # 电子秤后台采样，给料和 API 共用
+        self.feeding_controller = None  # 预测式给料控制
         self.camera = None
         self.cleaner = None
         self.thread_pool = None
         self.processing_tasks = []  # 存储异步处理任务
+        self.analysis_queue = None  # 相机帧直通分析的内存队列
+        self.analysis_thread = None  # 分析分发线程
+        self.analysis_pool = None  # 实验期间常驻的分析进程池
+        self.analysis_backlog_count = 0  # 最近一次统计的待分析帧数
+        self.result_session_id = None  # 结果存储中本次实验的会话编号
         self.is_running = False  # 控制实验状态
         self.should_stop = False  # 停止标志
         
@@ -65,6 +85,11 @@ class ProcessControl:
             # 3. 初始化给料控制
             try:
                 self.ser, self.client = connect_device()  # 连接舵机和传感器
+                self.scale_sampler = ScaleSampler(self.client).start()
+                self.feeding_controller = FeedingController(
+                    self.scale_sampler,
+                    start_feed=lambda: write_register(self.master, 5, 1),
+                    stop_feed=lambda: write_register(self.master, 5, 0))
                 print("给料控制器初始化完成")
             except Exception as e:
                 raise Exception(f"给料控制器初始化失败: {str(e)}")
@@ -88,6 +113,9 @@ class ProcessControl:
                 if not self.camera.cameras:
                     raise Exception("没有找到可用的相机")
 
+                # 拍摄的帧直接在内存中交给分析，磁盘保存由相机保存线程并行完成
+                self._start_analysis_dispatcher()
+
                 print("相机控制初始化完成")
             except Exception as e:
                 raise Exception(f"相机初始化失败: {str(e)}")
@@ -127,60 +155,68 @@ class ProcessControl:
         self.ser.write(cmd.encode())
         time.sleep(0.01)
 
-    def servo_control(self, once_count):
-        """控制给料量"""
-        while True:
-            try:
-                # 读取传感器数据
-                response = self.client.read_holding_registers(83)
-                if not response.isError():
-                    data = response.registers
-                    raw_weight = data[0]
-                    target_weight = once_count * 1000
-                    # 当重量为大的负数时，可能为数据溢出，也视为达到目标
-                    # 小的负数（如-1, -10）被视为噪声，不触发倒沙
-                    overflow_threshold = -5000
-
-                    if raw_weight >= target_weight or raw_weight < overflow_threshold:
-                        if raw_weight < overflow_threshold:
-                            print(f"检测到溢出值 {raw_weight}，执行倒沙。")
-                        print(f"传感器数据: {raw_weight} / 目标: {target_weight}")
-                        # 停止给料
-                        self.master.execute(10, cst.WRITE_SINGLE_REGISTER, 5, output_value=0)
-                        time.sleep(1)
-                        # 下料翻转
-                        cmd0 = self.set_servo_angle(120, '000', '0100')
-                        self.servo_write(cmd0)
-                        time.sleep(1.5)
-                        # 复位
-                        cmd1 = self.set_servo_angle(-75, '004', '0100')
-                        cmd2 = self.set_servo_angle(40, '005', '0100')
-                        cmd3 = self.set_servo_angle(0, '000', '0100')
-                        self.servo_write(cmd1, cmd2, cmd3)
-                        time.sleep(2)
-                        break
-                else:
-                    print("读取传感器数据失败:", response)
-            except Exception as e:
-                print(f"控制过程出错: {e}")
-                break
+    def _feed_to_target(self, once_count):
+        """打开给料并控制给料量（不倒沙）"""
+        target_weight = once_count * 1000
+        # 按预测的滞后量提前关闭给料，关闭后等待读数稳定（替代固定等待1秒），收到停止信号时提前结束
+        dose = self.feeding_controller.dose(target_weight, should_stop=lambda: self.should_stop)
+        if dose is None:
+            if self.should_stop:
+                print("收到停止信号，结束给料")
+                return False
+            # 给料超时或电子秤采样停止：砂量不足，不能继续倒砂、拍照
+            raise RuntimeError("给料失败：给料超时或电子秤采样已停止")
+        return True
+
+    def dump_dose(self):
+        """下料翻转，将称好的砂倒到振动盘上"""
+        with tracer.span("servo.dump", "servo"):
+            cmd0 = self.set_servo_angle(120, '000', '0100')
+            self.servo_write(cmd0)
+            time.sleep(1.5)
+
+    def reset_servo(self):
+        """倒砂后舵机复位"""
+        with tracer.span("servo.reset", "servo"):
+            cmd1 = self.set_servo_angle(-75, '004', '0100')
+            cmd2 = self.set_servo_angle(40, '005', '0100')
+            cmd3 = self.set_servo_angle(0, '000', '0100')
+            self.servo_write(cmd1, cmd2, cmd3)
+            time.sleep(2)
 
-    def start_feeding(self, once_count=1.2):
-        """开始给料"""
+    def prepare_dose(self, once_count=1.2):
+        """舵机转到给料位置并称量一份砂（不倒沙），可与振动盘上的操作同时进行"""
         try:
             # 设置初始舵机角度
-            cmd1 = self.set_servo_angle(120, '004', '0100')
-            cmd2 = self.set_servo_angle(-120, '005', '0100')
-            cmd3 = self.set_servo_angle(0, '000', '0100')
-            self.servo_write(cmd1, cmd2, cmd3)
-            time.sleep(1)
+            with tracer.span("servo.to_feed_position", "servo"):
+                cmd1 = self.set_servo_angle(120, '004', '0100')
+                cmd2 = self.set_servo_angle(-120, '005', '0100')
+                cmd3 = self.set_servo_angle(0, '000', '0100')
+                self.servo_write(cmd1, cmd2, cmd3)
+                time.sleep(1)
 
             print(f"开始给料 {once_count}克...")
-            # 启动给料
-            self.master.execute(10, cst.WRITE_SINGLE_REGISTER, 5, output_value=1)
-            # 监控给料量
-            self.servo_control(once_count)
+            return self._feed_to_target(once_count)
+        except Exception as e:
+            print(f"给料过程出错: {e}")
+            self.stop_feeding()
+            # 给料失败向上抛出，调度中依赖给料的倒砂、拍照等阶段不再执行
+            raise
+
+    def prepare_phase(self, once_count=1.2):
+        """调度中的给料阶段：给料未完成时抛出，阶段记为失败，依赖它的倒砂、拍照等阶段跳过"""
+        if not self.prepare_dose(once_count):
+            raise RuntimeError("给料未完成" + ("：收到停止信号" if self.should_stop else ""))
+
+    def start_feeding(self, once_count=1.2):
+        """开始给料：称量、倒砂、舵机复位依次完成"""
+        try:
+            if not self.prepare_dose(once_count):
+                return False
+            self.dump_dose()
+            self.reset_servo()
             print("给料完成")
+            return True
 
         except Exception as e:
             print(f"给料过程出错: {e}")
@@ -211,200 +247,179 @@ class ProcessControl:
                     continue
 
                 # 遍历目录中的所有文件
+                names = []
                 for filename in os.listdir(folder_path):
-                    if filename.endswith('.jpg'):
-                        # 文件名格式为: "组号_照片号.jpg"
-                        try:
-                            group_num = int(filename.split('_')[0])
-                            max_group = max(max_group, group_num)
-                        except (ValueError, IndexError):
-                            continue
+                    if filename.endswith(('.jpg', '.png', '.tiff', '.npy')):
+                        # 文件名格式为: "组号_照片号.jpg"（扩展名由图片保存方式决定）
+                        names.append(filename)
+                    elif is_segment_file(filename):
+                        # 原始帧归档中的帧名称为 "组号_照片号"
+                        names.extend(open_archive(os.path.join(folder_path, filename)).names())
+                for name in names:
+                    try:
+                        group_num = int(name.split('_')[0])
+                        max_group = max(max_group, group_num)
+                    except (ValueError, IndexError):
+                        continue
 
             return max_group
         except Exception as e:
             print(f"获取最大组号时出错: {str(e)}")
             return 0
 
-    def _async_process_single_image(self, image_path, image_type):
-        """异步处理单张图片的函数"""
+    def _start_analysis_dispatcher(self):
+        """创建分析队列并启动分发线程"""
+        # 每个相机最多缓存一帧，分析进程池排队已满时拍照随之等待
+        self.analysis_queue = queue.Queue(maxsize=len(self.camera.cameras))
+        self.camera.set_analysis_queue(self.analysis_queue)
+        self.analysis_thread = threading.Thread(target=self._analysis_dispatcher, daemon=True)
+        self.analysis_thread.start()
+
+    def _stop_analysis_dispatcher(self):
+        """停止分发线程，队列中已有的帧会先提交处理"""
+        if self.analysis_thread is None:
+            return
+        if self.camera:
+            self.camera.set_analysis_queue(None)
+        self.analysis_queue.put(None)
+        self.analysis_thread.join(timeout=5)
+        self.analysis_thread = None
+        self.analysis_queue = None
+
+    def _analysis_dispatcher(self):
+        """从分析队列取出相机帧并提交异步处理任务"""
+        while True:
+            frame = self.analysis_queue.get()
+            try:
+                if frame is None:
+                    break
+                image, image_path, image_type, release, save_future = frame
+                future = None
+                try:
+                    # 按预计路径立即提交，不等待磁盘保存；保存完成后结果改为实际保存路径
+                    future = self._submit_analysis(image_path, image_type, image, save_future)
+                finally:
+                    # 分析进程池提交时已把帧复制到共享内存，可以立即归还相机帧缓冲；
+                    # 线程池处理时直接使用帧缓冲，分析结束后再归还
+                    if release is not None:
+                        if future is not None and self.analysis_pool is None:
+                            future.add_done_callback(lambda f, release=release: release())
+                        else:
+                            release()
+                if future is not None:
+                    print(f"已提交异步处理任务: {image_path} (类型: {image_type}, 内存帧)")
+            except Exception as e:
+                print(f"提交内存帧处理任务失败: {str(e)}")
+            finally:
+                self.analysis_queue.task_done()
+
+    def _async_process_single_image(self, image_path, image_type, image=None):
+        """在线程池中处理单张图片（未启动分析进程池时使用），image 为相机内存帧时不读取磁盘文件"""
+        return analyze_image(image_path, image_type, image, self.result_session_id)
+
+    def _submit_analysis(self, image_path, image_type, image=None, save_future=None):
+        """
+        提交单张图片分析任务：优先使用分析进程池，排队已满时阻塞（背压）
+        :param save_future: 相机帧的保存 Future，完成后结果中的路径改为实际保存路径
+        :return: 分析任务 Future，提交失败时返回 None
+        """
+        if self.analysis_pool is not None:
+            future = self.analysis_pool.submit(image_path, image_type, image)
+        else:
+            future = self.thread_pool.submit(self._async_process_single_image, image_path, image_type, image)
+        if future is not None:
+            # 分析结束、记录保存路径并推送事件后完成，实验结束时等待的是这个任务
+            task = Future()
+            self.processing_tasks.append(task)
+            PROCESSING_TASKS.set(len(self.processing_tasks))
+            future.add_done_callback(
+                lambda f: self._on_analysis_done(f, task, image_path, image_type, save_future))
+        return future
+
+    def _on_analysis_done(self, future, task, image_path, image_type, save_future):
+        """分析结束后等待图片保存完成（在保存线程的回调中继续，不阻塞分析分发）"""
+        if save_future is None:
+            self._finish_analysis(future, task, image_path, image_type, None)
+        else:
+            save_future.add_done_callback(
+                lambda s: self._finish_analysis(future, task, image_path, image_type, s))
+
+    def _finish_analysis(self, future, task, image_path, image_type, save_future):
+        """记录实际保存路径，推送分析结果事件，完成分析任务"""
+        result_id = None
         try:
-            import sys
-            # 添加项目根目录到路径
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            project_root = os.path.dirname(current_dir)
-            if project_root not in sys.path:
-                sys.path.insert(0, project_root)
-            
-            # 导入图片处理模块
-            from process_sand_images import process_image, load_background_model
-            
-            print(f"开始异步处理单张图片: {image_path} (类型: {image_type})")
-            
-            # 检查图片文件是否存在
-            if not os.path.exists(image_path):
-                print(f"图片文件不存在: {image_path}")
-                return None
-            
-            # 加载背景模型
-            background = load_background_model(image_type)
-            if background is None:
-                print(f"无法加载 {image_type} 背景模型")
-                return None
-            
-            # 处理单张图片
-            result = process_image(image_path, background, image_type, debug=False)
-            
-            if result["success"]:
-                # 保存单次处理结果
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]  # 包含毫秒
-                temp_result_file = os.path.join(
-                    r"C:\Users\ASUS\Desktop\SandControl\sand-nb-master\src\main\python\results",
-                    f"temp_single_result_{timestamp}.json"
-                )
-                
-                # 构建单张图片的结果数据
-                single_result = {
-                    "image_path": image_path,
-                    "image_type": image_type,
-                    "original_path": result["original_path"],
-                    "classified_path": result["classified_path"],
-                    "segmented_path": result["segmented_path"],
-                    "contours_count": result["contours_count"],
-                    "grade_statistics": result["grade_statistics"],
-                    "success": True,
-                    "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "processing_id": timestamp
-                }
-                
-                # 确保results目录存在
-                os.makedirs(os.path.dirname(temp_result_file), exist_ok=True)
-                
-                with open(temp_result_file, 'w', encoding='utf-8') as f:
-                    json.dump(single_result, f, indent=2, ensure_ascii=False)
-                
-                print(f"单张图片处理完成，结果保存到: {temp_result_file}")
-                return temp_result_file
-            else:
-                print(f"单张图片处理失败: {result.get('error', 'Unknown error')}")
-                return None
-                
+            result_id = None if future.cancelled() or future.exception() else future.result()
+            if save_future is not None:
+                image_path = self._record_saved_path(result_id, image_path, save_future)
+            self._publish_analysis(result_id, image_path, image_type)
+        finally:
+            task.set_result(result_id)
+
+    def _record_saved_path(self, result_id, image_path, save_future):
+        """
+        结果中记录实际保存路径（扩展名、归档段文件由保存方式决定），保存失败时保留预计的路径
+        :return: 结果中的图片路径
+        """
+        try:
+            saved_path = save_future.result()
         except Exception as e:
-            print(f"异步处理单张图片出错: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            return None
+            print(f"图片未保存（{str(e) or type(e).__name__}），分析结果使用预计路径: {image_path}")
+            return image_path
+        try:
+            if saved_path != image_path and result_id and result_id is not True:
+                get_result_store().update_image_path(result_id, saved_path)
+        except Exception as e:
+            print(f"更新结果 {result_id} 的图片路径时出错: {str(e)}")
+        return saved_path
+
+    def _publish_analysis(self, result_id, image_path, image_type):
+        """分析任务结束后推送分析结果事件"""
+        try:
+            ANALYSIS_RESULTS.inc(result="success" if result_id else "failure")
+            backlog = self.analysis_backlog()
+            ANALYSIS_BACKLOG.set(backlog)
+            if not result_id:
+                publish(ERROR, source="analysis", message=f"图片分析失败: {image_path}",
+                        image_path=image_path, image_type=image_type)
+                return
+            result = get_result_store().result(result_id) if result_id is not True else None
+            if result is None:
+                result = {"image_path": image_path, "image_type": image_type,
+                          "group_number": group_number_of(image_path)}
+            # 分析有积压、各组阶段重叠时，当前拍摄的组不一定是这张图片的组
+            publish(IMAGE_ANALYZED, group=result["group_number"], backlog=backlog, **result)
+        except Exception as e:
+            print(f"推送分析结果事件时出错: {str(e)}")
+
+    def analysis_backlog(self):
+        """等待分析的帧数（分发队列中的帧和分析进程池中排队、处理中的帧）"""
+        backlog = self.analysis_queue.qsize() if self.analysis_queue is not None else 0
+        if self.analysis_pool is not None:
+            backlog += self.analysis_pool.backlog()
+        else:
+            backlog += sum(1 for task in self.processing_tasks if not task.done())
+        return backlog
 
     def _consolidate_processing_results(self):
-        """整合所有处理结果"""
+        """结束本次实验的结果会话，结果已在处理时逐条写入结果存储"""
         try:
-            results_dir = r"C:\Users\ASUS\Desktop\SandControl\sand-nb-master\src\main\python\results"
-            
-            # 查找所有临时结果文件（包括单张图片和批量处理）
-            temp_files = [f for f in os.listdir(results_dir) 
-                         if f.startswith("temp_single_result_") or f.startswith("temp_processing_results_")]
-            
-            if not temp_files:
-                print("没有找到待整合的临时结果文件")
+            if self.result_session_id is None:
+                print("没有待整合的处理结果")
                 return
-            
-            print(f"找到 {len(temp_files)} 个临时结果文件，开始整合...")
-            
-            # 初始化整合结果
-            consolidated_results = {
-                "global": [],
-                "local": [],
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "processing_sessions": [],
-                "summaryStats": {
-                    "global": {
-                        "totalImages": 0,
-                        "successfulImages": 0,
-                        "totalParticles": 0
-                    },
-                    "local": {
-                        "totalImages": 0,
-                        "successfulImages": 0,
-                        "totalParticles": 0
-                    }
-                }
-            }
-            
-            # 整合所有临时文件
-            for temp_file in sorted(temp_files):
-                temp_path = os.path.join(results_dir, temp_file)
-                try:
-                    with open(temp_path, 'r', encoding='utf-8') as f:
-                        temp_data = json.load(f)
-                    
-                    # 处理单张图片结果
-                    if temp_file.startswith("temp_single_result_"):
-                        image_type = temp_data.get("image_type", "unknown")
-                        if image_type in ["global", "local"]:
-                            # 转换单张图片结果为列表格式
-                            result_item = {
-                                "image_path": temp_data.get("image_path"),
-                                "original_path": temp_data.get("original_path"),
-                                "classified_path": temp_data.get("classified_path"),
-                                "segmented_path": temp_data.get("segmented_path"),
-                                "contours_count": temp_data.get("contours_count", 0),
-                                "grade_statistics": temp_data.get("grade_statistics", []),
-                                "success": temp_data.get("success", False)
-                            }
-                            consolidated_results[image_type].append(result_item)
-                            
-                            # 更新统计信息
-                            consolidated_results["summaryStats"][image_type]["totalImages"] += 1
-                            if temp_data.get("success", False):
-                                consolidated_results["summaryStats"][image_type]["successfulImages"] += 1
-                                consolidated_results["summaryStats"][image_type]["totalParticles"] += temp_data.get("contours_count", 0)
-                    
-                    # 处理批量结果（保持向后兼容）
-                    elif temp_file.startswith("temp_processing_results_"):
-                        # 合并数据
-                        consolidated_results["global"].extend(temp_data.get("global", []))
-                        consolidated_results["local"].extend(temp_data.get("local", []))
-                        
-                        # 更新统计信息
-                        if "summaryStats" in temp_data:
-                            for image_type in ["global", "local"]:
-                                if image_type in temp_data["summaryStats"]:
-                                    stats = temp_data["summaryStats"][image_type]
-                                    consolidated_results["summaryStats"][image_type]["totalImages"] += stats.get("totalImages", 0)
-                                    consolidated_results["summaryStats"][image_type]["successfulImages"] += stats.get("successfulImages", 0)
-                                    consolidated_results["summaryStats"][image_type]["totalParticles"] += stats.get("totalParticles", 0)
-                    
-                    # 记录处理会话信息
-                    session_info = {
-                        "processing_id": temp_data.get("processing_id", "unknown"),
-                        "timestamp": temp_data.get("timestamp", "unknown"),
-                        "file_type": "single" if temp_file.startswith("temp_single_result_") else "batch"
-                    }
-                    consolidated_results["processing_sessions"].append(session_info)
-                    
-                    print(f"整合临时文件: {temp_file}")
-                    
-                except Exception as e:
-                    print(f"整合文件 {temp_file} 时出错: {str(e)}")
-                    continue
-            
-            # 保存整合结果
-            final_result_file = os.path.join(results_dir, "processing_results.json")
-            with open(final_result_file, 'w', encoding='utf-8') as f:
-                json.dump(consolidated_results, f, indent=2, ensure_ascii=False)
-            
-            print(f"结果整合完成，保存到: {final_result_file}")
-            print(f"总计处理: 全局图片 {consolidated_results['summaryStats']['global']['totalImages']} 张, "
-                  f"局部图片 {consolidated_results['summaryStats']['local']['totalImages']} 张")
-            
-            # 清理临时文件
-            for temp_file in temp_files:
-                temp_path = os.path.join(results_dir, temp_file)
-                try:
-                    os.remove(temp_path)
-                    print(f"删除临时文件: {temp_file}")
-                except Exception as e:
-                    print(f"删除临时文件 {temp_file} 时出错: {str(e)}")
-            
+
+            store = get_result_store()
+            store.finish_session(self.result_session_id)
+            # 图片处理页面读取 processing_results.json
+            store.export_json(PROCESSING_RESULTS_PATH, self.result_session_id)
+            summary = store.summary(self.result_session_id)
+            print(f"结果已保存到: {store.path} (会话 {self.result_session_id})，"
+                  f"并导出到: {PROCESSING_RESULTS_PATH}")
+            print(f"总计处理: 全局图片 {summary['global']['totalImages']} 张, "
+                  f"局部图片 {summary['local']['totalImages']} 张")
+            publish(EXPERIMENT_FINISHED, session_id=self.result_session_id, stopped=self.should_stop,
+                    total_photos=self.total_photos, summaryStats=summary)
+            self.result_session_id = None
+
         except Exception as e:
             print(f"整合处理结果时出错: {str(e)}")
             import traceback
@@ -462,6 +477,103 @@ class ProcessControl:
         
         print("实验停止信号已发出，正在安全退出...")
 
+    def spread_sand(self):
+        """倒砂后等待砂落稳，向左振动摊开"""
+        with tracer.span("sleep.spread_settle", "sleep"):
+            time.sleep(0.3)  # 等待给料稳定
+        with tracer.span("vibration.spread", "vibration"):
+            triggle_single_action(self.master, 3, 2)
+            stop_single_action(self.master, 0.3)
+
+    def photograph_group(self, base_path, group_count, photos_per_group):
+        """执行一组的拍照和振动循环"""
+        photo_count = 1
+        while photo_count <= photos_per_group and not self.should_stop:  # 添加停止检查
+            # 初始振动
+            if photo_count == 1:
+                with tracer.span("vibration.initial", "vibration", group=group_count):
+                    triggle_single_action(self.master, 11, 5)
+            # 振动
+            print(f"第 {photo_count} 次振动...")
+            with tracer.span("vibration.shake", "vibration", group=group_count, photo=photo_count):
+                triggle_single_action(self.master, 11, 0.5)
+                stop_single_action(self.master, 0.6)
+            with tracer.span("sleep.before_photo", "sleep"):
+                time.sleep(0.5)
+            # 拍照 - 使用CameraControl的方法拍照
+            photo_start_time = time.time()
+            try:
+                # 创建保存路径
+                photo_name = f"{group_count}_{photo_count}"
+
+                # 调用camera_control中的拍照方法
+                captured_images = self.camera.capture_images(base_path, photo_name)
+                if captured_images:
+                    photo_end_time = time.time()
+                    photo_duration = photo_end_time - photo_start_time
+                    print(f"第 {group_count} 组第 {photo_count} 张照片拍摄完成，耗时: {photo_duration:.3f} 秒")
+
+                    # 更新状态数据
+                    self.current_group = group_count
+                    self.current_photo = photo_count
+                    self.total_photos += 1  # 每拍一张照片就加1
+
+                    # # 立即启动单张图片的异步处理任务
+                    self._process_captured_images(captured_images, group_count, photo_count)
+                    self.analysis_backlog_count = self.analysis_backlog()
+                    tracer.counter("analysis.backlog", "analysis", frames=self.analysis_backlog_count)
+                    ANALYSIS_BACKLOG.set(self.analysis_backlog_count)
+                    print(f"当前待分析图片: {self.analysis_backlog_count} 张")
+                    publish(PHOTO_CAPTURED, group=group_count, photo=photo_count,
+                            total_photos=self.total_photos, images=captured_images,
+                            duration=round(photo_duration, 3), backlog=self.analysis_backlog_count)
+                else:
+                    print(f"第 {group_count} 组第 {photo_count} 张照片拍摄失败")
+                    publish(ERROR, source="camera", group=group_count, photo=photo_count,
+                            message=f"第 {group_count} 组第 {photo_count} 张照片拍摄失败")
+
+            except Exception as e:
+                print(f"拍照错误: {str(e)}")
+                print(f"第 {group_count} 组第 {photo_count} 张照片拍摄失败")
+                publish(ERROR, source="camera", group=group_count, photo=photo_count,
+                        message=f"拍照错误: {str(e)}")
+
+            photo_count += 1
+
+        if self.should_stop:
+            print("拍照循环中检测到停止信号，正在安全停止实验...")
+
+    def clean_plate(self, group_count):
+        """执行清砂操作"""
+        print(f"\n第 {group_count} 组照片拍摄完成，开始清理沙石...")
+        clean_success = self.cleaner.execute_clean_sequence()
+        if clean_success:
+            print("沙石清理完成")
+        else:
+            print("沙石清理失败")
+        publish(CLEAN_COMPLETED, group=group_count, success=bool(clean_success))
+        return clean_success
+
+    def settle_plate(self, seconds=8):
+        """清砂后等待，收到停止信号时提前结束"""
+        with tracer.span("sleep.settle_plate", "sleep"):
+            deadline = time.time() + seconds
+            while not self.should_stop and time.time() < deadline:
+                time.sleep(min(0.1, max(0.0, deadline - time.time())))
+
+    def _finish_group(self, phases, group_count, previous=None):
+        """等待一组实验的全部阶段结束，打印周期"""
+        for phase in phases.values():
+            phase.wait()
+        cycle = group_cycle_time(phases, previous)
+        if cycle is not None:
+            print(f"第 {group_count} 组完成，周期: {cycle:.3f} 秒")
+            tracer.record("group.cycle", phases["settle"].end_time - cycle, cycle, "group", group=group_count)
+        failed = [phase.name for phase in phases.values() if phase.status == FAILED]
+        if failed:
+            self.should_stop = True
+            raise Exception(f"第 {group_count} 组阶段执行失败: {', '.join(failed)}")
+
     def execute_process(self, base_path, sand_total=500, once_count=0.1, start_group=None, photos_per_group=5):
         """
         执行完整的拍照和清砂流程
@@ -473,6 +585,7 @@ class ProcessControl:
             start_group: 起始组号，如果为None则自动获取下一组号
             photos_per_group: 每组照片数，默认为5
         """
+        scheduler = None
         try:
             print("\n开始执行拍照和清砂流程...")
 
@@ -490,6 +603,19 @@ class ProcessControl:
             self.total_photos = 0
             total_start_time = time.time()
 
+            # 本次实验的结果会话，处理结果到达即写入
+            self.result_session_id = get_result_store().start_session(base_path)
+
+            # 记录本次实验各阶段的耗时，结束时导出 trace 文件
+            tracer.start_run(f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_session{self.result_session_id}")
+
+            # 启动分析进程池，进程在整个实验期间常驻
+            if self.analysis_pool is None:
+                self.analysis_pool = AnalysisPool(session_id=self.result_session_id).start()
+
+            publish(EXPERIMENT_STARTED, session_id=self.result_session_id, base_path=base_path,
+                    sand_total=sand_total, once_count=once_count, photos_per_group=photos_per_group)
+
             # 如果没有指定起始组号，则自动获取下一组号
             if start_group is None:
                 last_group = self._get_last_group_number(base_path)
@@ -503,93 +629,34 @@ class ProcessControl:
             # 开启背光源
             triggle_or_save_action(self.master, 2, 1)
 
+            # 按阶段依赖调度：下一组的给料称量与本组的拍照、清砂同时进行，舵机复位与拍照同时进行
+            scheduler = ExperimentScheduler(should_stop=lambda: self.should_stop)
+            before = previous = previous_group = None
             while total > 0 and not self.should_stop:
-                # 检查停止信号
-                if self.should_stop:
-                    print("检测到停止信号，正在安全停止实验...")
-                    break
-                
-                # 1. 给料
-                self.start_feeding(once_count)
-                time.sleep(0.3)  # 等待给料稳定
-
-                # 检查停止信号
-                if self.should_stop:
-                    print("给料后检测到停止信号，正在安全停止实验...")
-                    break
-
-                # 2. 向左振动（移到给料后执行）
-                triggle_single_action(self.master, 3, 2)
-                stop_single_action(self.master, 0.3)
-
-                # 3. 执行拍照和振动循环
-                photo_count = 1
-                while photo_count <= photos_per_group and not self.should_stop:  # 添加停止检查
-                    # 检查停止信号
-                    if self.should_stop:
-                        print("拍照循环中检测到停止信号，正在安全停止实验...")
-                        break
-                    
-                    # 初始振动
-                    if photo_count == 1:
-                        triggle_single_action(self.master, 11, 5)
-                    # 振动
-                    print(f"第 {photo_count} 次振动...")
-                    triggle_single_action(self.master, 11, 0.5)
-                    stop_single_action(self.master, 0.6)
-                    time.sleep(0.5)
-                    # 拍照 - 使用CameraControl的方法拍照
-                    photo_start_time = time.time()
-                    try:
-                        # 创建保存路径
-                        photo_name = f"{group_count}_{photo_count}"
-
-                        # 调用camera_control中的拍照方法
-                        captured_images = self.camera.capture_images(base_path, photo_name)
-                        if captured_images:
-                            photo_end_time = time.time()
-                            photo_duration = photo_end_time - photo_start_time
-                            print(f"第 {group_count} 组第 {photo_count} 张照片拍摄完成，耗时: {photo_duration:.3f} 秒")
-                            
-                            # 更新状态数据
-                            self.current_group = group_count
-                            self.current_photo = photo_count
-                            self.total_photos += 1  # 每拍一张照片就加1
-                            
-                            # # 立即启动单张图片的异步处理任务 
-                            self._process_captured_images(captured_images, group_count, photo_count)
-                        else:
-                            print(f"第 {group_count} 组第 {photo_count} 张照片拍摄失败")
-
-                    except Exception as e:
-                        print(f"拍照错误: {str(e)}")
-                        print(f"第 {group_count} 组第 {photo_count} 张照片拍摄失败")
-
-                    photo_count += 1
-
-                # 检查停止信号（拍照完成后）
-                if self.should_stop:
-                    print("拍照完成后检测到停止信号，跳过清砂操作...")
-                    break
-
-                # 4. 执行清砂操作
-                print(f"\n第 {group_count} 组照片拍摄完成，开始清理沙石...")
-                if self.cleaner.execute_clean_sequence():
-                    print("沙石清理完成")
-                else:
-                    print("沙石清理失败")
-
-                # 检查停止信号（清砂后）
-                if self.should_stop:
-                    print("清砂后检测到停止信号，正在安全停止实验...")
-                    break
+                actions = {
+                    "prepare": lambda: self.prepare_phase(once_count),
+                    "dump": self.dump_dose,
+                    "reset": self.reset_servo,
+                    "spread": self.spread_sand,
+                    "photos": lambda g=group_count: self.photograph_group(base_path, g, photos_per_group),
+                    "clean": lambda g=group_count: self.clean_plate(g),
+                    "settle": self.settle_plate,
+                }
+                phases = schedule_group(scheduler, group_count, actions, previous, EXPERIMENT_OVERLAP_FEEDING)
 
-                time.sleep(8)
+                # 同时最多两组在进行：等上一组结束后再提交下一组
+                if previous is not None:
+                    self._finish_group(previous, previous_group, before)
+                before, previous, previous_group = previous, phases, group_count
 
                 total -= 1
                 group_count += 1
                 print(f"剩余次数: {total}")
 
+            if previous is not None:
+                self._finish_group(previous, previous_group, before)
+            scheduler.wait_all()
+
             total_end_time = time.time()
             total_duration = total_end_time - total_start_time
             
@@ -600,8 +667,13 @@ class ProcessControl:
 
         except Exception as e:
             print(f"流程执行出错: {str(e)}")
+            publish(ERROR, source="process", message=f"流程执行出错: {str(e)}")
             raise
         finally:
+            # 等待正在执行的阶段结束（出错时已设置停止标志，未开始的阶段会被跳过）
+            if scheduler is not None and not scheduler.wait_all(timeout=60):
+                print("等待实验阶段结束超时")
+
             # 确保停止所有振动动作
             try:
                 stop_single_action(self.master, 0.3)  # 停止向左振动
@@ -613,6 +685,10 @@ class ProcessControl:
             
             # 等待剩余的异步处理任务完成并整合结果
             try:
+                # 等待分析队列中的帧全部提交
+                if self.analysis_queue is not None:
+                    self.analysis_queue.join()
+
                 if hasattr(self, 'processing_tasks') and self.processing_tasks:
                     print(f"实验结束，等待剩余 {len(self.processing_tasks)} 个图片处理任务完成...")
                     completed_tasks = 0
@@ -624,7 +700,7 @@ class ProcessControl:
                             result = task.result(timeout=60)  # 1分钟超时
                             if result:
                                 completed_tasks += 1
-                                print(f"处理任务 {i+1} 完成: {os.path.basename(result) if result else 'Unknown'}")
+                                print(f"处理任务 {i+1} 完成: 结果编号 {result}")
                             else:
                                 failed_tasks += 1
                                 print(f"处理任务 {i+1} 失败")
@@ -634,6 +710,13 @@ class ProcessControl:
                     
                     print(f"图片处理任务完成统计: 成功 {completed_tasks}, 失败 {failed_tasks}")
                     self.processing_tasks.clear()
+                    PROCESSING_TASKS.set(0)
+
+                # 实验结束后关闭分析进程池
+                if self.analysis_pool is not None:
+                    self.analysis_pool.shutdown()
+                    self.analysis_pool = None
+                self.analysis_backlog_count = 0
                 
                 # 在实验结束时整合所有结果
                 print("实验完成，开始整合所有图片处理结果...")
@@ -645,6 +728,12 @@ class ProcessControl:
                 import traceback
                 traceback.print_exc()
 
+            # 导出本次实验的计时记录
+            try:
+                tracer.finish_run()
+            except Exception as e:
+                print(f"保存实验计时记录时出错: {str(e)}")
+
     def _release_camera_resources(self):
         """释放相机资源"""
         try:
@@ -665,6 +754,17 @@ class ProcessControl:
         Closes all control systems and connections with proper cleanup.
         """
         try:
+            # Stop the background scale sampler (wakes any feeding wait)
+            if self.scale_sampler is not None:
+                self.scale_sampler.stop()
+                self.scale_sampler = None
+
+            # Stop the in-memory analysis dispatcher and the analysis worker pool
+            self._stop_analysis_dispatcher()
+            if self.analysis_pool is not None:
+                self.analysis_pool.shutdown(wait=False)
+                self.analysis_pool = None
+
             # Close feeding control
             if hasattr(self, 'feeding_control') and self.feeding_control:
                 try:
@@ -765,6 +865,11 @@ class ProcessControl:
             print(f"第 {group_count} 组第 {photo_count} 张: 没有图片需要处理")
             return
             
+        # 内存直通模式下帧已由分发线程提交处理
+        if self.analysis_queue is not None:
+            print(f"第 {group_count} 组第 {photo_count} 张: 图片已通过内存队列提交处理")
+            return
+
         print(f"第 {group_count} 组第 {photo_count} 张: 开始异步处理 {len(captured_images)} 张图片")
         
         # 为每张图片启动异步处理任务
@@ -792,8 +897,7 @@ class ProcessControl:
                     continue
                 
                 # 提交异步处理任务
-                future = self.thread_pool.submit(self._async_process_single_image, image_path, image_type)
-                self.processing_tasks.append(future)
+                self._submit_analysis(image_path, image_type)
                 
                 print(f"已提交异步处理任务: {image_path} (类型: {image_type})")
                 
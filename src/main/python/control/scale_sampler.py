@@ -0,0 +1,208 @@
+"""
+电子秤后台采样
+
+给料时 servo_control 不停地读传感器寄存器（没有间隔，占满 CPU 和串口），/scale/weight 又在同一个 COM5 上单独读取。
+这里由一个后台线程按固定频率读取电子秤，写入带时间戳的环形缓冲，给料流程和 API 都从缓冲中取值：
+    latest()          最新采样
+    rate_of_change()  最近一段时间的重量变化速度
+    wait_until()      阻塞等待重量达到目标值
+读取经过电子秤的设备执行器（utils.device_executor.SCALE），与 API 的校准等操作串行，不会同时占用串口。
+"""
+import os
+import sys
+import threading
+import time
+from collections import deque, namedtuple
+
+# 添加项目根目录到路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from config.default_config import SCALE_SAMPLE_RATE, SCALE_BUFFER_SIZE, SCALE_SLAVE
+from utils.device_executor import SCALE, get_device_executor
+
+# 一次读取 0x50~0x53 四个保持寄存器：
+# 0x50、0x51 为 32 位重量（高位在前，/scale/weight 使用），0x53（83）为给料控制使用的传感器数据
+WEIGHT_REGISTER = 0x50
+WEIGHT_REGISTER_COUNT = 4
+FEED_REGISTER_OFFSET = 83 - WEIGHT_REGISTER
+
+# 单个采样：time.time() 时间戳，重量（克），给料传感器原始值
+WeightSample = namedtuple("WeightSample", ["timestamp", "weight", "raw"])
+
+
+def registers_to_weight(high, low):
+    """两个寄存器组成的 32 位有符号整数（高位在前）"""
+    value = (high << 16) | low
+    if value & 0x80000000:
+        value -= 0x100000000
+    return value
+
+
+class ScaleSampler:
+    """
+    电子秤后台采样线程，可在多个线程中同时读取
+    """
+
+    def __init__(self, client, rate=None, buffer_size=None, slave=None):
+        """
+        :param client: 已连接的 pymodbus ModbusSerialClient
+        :param rate: 采样频率（Hz），None 使用 SCALE_SAMPLE_RATE 配置
+        :param buffer_size: 环形缓冲保留的采样数，None 使用 SCALE_BUFFER_SIZE 配置
+        :param slave: 从站地址，None 使用 SCALE_SLAVE 配置
+        """
+        self.client = client
+        self.rate = rate or SCALE_SAMPLE_RATE
+        self.slave = SCALE_SLAVE if slave is None else slave
+        self._samples = deque(maxlen=buffer_size or SCALE_BUFFER_SIZE)
+        self._sequence = 0  # 已采样总数
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.errors = 0
+        self.last_error = None
+
+    def start(self):
+        """启动采样线程"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="scale-sampler", daemon=True)
+            self._thread.start()
+            print(f"电子秤采样已启动: {self.rate} Hz")
+        return self
+
+    def stop(self, timeout=2.0):
+        """停止采样线程，唤醒所有等待者"""
+        self._stop_event.set()
+        with self._condition:
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+            print("电子秤采样已停止")
+
+    @property
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive() and not self._stop_event.is_set()
+
+    def _read(self):
+        """读取一次寄存器（在电子秤设备线程中执行）"""
+        response = self.client.read_holding_registers(WEIGHT_REGISTER, count=WEIGHT_REGISTER_COUNT, slave=self.slave)
+        if response.isError():
+            raise IOError(f"读取电子秤失败: {response}")
+        registers = response.registers
+        return WeightSample(time.time(), registers_to_weight(registers[0], registers[1]),
+                            registers[FEED_REGISTER_OFFSET])
+
+    def _run(self):
+        period = 1.0 / self.rate
+        executor = get_device_executor(SCALE)
+        next_time = time.monotonic()
+        while not self._stop_event.is_set():
+            try:
+                sample = executor.call(self._read, timeout=max(1.0, 5 * period))
+            except Exception as e:
+                self.errors += 1
+                if str(e) != self.last_error:
+                    print(f"电子秤采样出错: {e}")
+                self.last_error = str(e)
+            else:
+                with self._condition:
+                    self._samples.append(sample)
+                    self._sequence += 1
+                    self._condition.notify_all()
+
+            # 按固定频率采样，读取耗时超过周期时不补采
+            next_time += period
+            delay = next_time - time.monotonic()
+            if delay < 0:
+                next_time = time.monotonic()
+                delay = 0
+            self._stop_event.wait(delay)
+
+    def latest(self):
+        """最新采样，尚无采样时返回 None"""
+        with self._condition:
+            return self._samples[-1] if self._samples else None
+
+    def samples(self, since=None):
+        """
+        缓冲中的采样
+        :param since: 只返回时间戳不早于该值的采样，None 为全部
+        """
+        with self._condition:
+            return [sample for sample in self._samples if since is None or sample.timestamp >= since]
+
+    def rate_of_change(self, window=1.0, field="weight", since=None):
+        """
+        最近 window 秒内重量的变化速度（最小二乘斜率）
+        :param field: weight 或 raw
+        :param since: 只使用时间戳不早于该值的采样，None 不限制
+        :return: 每秒变化量，采样不足两个时返回 None
+        """
+        latest = self.latest()
+        if latest is None:
+            return None
+        start = latest.timestamp - window if since is None else max(latest.timestamp - window, since)
+        points = [(sample.timestamp, getattr(sample, field)) for sample in self.samples(start)]
+        if len(points) < 2:
+            return None
+        mean_t = sum(t for t, _ in points) / len(points)
+        mean_v = sum(v for _, v in points) / len(points)
+        var_t = sum((t - mean_t) ** 2 for t, _ in points)
+        if var_t == 0:
+            return None
+        return sum((t - mean_t) * (v - mean_v) for t, v in points) / var_t
+
+    def wait_for(self, predicate, timeout=None, since=None):
+        """
+        阻塞等待满足条件的新采样
+        :param predicate: 以 WeightSample 为参数的判断函数
+        :param timeout: 最长等待秒数，None 表示一直等待
+        :param since: 只判断时间戳不早于该值的采样，None 为调用之后的采样
+        :return: 满足条件的采样；超时或采样停止时返回 None
+        """
+        since = time.time() if since is None else since
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            pending = [sample for sample in self._samples if sample.timestamp >= since]
+            seen = self._sequence
+            while True:
+                for sample in pending:
+                    if predicate(sample):
+                        return sample
+                if self._stop_event.is_set():
+                    return None
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+                # 只判断等待期间新增的采样
+                new_count = min(self._sequence - seen, len(self._samples))
+                pending = list(self._samples)[len(self._samples) - new_count:] if new_count else []
+                seen = self._sequence
+
+    def wait_until(self, target, timeout=None, field="weight"):
+        """
+        阻塞等待重量不小于目标值
+        :param target: 目标值
+        :param field: weight（克）或 raw（给料传感器原始值）
+        :return: 达到目标的采样；超时或采样停止时返回 None
+        """
+        return self.wait_for(lambda sample: getattr(sample, field) >= target, timeout)
+
+    def stats(self):
+        """采样状态"""
+        latest = self.latest()
+        with self._condition:
+            count = len(self._samples)
+        return {
+            "running": self.is_running,
+            "rate": self.rate,
+            "samples": count,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "latest": latest._asdict() if latest is not None else None,
+        }
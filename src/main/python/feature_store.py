@@ -0,0 +1,250 @@
+"""
+列式颗粒特征存储
+
+save_data_txt 以前把每张图片的颗粒特征写成 `key: str(list)` 文本再加一个 pickle，读取时需要 ast.literal_eval，
+几十万颗粒时又慢又占内存。这里为每个数据文件建立一个 `<name>.features/` 目录：
+    meta.json              键列表、每个键的图片数量以及非列表属性
+    {key}.npy              该键所有图片的颗粒值拼接成的一维 float64 数组
+    {key}.offsets.npy      每张图片在 {key}.npy 中的起止偏移，长度为图片数 + 1
+读取时按需内存映射，data[key][i] 即第 i 张图片的颗粒数组，与原来的 list[list] 用法一致。
+
+用法（转换已有的 txt/pickle 数据集）：
+    python feature_store.py <数据根目录> [--overwrite]
+"""
+import argparse
+import json
+import os
+from collections.abc import Mapping, Sequence
+
+import numpy as np
+
+STORE_SUFFIX = ".features"
+META_FILE = "meta.json"
+STORE_VERSION = 1
+
+
+def feature_store_path(file_path):
+    """
+    数据文件对应的特征存储目录，例如 value1.txt -> value1.features
+    :param file_path: txt 文件路径（或已经是存储目录）
+    :return: 存储目录路径
+    """
+    if file_path.endswith(STORE_SUFFIX):
+        return file_path
+    root, ext = os.path.splitext(file_path)
+    return (root if ext == ".txt" else file_path) + STORE_SUFFIX
+
+
+def has_feature_store(file_path):
+    """判断数据文件是否已有特征存储"""
+    return os.path.exists(os.path.join(feature_store_path(file_path), META_FILE))
+
+
+def dataset_exists(file_path):
+    """数据文件存在（特征存储、txt 或 pickle 任一）"""
+    return has_feature_store(file_path) or os.path.exists(file_path) or os.path.exists(file_path + ".pickle")
+
+
+def _is_column(value):
+    """每张图片一个列表的列数据"""
+    return isinstance(value, (list, tuple)) and all(isinstance(v, (list, tuple, np.ndarray)) for v in value)
+
+
+def _is_flat(value):
+    """一维数值列表"""
+    return isinstance(value, (list, tuple, np.ndarray)) and all(
+        isinstance(v, (int, float, np.number)) and not isinstance(v, bool) for v in value)
+
+
+def save_features(file_path, data):
+    """
+    保存特征字典为列式存储，已存在的同名存储会被覆盖
+    :param file_path: txt 文件路径或存储目录路径
+    :param data: 字典数据，列表的列表按图片分段保存，一维列表保存为单段，其他值保存在 meta.json 中
+    :return: 存储目录路径
+    """
+    if not isinstance(data, Mapping):
+        raise TypeError("data must be a dictionary")
+
+    store_path = feature_store_path(file_path)
+    os.makedirs(store_path, exist_ok=True)
+
+    meta = {"version": STORE_VERSION, "columns": {}, "attrs": {}}
+    for key, value in data.items():
+        if isinstance(value, FeatureColumn):
+            values, offsets = np.asarray(value.values, dtype=np.float64), np.asarray(value.offsets)
+        elif _is_column(value):
+            lengths = np.fromiter((len(v) for v in value), dtype=np.int64, count=len(value))
+            offsets = np.zeros(len(value) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=offsets[1:])
+            values = (np.concatenate([np.asarray(v, dtype=np.float64).ravel() for v in value])
+                      if offsets[-1] > 0 else np.zeros(0, dtype=np.float64))
+        elif _is_flat(value):
+            values, offsets = np.asarray(value, dtype=np.float64), None
+        else:
+            meta["attrs"][key] = value
+            continue
+
+        # 与 parse_txt_to_dict 一致，空列表不作为键保存
+        if len(values) == 0 and (offsets is None or len(offsets) <= 1):
+            continue
+
+        np.save(os.path.join(store_path, f"{key}.npy"), values)
+        if offsets is not None:
+            np.save(os.path.join(store_path, f"{key}.offsets.npy"), offsets)
+        meta["columns"][key] = {
+            "images": None if offsets is None else int(len(offsets) - 1),
+            "particles": int(len(values)),
+        }
+
+    # meta.json 最后写入，作为存储完整的标志
+    meta_path = os.path.join(store_path, META_FILE)
+    with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(meta_path + ".tmp", meta_path)
+    return store_path
+
+
+class FeatureColumn(Sequence):
+    """
+    一个键的列数据：values 为所有图片拼接的颗粒值，offsets 为每张图片的偏移。
+    column[i] 返回第 i 张图片的颗粒数组（内存映射的切片，不复制数据）。
+    """
+
+    def __init__(self, values, offsets):
+        self.values = values
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("image index out of range")
+        return self.values[self.offsets[index]:self.offsets[index + 1]]
+
+    def lengths(self):
+        """每张图片的颗粒数量"""
+        return np.diff(self.offsets)
+
+    def image_index(self):
+        """每个颗粒所属的图片序号（从0开始）"""
+        return np.repeat(np.arange(len(self)), self.lengths())
+
+    def tolist(self):
+        return [self[i].tolist() for i in range(len(self))]
+
+
+class FeatureStore(Mapping):
+    """
+    只读的列式特征存储，接口与 parse_txt_to_dict 返回的字典一致
+    """
+
+    def __init__(self, file_path, mmap=True):
+        """
+        :param file_path: txt 文件路径或存储目录路径
+        :param mmap: 是否内存映射读取
+        """
+        self.path = feature_store_path(file_path)
+        self.mmap_mode = "r" if mmap else None
+        with open(os.path.join(self.path, META_FILE), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.attrs = self.meta.get("attrs", {})
+        self._columns = {}
+
+    def __getitem__(self, key):
+        if key in self.attrs:
+            return self.attrs[key]
+        if key not in self.meta["columns"]:
+            raise KeyError(key)
+        column = self._columns.get(key)
+        if column is None:
+            values = np.load(os.path.join(self.path, f"{key}.npy"), mmap_mode=self.mmap_mode)
+            if self.meta["columns"][key]["images"] is None:
+                column = values
+            else:
+                offsets = np.load(os.path.join(self.path, f"{key}.offsets.npy"))
+                column = FeatureColumn(values, offsets)
+            self._columns[key] = column
+        return column
+
+    def __iter__(self):
+        yield from self.meta["columns"]
+        yield from self.attrs
+
+    def __len__(self):
+        return len(self.meta["columns"]) + len(self.attrs)
+
+    def values_of(self, key):
+        """某个键所有图片的颗粒值（一维数组）"""
+        column = self[key]
+        return column.values if isinstance(column, FeatureColumn) else np.asarray(column)
+
+
+def load_features(file_path, mmap=True):
+    """
+    打开数据文件对应的特征存储
+    :param file_path: txt 文件路径或存储目录路径
+    :param mmap: 是否内存映射读取
+    :return: FeatureStore
+    """
+    return FeatureStore(file_path, mmap)
+
+
+def convert_file(file_path, overwrite=False):
+    """
+    将已有的 txt（优先使用同名 .pickle）转换为特征存储
+    :return: 存储目录路径，已存在且不覆盖时返回 None
+    """
+    if has_feature_store(file_path) and not overwrite:
+        return None
+
+    pickle_path = file_path + ".pickle"
+    if os.path.exists(pickle_path):
+        from reader import load_pickle_from_file
+        data = load_pickle_from_file(pickle_path)
+    else:
+        from zsh_methods import parse_txt_to_dict
+        data = parse_txt_to_dict(file_path)
+    return save_features(file_path, data)
+
+
+def convert_dataset(root_path, overwrite=False):
+    """
+    递归转换目录下所有 txt/pickle 数据文件
+    :param root_path: 数据根目录
+    :param overwrite: 是否覆盖已有的特征存储
+    :return: 转换的文件数量
+    """
+    converted = 0
+    for dirpath, dirnames, filenames in os.walk(root_path):
+        # 不进入已有的存储目录
+        dirnames[:] = [d for d in dirnames if not d.endswith(STORE_SUFFIX)]
+        for filename in sorted(filenames):
+            if not filename.endswith(".txt"):
+                continue
+            file_path = os.path.join(dirpath, filename)
+            try:
+                if convert_file(file_path, overwrite) is not None:
+                    converted += 1
+                    print(f"转换完成：{file_path}")
+            except Exception as e:
+                print(f"转换 {file_path} 时出错: {str(e)}")
+    return converted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="将 txt/pickle 特征数据集转换为列式存储")
+    parser.add_argument("root", help="数据根目录")
+    parser.add_argument("--overwrite", action="store_true", help="覆盖已有的特征存储")
+    args = parser.parse_args()
+    converted = convert_dataset(args.root, args.overwrite)
+    print(f"共转换 {converted} 个文件")
+
+
+if __name__ == "__main__":
+    main()
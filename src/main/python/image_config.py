@@ -2,6 +2,23 @@
 
 # Controls whether to split overlapping sand particles
 mixture_split = True
+single_split = False
+
+# Morphological opening used by pictures_handle (global / local)
+global_ksize = (3, 3)
+global_iterations = 1
+local_ksize = (3, 3)
+local_iterations = 1
+
+# Concave-point angle threshold (degrees) for splitting overlapping particles
+global_angle_k = 130
+local_angle_k = 110
+
+# Tile-parallel processing in pictures_handle (results identical to whole-frame processing)
+tile_mode = False
+tile_size = 1368        # tile core size in pixels, int or (height, width)
+tile_overlap = 384      # extra margin searched around each tile for contours crossing its seams
+tile_workers = None     # thread pool size, None uses os.cpu_count()
 
 # Debug mode
 debug_mode = False
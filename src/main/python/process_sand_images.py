@@ -50,7 +50,8 @@ try:
     LOCAL_IMAGES_PATH = os.path.join(main_input_image_path, "local")
     
     from zsh_image_handle import pictures_handle 
-    from background import read_backgrounds_single, read_backgrounds_mixture
+    from control.frame_archive import read_image, frame_stem, is_segment_file, open_archive, member_path
+    from background import read_backgrounds_single, read_backgrounds_mixture, load_background, BackgroundModel
 
 except ImportError as e:
     print(f"Error importing configuration or modules: {e}")
@@ -75,7 +76,7 @@ COLORS = [
 ]
 
 def load_background_model(image_type):
-    """加载背景模型"""
+    """加载背景模型，进程内只读取一次，背景文件修改后自动重新加载"""
     try:
         bg_path = os.path.join(BACKGROUND_PATH, 
                               GLOBAL_BG_FILE if image_type == "global" else LOCAL_BG_FILE)
@@ -83,17 +84,9 @@ def load_background_model(image_type):
             print(f"Error: Background model not found at {bg_path}")
             return None
             
-        bg_image = cv2.imread(bg_path)
-        if bg_image is None:
-            print(f"Error: Could not load background image from {bg_path}")
-            return None
-            
         # 如果是全局背景图，也要放大5倍
-        if image_type == "global":
-            bg_image = cv2.resize(bg_image, None, fx=5, fy=5, interpolation=cv2.INTER_CUBIC)
-            
-        print(f"Loaded {image_type} background from {bg_path}")
-        return bg_image
+        scale = 5 if image_type == "global" else 1.0
+        return load_background(bg_path, scale)
     except Exception as e:
         print(f"Error loading background model: {str(e)}")
         return None
@@ -130,11 +123,11 @@ def fuse_global_local_images(global_result, local_result):
         print(f"融合图像结果时出错: {str(e)}")
         return None
 
-def process_image(image_path, background, image_type, debug=False):
-    """处理单个图像"""
+def process_image(image_path, background, image_type, debug=False, image=None):
+    """处理单个图像，image 为相机直接传入的 BGR 帧时不再从磁盘读取，image_path 只用于命名结果"""
     try:
         print(f"Processing image: {image_path}")
-        img = cv2.imread(image_path)
+        img = read_image(image_path) if image is None else image
         if img is None:
             return {"success": False, "error": "无法读取图像"}
 
@@ -145,8 +138,10 @@ def process_image(image_path, background, image_type, debug=False):
         #     img = cv2.resize(img, None, fx=5, fy=5, interpolation=cv2.INTER_LINEAR)
         #     mm_per_pixel = mm_per_pixel / 5  # 调整像素比例
         
-        # 调整背景大小
-        if img.shape != background.shape:
+        # 调整背景大小，BackgroundModel 会缓存各尺寸的缩放结果
+        if isinstance(background, BackgroundModel):
+            background_resized = background.resized(img.shape)
+        elif img.shape != background.shape:
             background_resized = cv2.resize(background, (img.shape[1], img.shape[0]), 
                                          interpolation=cv2.INTER_LINEAR)
         else:
@@ -233,7 +228,7 @@ def process_image(image_path, background, image_type, debug=False):
             cv2.drawContours(visualization, contours_list, -1, COLORS[i], 2)
             
         base_path = RESULTS_GLOBAL_PATH if image_type == "global" else RESULTS_LOCAL_PATH
-        base_filename = os.path.splitext(os.path.basename(image_path))[0]
+        base_filename = frame_stem(image_path)
         
         # 保存图像结果
         paths = {}
@@ -274,14 +269,19 @@ def process_images_in_directory(directory_path, image_type, debug=False):
         return results
     
     try:
-        image_files = [f for f in os.listdir(directory_path) 
-                      if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp'))]
+        image_files = []
+        for f in sorted(os.listdir(directory_path)):
+            if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.npy')):
+                image_files.append(os.path.join(directory_path, f))
+            elif is_segment_file(f):
+                # 原始 Bayer 帧归档中的每一帧（无损，读取时才去马赛克）
+                segment = os.path.join(directory_path, f)
+                image_files.extend(member_path(segment, name) for name in open_archive(segment).names())
         total_files = len(image_files)
         print(f"Found {total_files} images")
         
-        for i, image_file in enumerate(image_files, 1):
-            print(f"[{i}/{total_files}] Processing: {image_file}")
-            image_path = os.path.join(directory_path, image_file)
+        for i, image_path in enumerate(image_files, 1):
+            print(f"[{i}/{total_files}] Processing: {frame_stem(image_path)}")
             result = process_image(image_path, background, image_type, debug=(i==1))
             
             if result["success"]:
@@ -6,6 +6,7 @@ This module provides basic functionality for reading and processing images.
 import cv2
 import numpy as np
 import os
+import pickle
 
 def read_image(file_path):
     """Read an image file and return it as a numpy array."""
@@ -51,3 +52,51 @@ def read_folder_images(folder_path, extensions=('.jpg', '.jpeg', '.png', '.bmp')
                 print(f"Error reading image {file_name}: {str(e)}")
                 
     return images
+
+def save_pickle_to_file(data, file_path):
+    """Save data to a pickle file."""
+    with open(file_path, 'wb') as f:
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+def load_pickle_from_file(file_path):
+    """Load data from a pickle file."""
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"Pickle file not found: {file_path}")
+    with open(file_path, 'rb') as f:
+        return pickle.load(f)
+
+def load_dict_from_file(file_path):
+    """
+    Load a feature dictionary saved by save_data_txt.
+    Prefers the columnar feature store, then the pickle, then parses the txt.
+    Returns an empty dict if none of them exists.
+    """
+    import feature_store
+    if feature_store.has_feature_store(file_path):
+        return feature_store.load_features(file_path)
+    pickle_path = file_path + ".pickle"
+    if os.path.exists(pickle_path):
+        return load_pickle_from_file(pickle_path)
+    if not os.path.exists(file_path):
+        return {}
+    from zsh_methods import parse_txt_to_dict
+    return parse_txt_to_dict(file_path)
+
+def flat_values(data, key):
+    """Return all particle values of a key as one float64 array (feature store or dict of lists)."""
+    value = data[key]
+    values = getattr(value, "values", None)
+    if isinstance(values, np.ndarray):
+        return values
+    if len(value) > 0 and isinstance(value[0], (list, tuple, np.ndarray)):
+        return np.fromiter((v for sub in value for v in sub), dtype=np.float64)
+    return np.asarray(value, dtype=np.float64)
+
+def image_lengths(data, key):
+    """Return the number of particles of each image for a key (feature store or dict of lists)."""
+    value = data[key]
+    if hasattr(value, "lengths"):
+        return value.lengths()
+    if len(value) > 0 and isinstance(value[0], (list, tuple, np.ndarray)):
+        return np.fromiter((len(v) for v in value), dtype=np.int64, count=len(value))
+    return np.ones(len(value), dtype=np.int64)
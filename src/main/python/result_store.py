@@ -0,0 +1,327 @@
+"""
+实验图片处理结果存储
+
+以前每张图片处理完写一个 temp_single_result_<时间戳>.json，实验结束时再逐个解析、
+整合成 processing_results.json 并删除临时文件，图片多时很慢，程序中途崩溃则结果全部丢失。
+这里改为 SQLite（WAL 模式）追加写入，分析进程/线程各自打开连接，结果到达即写入：
+    sessions    每次实验一条记录
+    results     每张图片一条记录（只追加，分析先于图片保存完成时保存后更正一次图片路径）
+    summary     每次实验、每种图片类型的 totalImages/successfulImages/totalParticles，随结果写入同一事务中递增
+实验结束时关闭会话，并导出 processing_results.json（界面的图片处理页面仍读取该文件），运行中也可以随时查询已有结果。
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+
+from utils.image_paths import frame_stem
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+DEFAULT_STORE_PATH = os.path.join(RESULTS_DIR, "results.db")
+# 实验结束时导出的结果文件（Electron 的 read-processing-results 读取）
+PROCESSING_RESULTS_PATH = os.path.join(RESULTS_DIR, "processing_results.json")
+IMAGE_TYPES = ("global", "local")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at TEXT NOT NULL,
+    finished_at TEXT,
+    base_path TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id INTEGER NOT NULL,
+    image_type TEXT NOT NULL,
+    image_path TEXT,
+    group_number INTEGER,
+    original_path TEXT,
+    classified_path TEXT,
+    segmented_path TEXT,
+    contours_count INTEGER NOT NULL DEFAULT 0,
+    grade_statistics TEXT,
+    success INTEGER NOT NULL,
+    timestamp TEXT,
+    processing_id TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_results_session ON results (session_id, image_type, id);
+CREATE INDEX IF NOT EXISTS idx_results_group ON results (session_id, group_number, id);
+CREATE TABLE IF NOT EXISTS summary (
+    session_id INTEGER NOT NULL,
+    image_type TEXT NOT NULL,
+    total_images INTEGER NOT NULL DEFAULT 0,
+    successful_images INTEGER NOT NULL DEFAULT 0,
+    total_particles INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (session_id, image_type)
+);
+"""
+
+_RESULT_COLUMNS = ("id", "session_id", "image_type", "image_path", "group_number", "original_path",
+                   "classified_path", "segmented_path", "contours_count", "grade_statistics", "success", "timestamp",
+                   "processing_id")
+
+# 实验图片按 <组号>_<照片号>.jpg 命名
+_GROUP_PATTERN = re.compile(r"^(\d+)_\d+")
+
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _empty_summary():
+    return {"totalImages": 0, "successfulImages": 0, "totalParticles": 0}
+
+
+def group_number_of(image_path):
+    """从图片文件名 <组号>_<照片号>（归档帧为帧名称）中取出组号，无法解析时返回 None"""
+    if not image_path:
+        return None
+    match = _GROUP_PATTERN.match(frame_stem(image_path))
+    return int(match.group(1)) if match else None
+
+
+class ResultStore:
+    """
+    追加写入的结果存储，同一进程内各线程使用各自的连接，可在多个进程中同时打开
+    """
+
+    def __init__(self, path=None, timeout=30.0):
+        """
+        :param path: 数据库文件路径，None 使用 results/results.db
+        :param timeout: 数据库被其他进程锁定时的等待秒数
+        """
+        self.path = path or DEFAULT_STORE_PATH
+        self.timeout = timeout
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        """当前线程的连接（进程 fork 后重新连接）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def close(self):
+        """关闭当前线程的连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def start_session(self, base_path=None):
+        """
+        开始一次实验
+        :param base_path: 实验图片保存路径
+        :return: 会话编号
+        """
+        with self._connect() as conn:
+            cursor = conn.execute("INSERT INTO sessions (started_at, base_path) VALUES (?, ?)", (_now(), base_path))
+            return cursor.lastrowid
+
+    def finish_session(self, session_id):
+        """结束一次实验"""
+        with self._connect() as conn:
+            conn.execute("UPDATE sessions SET finished_at = ? WHERE id = ?", (_now(), session_id))
+
+    def latest_session_id(self):
+        """最近一次实验的会话编号，没有时返回 None"""
+        row = self._connect().execute("SELECT MAX(id) FROM sessions").fetchone()
+        return row[0]
+
+    def session(self, session_id):
+        """会话信息"""
+        row = self._connect().execute("SELECT * FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def add_result(self, session_id, result):
+        """
+        追加一张图片的处理结果，并在同一事务中更新汇总统计
+        :param session_id: 会话编号
+        :param result: 单张图片结果字典（image_type、image_path、contours_count、grade_statistics、success 等）
+        :return: 结果编号
+        """
+        image_type = result.get("image_type", "unknown")
+        success = bool(result.get("success", False))
+        contours_count = int(result.get("contours_count", 0) or 0)
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO results (session_id, image_type, image_path, group_number, original_path, classified_path, "
+                "segmented_path, contours_count, grade_statistics, success, timestamp, processing_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (session_id, image_type, result.get("image_path"), group_number_of(result.get("image_path")),
+                 result.get("original_path"), result.get("classified_path"), result.get("segmented_path"),
+                 contours_count,
+                 json.dumps(result.get("grade_statistics", []), ensure_ascii=False), int(success),
+                 result.get("timestamp") or _now(), result.get("processing_id")))
+            conn.execute(
+                "INSERT INTO summary (session_id, image_type, total_images, successful_images, total_particles) "
+                "VALUES (?, ?, 1, ?, ?) "
+                "ON CONFLICT (session_id, image_type) DO UPDATE SET "
+                "total_images = total_images + 1, "
+                "successful_images = successful_images + excluded.successful_images, "
+                "total_particles = total_particles + excluded.total_particles",
+                (session_id, image_type, int(success), contours_count if success else 0))
+            return cursor.lastrowid
+
+    def update_image_path(self, result_id, image_path):
+        """
+        更正结果的图片路径（分析先于图片保存完成时，结果先按预计路径写入）
+        :param result_id: 结果编号
+        :param image_path: 实际保存路径
+        """
+        with self._connect() as conn:
+            conn.execute("UPDATE results SET image_path = ?, group_number = ? WHERE id = ?",
+                         (image_path, group_number_of(image_path), result_id))
+
+    def summary(self, session_id=None):
+        """
+        汇总统计，格式与 processing_results.json 的 summaryStats 一致
+        :param session_id: 会话编号，None 为最近一次实验
+        """
+        if session_id is None:
+            session_id = self.latest_session_id()
+        stats = {image_type: _empty_summary() for image_type in IMAGE_TYPES}
+        rows = self._connect().execute(
+            "SELECT image_type, total_images, successful_images, total_particles FROM summary WHERE session_id = ?",
+            (session_id,))
+        for row in rows:
+            stats[row["image_type"]] = {
+                "totalImages": row["total_images"],
+                "successfulImages": row["successful_images"],
+                "totalParticles": row["total_particles"],
+            }
+        return stats
+
+    def result(self, result_id):
+        """按编号查询单条结果，不存在时返回 None"""
+        row = self._connect().execute("SELECT * FROM results WHERE id = ?", (result_id,)).fetchone()
+        return self._row_to_result(row) if row is not None else None
+
+    @staticmethod
+    def _filters(session_id, image_type, group, after_id):
+        """结果查询的 WHERE 子句和参数"""
+        where = "session_id = ?"
+        params = [session_id]
+        if image_type is not None:
+            where += " AND image_type = ?"
+            params.append(image_type)
+        if group is not None:
+            where += " AND group_number = ?"
+            params.append(group)
+        if after_id is not None:
+            where += " AND id > ?"
+            params.append(after_id)
+        return where, params
+
+    def results(self, session_id=None, image_type=None, after_id=None, limit=None, offset=0, group=None):
+        """
+        查询处理结果（按写入顺序）
+        :param session_id: 会话编号，None 为最近一次实验
+        :param image_type: global/local，None 为全部
+        :param after_id: 只返回编号大于该值的结果，用于增量获取
+        :param limit: 最多返回条数，None 不限制
+        :param offset: 跳过的条数
+        :param group: 组号，None 为全部
+        :return: 结果字典列表
+        """
+        if session_id is None:
+            session_id = self.latest_session_id()
+        where, params = self._filters(session_id, image_type, group, after_id)
+        query = f"SELECT * FROM results WHERE {where} ORDER BY id LIMIT ? OFFSET ?"
+        params += [-1 if limit is None else limit, offset]
+        return [self._row_to_result(row) for row in self._connect().execute(query, params)]
+
+    def count_results(self, session_id=None, image_type=None, after_id=None, group=None):
+        """符合条件的结果数量，参数同 results"""
+        if session_id is None:
+            session_id = self.latest_session_id()
+        where, params = self._filters(session_id, image_type, group, after_id)
+        return self._connect().execute(f"SELECT COUNT(*) FROM results WHERE {where}", params).fetchone()[0]
+
+    def version(self, session_id=None):
+        """
+        会话数据的版本标识，结果只追加（图片路径在保存完成、推送事件前更正一次），最大结果编号和结束时间不变即数据未变
+        :return: (会话编号, 最大结果编号, 结束时间)
+        """
+        if session_id is None:
+            session_id = self.latest_session_id()
+        last_id = self._connect().execute(
+            "SELECT MAX(id) FROM results WHERE session_id = ?", (session_id,)).fetchone()[0]
+        session = self.session(session_id) or {}
+        return session_id, last_id or 0, session.get("finished_at")
+
+    @staticmethod
+    def _row_to_result(row):
+        result = {key: row[key] for key in _RESULT_COLUMNS}
+        result["grade_statistics"] = json.loads(row["grade_statistics"]) if row["grade_statistics"] else []
+        result["success"] = bool(row["success"])
+        return result
+
+    def consolidated(self, session_id=None):
+        """
+        按 processing_results.json 的格式返回一次实验的全部结果，global/local 列表只包含处理成功的图片
+        （与原来整合临时结果文件时相同），失败的图片只计入 summaryStats
+        :param session_id: 会话编号，None 为最近一次实验
+        """
+        if session_id is None:
+            session_id = self.latest_session_id()
+        consolidated = {image_type: [] for image_type in IMAGE_TYPES}
+        sessions = []
+        for result in self.results(session_id):
+            if result["image_type"] in consolidated and result["success"]:
+                consolidated[result["image_type"]].append({
+                    "image_path": result["image_path"],
+                    "original_path": result["original_path"],
+                    "classified_path": result["classified_path"],
+                    "segmented_path": result["segmented_path"],
+                    "contours_count": result["contours_count"],
+                    "grade_statistics": result["grade_statistics"],
+                    "success": result["success"],
+                })
+            sessions.append({
+                "processing_id": result["processing_id"] or "unknown",
+                "timestamp": result["timestamp"] or "unknown",
+                "file_type": "single",
+            })
+        session = self.session(session_id) or {}
+        consolidated["timestamp"] = session.get("finished_at") or _now()
+        consolidated["processing_sessions"] = sessions
+        consolidated["summaryStats"] = self.summary(session_id)
+        return consolidated
+
+    def export_json(self, file_path, session_id=None):
+        """将一次实验的结果导出为 processing_results.json 格式的文件"""
+        with open(file_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.consolidated(session_id), f, indent=2, ensure_ascii=False)
+        os.replace(file_path + ".tmp", file_path)
+        return file_path
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_result_store(path=None):
+    """按路径共享的 ResultStore 实例（进程内）"""
+    path = os.path.abspath(path or DEFAULT_STORE_PATH)
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = ResultStore(path)
+            _stores[path] = store
+        return store
+
+
+def has_result_store(path=None):
+    """结果数据库是否存在"""
+    return os.path.exists(path or DEFAULT_STORE_PATH)
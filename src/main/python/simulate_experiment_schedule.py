@@ -0,0 +1,127 @@
+"""
+实验阶段调度模拟：按阶段依赖调度 vs 原顺序执行
+
+用法：
+    python simulate_experiment_schedule.py [--groups N] [--scale S] [--no-overlap-feeding]
+
+各阶段用 sleep 模拟，耗时取自 execute_process 中的实际等待时间（拍照、给料称量按经验值估计），
+--scale 按比例缩短所有耗时以便快速运行。同时检查共享执行机构没有被两个阶段同时使用。
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+# 添加项目根目录到路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.insert(0, current_dir)
+
+from control.experiment_scheduler import (ExperimentScheduler, schedule_group, group_cycle_time, GROUP_PHASES,
+                                          PHASE_RESOURCES)
+
+# 各阶段耗时（秒）
+PHASE_SECONDS = {
+    "prepare": 1.0 + 3.0,  # 舵机转到给料位置 1 秒 + 给料称量（0.1 克约 3 秒）
+    "dump": 1.5,  # 下料翻转
+    "reset": 2.0,  # 舵机复位
+    "spread": 0.3 + 2.0 + 0.3,  # 等待给料稳定 + 向左振动
+    "photos": 5.0 + 5 * (0.5 + 0.6 + 0.5 + 1.0),  # 初始振动 + 5 次（振动、停止、等待、拍照约 1 秒）
+    "clean": 1.0 + 0.2 + 0.5 + 3.5 + 0.2 + 0.2 + 0.2,  # 阀门打开、关闭序列
+    "settle": 8.0,  # 清砂后等待
+}
+
+
+class ResourceMonitor:
+    """记录执行机构的占用，发现两个阶段同时使用同一执行机构时记录冲突"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._owners = {}
+        self.conflicts = []
+
+    def enter(self, name, resources):
+        with self._lock:
+            for resource in resources:
+                if resource in self._owners:
+                    self.conflicts.append((resource, self._owners[resource], name))
+                self._owners[resource] = name
+
+    def leave(self, resources):
+        with self._lock:
+            for resource in resources:
+                self._owners.pop(resource, None)
+
+
+def make_actions(group, scale, monitor):
+    def action(phase_name):
+        def run():
+            name = f"{group}.{phase_name}"
+            monitor.enter(name, PHASE_RESOURCES[phase_name])
+            try:
+                time.sleep(PHASE_SECONDS[phase_name] * scale)
+            finally:
+                monitor.leave(PHASE_RESOURCES[phase_name])
+            return True
+        return run
+
+    return {phase_name: action(phase_name) for phase_name in GROUP_PHASES}
+
+
+def run_sequential(groups, scale):
+    """原顺序执行：每组各阶段依次完成"""
+    monitor = ResourceMonitor()
+    cycles = []
+    for group in range(1, groups + 1):
+        start = time.time()
+        actions = make_actions(group, scale, monitor)
+        for phase_name in GROUP_PHASES:
+            actions[phase_name]()
+        cycles.append(time.time() - start)
+    return cycles, monitor
+
+
+def run_scheduled(groups, scale, overlap_feeding):
+    """按阶段依赖调度，与 execute_process 相同：同时最多两组在进行"""
+    monitor = ResourceMonitor()
+    scheduler = ExperimentScheduler()
+    cycles = []
+    before = previous = None
+    for group in range(1, groups + 1):
+        phases = schedule_group(scheduler, group, make_actions(group, scale, monitor), previous, overlap_feeding)
+        if previous is not None:
+            previous["settle"].wait()
+            cycles.append(group_cycle_time(previous, before))
+        before, previous = previous, phases
+    scheduler.wait_all()
+    cycles.append(group_cycle_time(previous, before))
+    return cycles, monitor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="实验阶段调度模拟")
+    parser.add_argument("--groups", type=int, default=5, help="模拟的组数")
+    parser.add_argument("--scale", type=float, default=0.05, help="耗时缩放比例")
+    parser.add_argument("--no-overlap-feeding", action="store_true", help="给料称量不与上一组清砂等待重叠")
+    args = parser.parse_args()
+
+    sequential, _ = run_sequential(args.groups, args.scale)
+    scheduled, monitor = run_scheduled(args.groups, args.scale, not args.no_overlap_feeding)
+
+    seq_mean = sum(sequential) / len(sequential) / args.scale
+    # 第一组没有可重叠的上一组，稳态周期取第二组以后
+    steady = scheduled[1:] or scheduled
+    sched_mean = sum(steady) / len(steady) / args.scale
+    print(f"组数: {args.groups}, 耗时缩放: {args.scale}")
+    print(f"顺序执行   每组周期: {seq_mean:.2f} 秒, 总耗时: {sum(sequential) / args.scale:.2f} 秒")
+    print(f"阶段调度   每组周期: {sched_mean:.2f} 秒, 总耗时: {sum(scheduled) / args.scale:.2f} 秒")
+    print(f"每组周期缩短: {(1 - sched_mean / seq_mean) * 100:.1f}%")
+    if monitor.conflicts:
+        print(f"执行机构冲突: {monitor.conflicts}")
+    else:
+        print("执行机构无冲突")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+设备 I/O 执行器
+
+API 的 async 端点直接调用串口、Modbus 时会阻塞事件循环，一个设备响应慢，其他请求（包括状态轮询）都要等待。
+这里为每个物理设备建立一个串行执行的工作线程：同一设备的操作按提交顺序逐个执行，不同设备之间互不影响；
+端点 await 执行结果，超过超时时间返回错误，排队的操作数达到上限时直接拒绝。
+"""
+import asyncio
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+# 物理设备
+PLC = "plc"  # 振动盘控制台（WGD，Modbus TCP）
+SCALE = "scale"  # 电子秤/传感器（COM5，Modbus RTU）
+SERVO = "servo"  # 舵机控制板（COM7）
+IO_SOCKET = "io_socket"  # 有人 USR-IO 设备（socket）
+
+DEVICES = (PLC, SCALE, SERVO, IO_SOCKET)
+
+# 每个设备最多排队（含执行中）的操作数
+DEFAULT_MAX_QUEUE = 8
+# 默认超时时间（秒）
+DEFAULT_TIMEOUT = 10.0
+
+# 未指定超时时间时使用执行器的默认值
+_USE_DEFAULT = object()
+
+
+class DeviceBusyError(Exception):
+    """设备排队的操作已满"""
+
+
+class DeviceTimeoutError(Exception):
+    """设备操作超时"""
+
+
+class DeviceExecutor:
+    """
+    单个设备的串行执行器，可在任意线程和事件循环中提交操作
+    """
+
+    def __init__(self, name, max_queue=DEFAULT_MAX_QUEUE, timeout=DEFAULT_TIMEOUT):
+        """
+        :param name: 设备名称
+        :param max_queue: 最多排队（含执行中）的操作数
+        :param timeout: 默认超时时间（秒），None 表示一直等待
+        """
+        self.name = name
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._slots = threading.BoundedSemaphore(max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self._pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def _ensure_worker(self):
+        """首次提交时启动工作线程（持有 self._lock）"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._worker, name=f"device-{self.name}", daemon=True)
+            self._thread.start()
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            future, func, args, kwargs = item
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        result = func(*args, **kwargs)
+                    except BaseException as e:
+                        future.set_exception(e)
+                        with self._lock:
+                            self.failed += 1
+                    else:
+                        future.set_result(result)
+                        with self._lock:
+                            self.completed += 1
+            finally:
+                with self._lock:
+                    self._pending -= 1
+                self._slots.release()
+
+    def submit(self, func, *args, **kwargs):
+        """
+        提交一个操作，不等待执行结果
+        :return: concurrent.futures.Future
+        :raises DeviceBusyError: 排队的操作已满
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise DeviceBusyError(f"设备 {self.name} 忙，已有 {self.max_queue} 个操作在排队")
+        future = Future()
+        with self._lock:
+            if self._closed:
+                self._slots.release()
+                raise RuntimeError(f"设备 {self.name} 的执行器已关闭")
+            self._ensure_worker()
+            self._pending += 1
+            self._queue.put((future, func, args, kwargs))
+        return future
+
+    def _timeout(self, timeout):
+        return self.timeout if timeout is _USE_DEFAULT else timeout
+
+    def call(self, func, *args, timeout=_USE_DEFAULT, **kwargs):
+        """
+        在设备线程中执行操作并等待结果（供普通线程使用）
+        :param timeout: 超时时间（秒），不传使用默认值，None 表示一直等待
+        :raises DeviceBusyError: 排队的操作已满
+        :raises DeviceTimeoutError: 等待超时（已开始的操作无法中断，会在设备线程中继续执行完）
+        """
+        future = self.submit(func, *args, **kwargs)
+        timeout = self._timeout(timeout)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            self._on_timeout(future, timeout)
+
+    async def run(self, func, *args, timeout=_USE_DEFAULT, **kwargs):
+        """
+        在设备线程中执行操作，在事件循环中等待结果，参数同 call
+        """
+        future = self.submit(func, *args, **kwargs)
+        timeout = self._timeout(timeout)
+        try:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+        except asyncio.TimeoutError:
+            self._on_timeout(future, timeout)
+
+    def _on_timeout(self, future, timeout):
+        # 还在排队的操作直接取消，已开始的只能等它结束
+        future.cancel()
+        with self._lock:
+            self.timed_out += 1
+        raise DeviceTimeoutError(f"设备 {self.name} 操作超时（{timeout} 秒）")
+
+    def pending(self):
+        """排队（含执行中）的操作数"""
+        with self._lock:
+            return self._pending
+
+    def stats(self):
+        """执行器状态"""
+        with self._lock:
+            return {
+                "pending": self._pending,
+                "max_queue": self.max_queue,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+            }
+
+    def shutdown(self, wait=False):
+        """关闭执行器，已排队的操作执行完后工作线程退出"""
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+            if thread is not None:
+                self._queue.put(None)
+        if wait and thread is not None:
+            thread.join()
+
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def get_device_executor(name, max_queue=DEFAULT_MAX_QUEUE, timeout=DEFAULT_TIMEOUT):
+    """按设备名称共享的执行器（进程内），参数只在首次创建时生效"""
+    with _executors_lock:
+        executor = _executors.get(name)
+        if executor is None:
+            executor = DeviceExecutor(name, max_queue, timeout)
+            _executors[name] = executor
+        return executor
+
+
+async def run_on_device(name, func, *args, timeout=_USE_DEFAULT, **kwargs):
+    """在指定设备的执行器中执行操作并等待结果"""
+    return await get_device_executor(name).run(func, *args, timeout=timeout, **kwargs)
+
+
+def device_stats():
+    """所有已创建执行器的状态"""
+    with _executors_lock:
+        executors = dict(_executors)
+    return {name: executor.stats() for name, executor in executors.items()}
+
+
+def shutdown_device_executors(wait=False):
+    """关闭所有执行器"""
+    with _executors_lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait)
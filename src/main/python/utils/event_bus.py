@@ -0,0 +1,118 @@
+import asyncio
+import itertools
+import json
+import threading
+import time
+from collections import deque
+
+# 事件类型
+PHOTO_CAPTURED = "photo_captured"  # 拍照完成
+IMAGE_ANALYZED = "image_analyzed"  # 单张图片分析完成（含级配统计）
+CLEAN_COMPLETED = "clean_completed"  # 清砂循环完成
+EXPERIMENT_STARTED = "experiment_started"  # 实验开始
+EXPERIMENT_FINISHED = "experiment_finished"  # 实验结束
+ERROR = "error"  # 出错
+
+
+class EventBus:
+    """
+    进程内事件总线：实验流程、分析回调等任意线程发布事件，
+    API 的异步订阅者（SSE 连接）各自从自己的队列中读取。
+    保留最近的事件，断线重连时可按 Last-Event-ID 补发。
+    """
+
+    def __init__(self, history_size=500, queue_size=1000):
+        """
+        :param history_size: 保留的最近事件数量
+        :param queue_size: 每个订阅者最多积压的事件数量，超过时丢弃最旧的事件
+        """
+        self._ids = itertools.count(1)
+        self._history = deque(maxlen=history_size)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self.queue_size = queue_size
+
+    def publish(self, event_type, **data):
+        """
+        发布事件，可在任意线程中调用
+        :param event_type: 事件类型
+        :param data: 事件数据，需可 JSON 序列化
+        :return: 事件字典
+        """
+        with self._lock:
+            event = {"id": next(self._ids), "type": event_type, "time": time.time(), "data": data}
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+        for loop, event_queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._put, event_queue, event)
+            except RuntimeError:
+                # 订阅者的事件循环已关闭
+                self._discard((loop, event_queue))
+        return event
+
+    @staticmethod
+    def _put(event_queue, event):
+        if event_queue.full():
+            event_queue.get_nowait()
+        event_queue.put_nowait(event)
+
+    def _discard(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def history(self, after_id=0):
+        """编号大于 after_id 的历史事件"""
+        with self._lock:
+            return [event for event in self._history if event["id"] > after_id]
+
+    async def subscribe(self, after_id=None, event_types=None, heartbeat=None):
+        """
+        异步订阅事件（在事件循环中使用）
+        :param after_id: 先补发编号大于该值的历史事件，None 时只接收新事件
+        :param event_types: 只接收这些类型的事件，None 为全部
+        :param heartbeat: 超过该秒数没有事件时产生 None，用于发送心跳，None 时一直等待
+        :return: 异步生成器，逐个产生事件字典
+        """
+        loop = asyncio.get_running_loop()
+        event_queue = asyncio.Queue(maxsize=self.queue_size)
+        subscriber = (loop, event_queue)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            backlog = [event for event in self._history if after_id is not None and event["id"] > after_id]
+        try:
+            for event in backlog:
+                if event_types is None or event["type"] in event_types:
+                    yield event
+            last_id = backlog[-1]["id"] if backlog else 0
+            while True:
+                try:
+                    event = await asyncio.wait_for(event_queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if event["id"] <= last_id:
+                    continue
+                if event_types is None or event["type"] in event_types:
+                    yield event
+        finally:
+            self._discard(subscriber)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+
+def format_sse(event):
+    """将事件编码为 Server-Sent Events 消息"""
+    payload = json.dumps({"type": event["type"], "time": event["time"], **event["data"]}, ensure_ascii=False)
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {payload}\n\n"
+
+
+# 全局事件总线
+event_bus = EventBus()
+
+
+def publish(event_type, **data):
+    """向全局事件总线发布事件"""
+    return event_bus.publish(event_type, **data)
@@ -0,0 +1,43 @@
+"""
+图片路径工具
+
+原始帧归档中的一帧用 "<段文件路径>::<帧名称>" 表示（control/frame_archive.py），
+结果存储、图片 API 等只需要拆分路径、取帧名称，不依赖归档读写（mmap、OpenCV），放在这里供各处导入。
+"""
+import os
+
+SEGMENT_PREFIX = "segment_"
+SEGMENT_SUFFIX = ".bayer"
+
+# 归档帧路径中段文件与帧名称的分隔符
+MEMBER_SEPARATOR = "::"
+
+
+def member_path(segment_path, name):
+    """归档中一帧的路径"""
+    return f"{segment_path}{MEMBER_SEPARATOR}{name}"
+
+
+def split_member_path(path):
+    """
+    拆分归档帧路径
+    :return: (段文件路径, 帧名称)，不是归档帧路径时返回 None
+    """
+    if MEMBER_SEPARATOR not in path:
+        return None
+    segment_path, name = path.rsplit(MEMBER_SEPARATOR, 1)
+    if not segment_path.endswith(SEGMENT_SUFFIX):
+        return None
+    return segment_path, name
+
+
+def is_segment_file(filename):
+    return filename.startswith(SEGMENT_PREFIX) and filename.endswith(SEGMENT_SUFFIX)
+
+
+def frame_stem(path):
+    """图片路径对应的帧名称（不含扩展名），归档帧为记录中的名称，用于命名分析结果"""
+    member = split_member_path(path)
+    if member is not None:
+        return member[1]
+    return os.path.splitext(os.path.basename(path))[0]
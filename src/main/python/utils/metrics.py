@@ -0,0 +1,298 @@
+"""
+运行指标（Prometheus 文本格式）
+
+相机保存队列、分析任务、Modbus 往返等内部负载以前没有任何输出，只能等图片积压后才发现。
+这里提供三类指标，在热路径中直接更新（每次更新只有一次加锁和几次算术运算）：
+    Counter    只增不减的计数（拍摄帧数、分析成功/失败数）
+    Gauge      当前值（队列深度、待处理任务数），也可以在导出时由函数计算
+    Histogram  耗时分布（JPEG 编码、Modbus 往返、单张图片处理）
+render() 按 Prometheus 文本格式导出，API 的 /metrics 端点直接返回，无需额外的服务。
+分析进程中的更新用 capture() 收集后随结果返回主进程，再由 apply() 计入主进程的指标。
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+
+# 耗时直方图的默认分桶（秒）
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Modbus 往返时间分桶（秒）
+MODBUS_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0)
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = list(zip(labelnames, key))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Metric:
+    """指标基类，按标签值分别保存"""
+
+    kind = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        try:
+            if len(labels) == len(self.labelnames):
+                return tuple([str(labels[name]) for name in self.labelnames])
+        except KeyError:
+            pass
+        raise ValueError(f"指标 {self.name} 的标签应为 {self.labelnames}，实际为 {tuple(labels)}")
+
+    def _update(self, op, value, labels):
+        # capture() 期间只记录更新，由主进程 apply()
+        buffer = self.registry._buffer()
+        if buffer is not None:
+            buffer.append((self.name, op, labels, value))
+            return
+        self._apply(op, value, self._key(labels))
+
+    def _apply(self, op, value, key):
+        raise NotImplementedError
+
+    def samples(self):
+        """导出的 (后缀, 标签文本, 值) 列表"""
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError("Counter 只能增加")
+        self._update("inc", amount, labels)
+
+    def _apply(self, op, value, key):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        if not values and not self.labelnames:
+            values = {(): 0}
+        return [("_total", _format_labels(self.labelnames, key), value) for key, value in sorted(values.items())]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, registry, name, documentation, labelnames=(), function=None):
+        """
+        :param function: 导出时调用，返回当前值或 {标签值元组: 值}，为空时使用 set/inc/dec 的值
+        """
+        super().__init__(registry, name, documentation, labelnames)
+        self.function = function
+
+    def set(self, value, **labels):
+        self._update("set", value, labels)
+
+    def inc(self, amount=1, **labels):
+        self._update("inc", amount, labels)
+
+    def dec(self, amount=1, **labels):
+        self._update("inc", -amount, labels)
+
+    def _apply(self, op, value, key):
+        with self._lock:
+            self._values[key] = value if op == "set" else self._values.get(key, 0) + value
+
+    def samples(self):
+        if self.function is not None:
+            try:
+                values = self.function()
+            except Exception as e:
+                print(f"计算指标 {self.name} 出错: {str(e)}")
+                return []
+            if not isinstance(values, dict):
+                values = {(): values}
+        else:
+            with self._lock:
+                values = dict(self._values)
+            if not values and not self.labelnames:
+                values = {(): 0}
+        return [("", _format_labels(self.labelnames, key), value) for key, value in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        self._update("observe", value, labels)
+
+    @contextmanager
+    def time(self, **labels):
+        """记录 with 块的耗时（秒）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def timed(self, **labels):
+        """装饰器：记录函数每次调用的耗时"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.time(**labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _apply(self, op, value, key):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # 各分桶（不累计）的计数、最后一个为 +Inf，总和
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        samples = []
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                samples.append(("_bucket", _format_labels(self.labelnames, key, ("le", _format_value(bound))),
+                                cumulative))
+            labels = _format_labels(self.labelnames, key)
+            samples.append(("_sum", labels, total))
+            samples.append(("_count", labels, cumulative))
+        return samples
+
+
+class MetricsRegistry:
+    """
+    进程内的指标集合，可在任意线程中更新
+    """
+
+    def __init__(self, prefix="sand_"):
+        """
+        :param prefix: 指标名称前缀
+        """
+        self.prefix = prefix
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _register(self, metric_class, name, *args, **kwargs):
+        name = self.prefix + name
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_class(self, name, *args, **kwargs)
+            elif not isinstance(metric, metric_class):
+                raise ValueError(f"指标 {name} 已注册为 {metric.kind}")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        """注册（或取得已注册的）计数指标，导出名称带 _total 后缀"""
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=(), function=None):
+        """注册（或取得已注册的）当前值指标"""
+        return self._register(Gauge, name, documentation, labelnames, function=function)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """注册（或取得已注册的）分布指标"""
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def _buffer(self):
+        return getattr(self._local, "buffer", None)
+
+    @contextmanager
+    def capture(self):
+        """
+        收集当前线程在 with 块内的指标更新（分析进程中使用），不计入本进程的指标
+        :return: 更新列表，with 块结束后随结果返回主进程，由 apply() 计入
+        """
+        updates = []
+        self._local.buffer = updates
+        try:
+            yield updates
+        finally:
+            self._local.buffer = None
+
+    def apply(self, updates):
+        """计入其他进程 capture() 收集的指标更新"""
+        for name, op, labels, value in updates or ():
+            with self._lock:
+                metric = self._metrics.get(name)
+            if metric is not None:
+                metric._apply(op, value, metric._key(labels))
+
+    def render(self):
+        """按 Prometheus 文本格式导出全部指标"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, labels, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# 全局指标集合
+registry = MetricsRegistry()
+
+# ---- 相机拍摄与保存 ----
+FRAMES_CAPTURED = registry.counter("camera_frames_captured", "相机拍摄的帧数", ("camera",))
+CAPTURE_ERRORS = registry.counter("camera_capture_errors", "相机取图失败次数", ("camera",))
+GRAB_SECONDS = registry.histogram("camera_grab_seconds", "从相机 SDK 取出一帧并转换为 BGR 的耗时", ("camera",))
+FRAME_RING_OVERFLOWS = registry.counter("camera_frame_ring_overflows", "帧缓冲槽位用完、临时分配内存的次数",
+                                        ("camera",))
+SAVE_QUEUE_DEPTH = registry.gauge("camera_save_queue_depth", "等待保存到磁盘的帧数（CameraControl.image_queues）",
+                                  ("camera",))
+SAVE_QUEUE_WAIT_SECONDS = registry.histogram("camera_save_queue_wait_seconds", "帧在保存队列中等待的时间",
+                                             ("camera",))
+ENCODE_SECONDS = registry.histogram("camera_encode_seconds", "单帧编码（JPEG 等，由保存方式决定）并写入磁盘的耗时",
+                                    ("camera", "backend"))
+FRAMES_SAVED = registry.counter("camera_frames_saved", "保存到磁盘的帧数", ("camera", "result"))
+
+# ---- 图片分析 ----
+PROCESSING_TASKS = registry.gauge("processing_tasks", "本次实验已提交的图片分析任务数（ProcessControl.processing_tasks）")
+ANALYSIS_BACKLOG = registry.gauge("analysis_backlog", "等待分析（排队和处理中）的帧数")
+ANALYSIS_QUEUE_WAIT_SECONDS = registry.histogram("analysis_queue_wait_seconds", "帧从提交到分析进程开始处理的时间")
+ANALYSIS_IMAGE_SECONDS = registry.histogram("analysis_image_seconds", "单张图片颗粒分割与统计的耗时", ("image_type",))
+PICTURES_HANDLE_SECONDS = registry.histogram("pictures_handle_seconds", "pictures_handle 去除重叠颗粒的耗时")
+ANALYSIS_RESULTS = registry.counter("analysis_results", "图片分析结束的任务数", ("result",))
+
+# ---- 设备通信 ----
+MODBUS_REQUEST_SECONDS = registry.histogram("modbus_request_seconds", "Modbus 请求往返时间", ("register",),
+                                            buckets=MODBUS_BUCKETS)
+MODBUS_ERRORS = registry.counter("modbus_errors", "Modbus 请求失败次数", ("register",))
@@ -2,13 +2,26 @@ import time
 import modbus_tk.defines as cst
 
 from utils.socket_utils import valve_controller
+from utils.metrics import MODBUS_REQUEST_SECONDS, MODBUS_ERRORS
+
+
+def write_register(master, address, value):
+    """向 PLC 的单个寄存器写入一个值，记录往返时间"""
+    start = time.perf_counter()
+    try:
+        master.execute(10, cst.WRITE_SINGLE_REGISTER, address, output_value=value)
+    except Exception:
+        MODBUS_ERRORS.inc(register=address)
+        raise
+    finally:
+        MODBUS_REQUEST_SECONDS.observe(time.perf_counter() - start, register=address)
 
 
 def work_handle(master, work_num, values, t=1):
     """发送数据到设备"""
     # work_num: 寄存器地址   output_value: 状态控制0停止，1触发/参数控制：参数值
     #  cst.WRITE_SINGLE_REGISTER  modbus控制向PLC 的某个寄存器写入一个值
-    master.execute(10, cst.WRITE_SINGLE_REGISTER, work_num, output_value=values)
+    write_register(master, work_num, values)
     time.sleep(t)
 
 def triggle_or_save_action(master, addr, t=1):
@@ -0,0 +1,298 @@
+"""
+实验流程计时（span、counter）与 Chrome trace 导出
+
+execute_process 以前只打印零散的耗时（拍照耗时、总耗时），看不出每组实验的时间花在哪里。
+这里记录两类数据：
+    span     一段操作的起止时间（给料、振动、拍照、保存、分析、清砂、固定等待等），按名称统计 p50/p95
+    counter  某一时刻的数值（待保存帧数、待分析帧数等）
+实验期间（start_run ~ finish_run）的记录按 Chrome trace 事件格式保存到 results/traces/trace_<run_id>.json，
+可直接在 chrome://tracing 或 https://ui.perfetto.dev 中打开。
+分析进程中的记录用 capture() 收集后随结果返回主进程，再由 merge() 合并到同一个 trace 中。
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+# trace 文件保存目录（与结果数据库同在后端根目录的 results 下）
+DEFAULT_TRACE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "results", "traces")
+# 单次实验最多保留的事件数，超过后丢弃新事件（统计不受影响）
+MAX_EVENTS = 500000
+# 每个 span 名称保留最近多少次耗时用于统计
+STATS_WINDOW = 500
+
+
+def _now_us():
+    """当前时间（微秒），各进程使用同一时钟，分析进程的记录可直接合并"""
+    return time.time_ns() // 1000
+
+
+def percentile(values, q):
+    """已排序数据的分位数（线性插值），q 取 0~100"""
+    if not values:
+        return None
+    position = (len(values) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+class Tracer:
+    """
+    进程内的计时记录器，可在任意线程中使用
+    """
+
+    def __init__(self, trace_dir=None, max_events=MAX_EVENTS, stats_window=STATS_WINDOW):
+        """
+        :param trace_dir: trace 文件保存目录，None 使用 DEFAULT_TRACE_DIR
+        :param max_events: 单次实验最多保留的事件数
+        :param stats_window: 每个 span 名称保留的耗时个数
+        """
+        self.trace_dir = trace_dir or DEFAULT_TRACE_DIR
+        self.max_events = max_events
+        self.stats_window = stats_window
+        self.run_id = None
+        self.last_trace_path = None
+        self.dropped = 0
+        self._events = []
+        self._named = set()  # 已写入名称元数据的 (pid, tid)
+        self._durations = {}  # span 名称 -> (分类, 最近的耗时（微秒）)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    # ---- 实验记录 ----
+
+    def start_run(self, run_id):
+        """开始记录一次实验，清空上一次的事件"""
+        with self._lock:
+            self.run_id = str(run_id)
+            self._events = []
+            self._named = set()
+            self.dropped = 0
+        self._append(self._process_name_event(os.getpid(), "sand-control"))
+        print(f"开始记录实验计时: {self.run_id}")
+
+    def finish_run(self):
+        """
+        结束记录并写入 trace 文件
+        :return: trace 文件路径，未在记录时返回 None
+        """
+        with self._lock:
+            run_id, events, dropped = self.run_id, self._events, self.dropped
+            self.run_id = None
+            self._events = []
+            self._named = set()
+        if run_id is None:
+            return None
+        path = self.trace_path(run_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        trace = {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"run_id": run_id, "dropped_events": dropped},
+        }
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(trace, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+        self.last_trace_path = path
+        print(f"实验计时已保存到: {path} ({len(events)} 个事件)")
+        return path
+
+    @property
+    def is_recording(self):
+        return self.run_id is not None
+
+    def trace_path(self, run_id):
+        """实验的 trace 文件路径"""
+        safe_id = "".join(c if c.isalnum() or c in "-_" else "_" for c in str(run_id))
+        return os.path.join(self.trace_dir, f"trace_{safe_id}.json")
+
+    def runs(self):
+        """已保存的 trace 文件，按修改时间从新到旧"""
+        if not os.path.isdir(self.trace_dir):
+            return []
+        runs = []
+        for filename in os.listdir(self.trace_dir):
+            if filename.startswith("trace_") and filename.endswith(".json"):
+                stat = os.stat(os.path.join(self.trace_dir, filename))
+                runs.append({"run_id": filename[len("trace_"):-len(".json")], "size": stat.st_size,
+                             "modified": stat.st_mtime})
+        runs.sort(key=lambda run: run["modified"], reverse=True)
+        return runs
+
+    # ---- 记录 ----
+
+    def _append(self, event):
+        # capture() 期间记录到线程自己的缓冲，随分析结果返回主进程
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is not None:
+            buffer.append(event)
+            return
+        with self._lock:
+            if self.run_id is None:
+                return
+            if len(self._events) >= self.max_events:
+                self.dropped += 1
+                return
+            self._events.append(event)
+
+    @staticmethod
+    def _process_name_event(pid, name):
+        return {"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": name}}
+
+    def _name_thread(self, pid, tid):
+        """首次出现的线程写入线程名称元数据"""
+        key = (pid, tid)
+        buffer = getattr(self._local, "buffer", None)
+        named = self._local.named if buffer is not None else self._named
+        if key in named or (buffer is None and self.run_id is None):
+            return
+        named.add(key)
+        self._append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                      "args": {"name": threading.current_thread().name}})
+
+    def _add_duration(self, name, category, duration_us):
+        with self._lock:
+            entry = self._durations.get(name)
+            if entry is None:
+                entry = self._durations[name] = (category, deque(maxlen=self.stats_window))
+            entry[1].append(duration_us)
+
+    def record(self, name, start, duration, category="process", **args):
+        """
+        记录一段已结束的操作
+        :param name: span 名称，相同名称一起统计
+        :param start: 开始时间（time.time() 秒）
+        :param duration: 耗时（秒）
+        :param category: 分类，trace 中可按分类筛选
+        :param args: 附加信息，需可 JSON 序列化
+        """
+        duration_us = max(0, int(duration * 1_000_000))
+        # capture() 期间的耗时由 merge() 计入主进程的统计
+        if getattr(self._local, "buffer", None) is None:
+            self._add_duration(name, category, duration_us)
+        pid, tid = os.getpid(), threading.get_ident()
+        self._name_thread(pid, tid)
+        self._append({"name": name, "cat": category, "ph": "X", "ts": int(start * 1_000_000),
+                      "dur": duration_us, "pid": pid, "tid": tid, "args": args})
+
+    @contextmanager
+    def span(self, name, category="process", **args):
+        """
+        记录 with 块的耗时，出错时在 args 中记录错误
+        :return: args 字典，可在块内补充附加信息
+        """
+        start = _now_us()
+        try:
+            yield args
+        except BaseException as e:
+            args["error"] = str(e) or type(e).__name__
+            raise
+        finally:
+            end = _now_us()
+            self.record(name, start / 1_000_000, (end - start) / 1_000_000, category, **args)
+
+    def traced(self, name=None, category="process"):
+        """装饰器：记录函数每次调用的耗时，name 默认为函数名"""
+        def decorator(func):
+            span_name = name or func.__qualname__
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name, category):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def counter(self, name, category="process", **values):
+        """记录某一时刻的数值，如 counter("analysis.backlog", frames=3)"""
+        pid = os.getpid()
+        self._append({"name": name, "cat": category, "ph": "C", "ts": _now_us(), "pid": pid, "tid": 0,
+                      "args": values})
+
+    # ---- 跨进程 ----
+
+    @contextmanager
+    def capture(self, process_name=None):
+        """
+        收集当前线程在 with 块内的记录（分析进程中使用），不写入本进程的实验记录
+        :param process_name: 进程名称，写入进程名称元数据
+        :return: 事件列表，with 块结束后随结果返回主进程，由 merge() 合并
+        """
+        events = []
+        self._local.buffer = events
+        self._local.named = set()
+        if process_name:
+            events.append(self._process_name_event(os.getpid(), process_name))
+        try:
+            yield events
+        finally:
+            self._local.buffer = None
+            self._local.named = None
+
+    def merge(self, events):
+        """合并其他进程 capture() 收集的记录，span 同时计入统计"""
+        for event in events or ():
+            if event.get("ph") == "X":
+                self._add_duration(event["name"], event.get("cat", "process"), event["dur"])
+            if event.get("ph") == "M":
+                key = (event["pid"], event["tid"], event["name"])
+                with self._lock:
+                    if key in self._named:
+                        continue
+                    self._named.add(key)
+            self._append(event)
+
+    # ---- 统计 ----
+
+    def phase_stats(self):
+        """
+        各 span 最近耗时的统计（毫秒），按 p95 从大到小排列
+        :return: [{"name", "category", "count", "total", "mean", "p50", "p95", "max"}]
+        """
+        with self._lock:
+            durations = {name: (category, sorted(values)) for name, (category, values) in self._durations.items()}
+        stats = []
+        for name, (category, values) in durations.items():
+            if not values:
+                continue
+            stats.append({
+                "name": name,
+                "category": category,
+                "count": len(values),
+                "total": round(sum(values) / 1000, 1),
+                "mean": round(sum(values) / len(values) / 1000, 1),
+                "p50": round(percentile(values, 50) / 1000, 1),
+                "p95": round(percentile(values, 95) / 1000, 1),
+                "max": round(values[-1] / 1000, 1),
+            })
+        stats.sort(key=lambda item: item["p95"], reverse=True)
+        return stats
+
+    def reset_stats(self):
+        """清空耗时统计"""
+        with self._lock:
+            self._durations = {}
+
+
+# 全局计时记录器
+tracer = Tracer()
+
+
+def span(name, category="process", **args):
+    """使用全局记录器记录 with 块的耗时"""
+    return tracer.span(name, category, **args)
+
+
+def counter(name, category="process", **values):
+    """使用全局记录器记录数值"""
+    tracer.counter(name, category, **values)
+
+
+def traced(name=None, category="process"):
+    """使用全局记录器的计时装饰器"""
+    return tracer.traced(name, category)
@@ -1,12 +1,16 @@
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import cv2
 import numpy as np
 from scipy.stats import mode
 
 import image_config
-from background import save_image
+from background import save_image, BackgroundModel
 from  config.default_config import global_mm_per_pixel, local_mm_per_pixel
+from utils.metrics import PICTURES_HANDLE_SECONDS
+from control.frame_archive import read_image
 from zsh_methods import eqEllipticFeretCAD
 
 
@@ -124,19 +128,86 @@ def is_single_particle(contour, mm_per_pixel):
     return False
 
 
+def _block_grid(block_size):
+    """将 block_size 解析为 (行块数, 列块数)，支持整数或 (rows, cols) 元组"""
+    if isinstance(block_size, (tuple, list)):
+        rows, cols = block_size
+    else:
+        rows = cols = block_size
+    return int(rows), int(cols)
+
+
+def blockwise_mode(gray, block_size=8):
+    """
+    用每块的 256 级直方图一次性求出所有小块的众数。
+    按块行处理：每一行块内把像素值偏移到各自块的 256 个桶中，一次 bincount 得到该行所有块的直方图，
+    再取 argmax。argmax 取最小的最大值下标，与 scipy.stats.mode 的并列规则一致。
+    :param gray: uint8 灰度图像
+    :param block_size: 块网格，整数表示 n x n，也可以是 (rows, cols)
+    :return: (modes, block_height, block_width)，modes 形状为 (rows, cols)，dtype 为 uint8
+    """
+    rows, cols = _block_grid(block_size)
+    height, width = gray.shape
+    block_height = height // rows
+    block_width = width // cols
+    modes = np.zeros((rows, cols), dtype=np.uint8)
+    if block_height == 0 or block_width == 0:
+        return modes, block_height, block_width
+
+    # 每个块在 bincount 中占用的桶偏移
+    offsets = (np.arange(cols, dtype=np.intp) * 256)[np.newaxis, :, np.newaxis]
+    for i in range(rows):
+        band = gray[i * block_height:(i + 1) * block_height, :cols * block_width]
+        labels = band.reshape(block_height, cols, block_width) + offsets
+        hist = np.bincount(labels.ravel(), minlength=cols * 256).reshape(cols, 256)
+        modes[i] = hist.argmax(axis=1)
+    return modes, block_height, block_width
+
+
 def blockwise_thresholding(gray, block_size=8):
     """
     将灰度图像分成 block_size x block_size 的小块，
+    计算每一块的众数，并以众数 + 5 作为阈值进行二值化。
+    众数通过分块直方图向量化求得，阈值化通过广播一次完成，结果与 blockwise_thresholding_mode 逐位一致；
+    不能被整除的余下行列与原实现一样保持为 0。
+    :param gray: 灰度图像
+    :param block_size: 块网格，整数表示 n x n，也可以是 (rows, cols)
+    :return: 二值化图像
+    """
+    if gray.dtype != np.uint8:
+        return blockwise_thresholding_mode(gray, block_size)
+
+    rows, cols = _block_grid(block_size)
+    modes, block_height, block_width = blockwise_mode(gray, (rows, cols))
+    binary_image = np.zeros_like(gray)
+    if block_height == 0 or block_width == 0:
+        return binary_image
+
+    # 与原实现一致，阈值按 uint8 计算（众数 + 5 溢出时回绕）
+    thresholds = (modes + np.uint8(5))[:, np.newaxis, :, np.newaxis]
+    shape = (rows, block_height, cols, block_width)
+    blocks = gray[:rows * block_height, :cols * block_width].reshape(shape)
+    binary_blocks = binary_image[:rows * block_height, :cols * block_width].reshape(shape)
+    np.multiply(blocks > thresholds, 255, out=binary_blocks, casting='unsafe')
+
+    return binary_image
+
+
+def blockwise_thresholding_mode(gray, block_size=8):
+    """
+    逐块调用 scipy.stats.mode 的原始实现，保留作为 blockwise_thresholding 的对照基准。
+    将灰度图像分成 block_size x block_size 的小块，
     计算每一块的众数，并以众数作为阈值进行二值化，
     最后将这些小块拼接成最终的二值化结果。
     """
+    rows, cols = _block_grid(block_size)
     height, width = gray.shape
-    block_height = height // block_size
-    block_width = width // block_size
+    block_height = height // rows
+    block_width = width // cols
     binary_image = np.zeros_like(gray)
 
-    for i in range(block_size):
-        for j in range(block_size):
+    for i in range(rows):
+        for j in range(cols):
             # 计算每个小块的起始和结束坐标
             start_y = i * block_height
             end_y = (i + 1) * block_height
@@ -170,8 +241,11 @@ def divide_contour(contour, start_index, end_index):
     return contours
 
 
-def split_contour(contour, contours_splited, contour_index, angle_threshold, mm_per_pixel, split_overlapping=True,
-                  is_debug=False):
+def split_contour_recursive(contour, contours_splited, contour_index, angle_threshold, mm_per_pixel,
+                            split_overlapping=True, is_debug=False):
+    """
+    递归逐个凹点处理的原始分割实现，保留作为 split_contours 的对照基准。
+    """
     if len(contour) < 5:
         return
 
@@ -312,34 +386,171 @@ def split_contour(contour, contours_splited, contour_index, angle_threshold, mm_
                                       convex_point_indexes[min_distance_index_2d[1]])
 
     for i in range(len(contours_divided)):
-        split_contour(contours_divided[i], contours_splited, contour_index, angle_threshold, split_overlapping)
+        split_contour_recursive(contours_divided[i], contours_splited, contour_index, angle_threshold,
+                                split_overlapping)
     return
 
 
+def _filter_concave_points(contour, defects, angle_threshold, mm_per_pixel, is_debug=False):
+    """
+    对全部凸缺陷一次性做深度、宽度和夹角筛选，返回满足条件的凹点下标（保持缺陷顺序）
+    """
+    defects = defects.reshape(-1, 4)
+    points = contour.reshape(-1, 2)
+    start = points[defects[:, 0]]
+    end = points[defects[:, 1]]
+    far = points[defects[:, 2]]
+
+    # 凹点的深度以8位定点小数表示，除以256得到浮点值
+    depth = defects[:, 3] / 256.0 * mm_per_pixel
+    chord = start - end
+    distance = np.sqrt(np.add.reduce(chord.astype(np.float64) ** 2, axis=1)) * mm_per_pixel
+
+    # 计算夹角
+    v1 = start - far
+    v2 = end - far
+    dot_product = np.add.reduce(v1 * v2, axis=1)
+    norm_product = (np.sqrt(np.add.reduce(v1.astype(np.float64) ** 2, axis=1)) *
+                    np.sqrt(np.add.reduce(v2.astype(np.float64) ** 2, axis=1)))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        angle = np.degrees(np.arccos(dot_product / norm_product))
+
+    if is_debug:
+        print(fr"深度 {depth}")
+        print(fr"宽度 {distance}")
+        print(fr"角度 {angle}")
+
+    keep = (depth >= 0.075 / 2) & (distance >= 0.075) & (angle < angle_threshold)
+    return defects[keep, 2]
+
+
+def _nearest_pair(contour, convex_point_indexes):
+    """用广播计算凹点两两距离，返回距离最近的两个凹点在列表中的位置"""
+    points = contour.reshape(-1, 2)[convex_point_indexes]
+    diff = points[:, np.newaxis, :] - points[np.newaxis, :, :]
+    distances = np.sqrt(np.add.reduce(diff.astype(np.float64) ** 2, axis=2))
+    np.fill_diagonal(distances, 10000000000)
+    return np.unravel_index(np.argmin(distances), distances.shape)
+
+
+def split_contours(contours, angle_threshold, mm_per_pixel, split_overlapping=True, is_debug=False):
+    """
+    分割粘连颗粒，结果与逐个调用 split_contour_recursive 完全一致。
+    用显式栈代替递归（保持深度优先的输出顺序），凸缺陷的深度、宽度、夹角筛选和凹点最近对搜索均为数组运算。
+    :param contours: 待分割的轮廓列表
+    :param angle_threshold: 凹点夹角阈值
+    :param mm_per_pixel: 像素尺寸（mm）
+    :param split_overlapping: 是否分割粘连颗粒，False 时直接丢弃含凹点的轮廓
+    :param is_debug: 是否输出调试信息
+    :return: 分割后的轮廓列表
+    """
+    contours_splited = []
+    # 栈中元素为 (轮廓, mm_per_pixel, split_overlapping)，逆序入栈以保持原有输出顺序
+    stack = [(contour, mm_per_pixel, split_overlapping) for contour in reversed(contours)]
+    while stack:
+        contour, mm, split = stack.pop()
+        if len(contour) < 5:
+            continue
+
+        # 计算最小外接矩形，长宽比过大说明不是石头，最长边小于0.075则去除
+        center, (width, height), angle = cv2.minAreaRect(contour)
+        if width < height:
+            height, width = width, height
+        if height == 0 or width / height > 4.0:
+            continue
+        if width * mm < 0.075:
+            continue
+
+        if is_single_particle(contour, mm):
+            contours_splited.append(contour)
+            continue
+
+        # 判断凹点数量，如果没有两个，无法分割
+        hull = cv2.convexHull(contour, returnPoints=False)
+        if len(hull) < 2:
+            contours_splited.append(contour)
+            continue
+
+        try:
+            defects = cv2.convexityDefects(contour, hull)
+        except Exception:
+            continue
+
+        # 没有凸性缺陷
+        if defects is None:
+            contours_splited.append(contour)
+            continue
+
+        convex_point_indexes = _filter_concave_points(contour, defects, angle_threshold, mm, is_debug)
+
+        # 如果有凹点，但不需要分割，则放弃该轮廓，主要用于单级配提取
+        if len(convex_point_indexes) > 0 and not split:
+            continue
+
+        # 如果只有一个凹点，则不进行切割
+        if len(convex_point_indexes) < 2:
+            contours_splited.append(contour)
+            continue
+
+        # 把距离最近的两个凹点作为分割点
+        i, j = _nearest_pair(contour, convex_point_indexes)
+        if is_debug:
+            print(f"最小值的坐标: {(i, j)}")
+
+        contours_divided = divide_contour(contour, convex_point_indexes[i], convex_point_indexes[j])
+        # 与递归实现一致：子轮廓以 split_overlapping 作为 mm_per_pixel 参数继续分割
+        for child in reversed(contours_divided):
+            stack.append((child, split, True))
+
+    return contours_splited
+
+
+def split_contour(contour, contours_splited, contour_index, angle_threshold, mm_per_pixel, split_overlapping=True,
+                  is_debug=False):
+    """
+    分割单个轮廓，结果追加到 contours_splited，接口与 split_contour_recursive 相同
+    """
+    contours_splited.extend(split_contours([contour], angle_threshold, mm_per_pixel, split_overlapping, is_debug))
+
+
+@PICTURES_HANDLE_SECONDS.timed()
 def pictures_handle(
         input_image_path,
         background_model,
         type=None,
         output_image_path=None,
         split_overlapping=True,
-        is_debug=False):
+        is_debug=False,
+        tile_mode=None):
     """
     去除重叠的砂粒颗粒
     :param input_image_path:
     :param output_image_path:
-    :param input_image_path: 读取图片路径，需加上文件名和扩展名
+    :param input_image_path: 读取图片路径，需加上文件名和扩展名；也可以是原始 Bayer 帧（归档帧 "<段文件>::<帧名称>" 或 .npy），读取时去马赛克
+    :param background_model: 背景模型，BackgroundModel 或 BGR 图像数组
     :param type: 图片类型，1为全局，其他为局部
     :param output_image_path: 输出路径，需要加上文件名和扩展名
+    :param tile_mode: 是否分块并行处理，None 时使用 image_config.tile_mode，调试模式下始终整图处理
     :return:
     """
     # 如果输入是文件路径，则加载图像
     if isinstance(input_image_path, str):
-        image = cv2.imread(input_image_path)
+        image = read_image(input_image_path)
         if image is None:
             raise ValueError("无法加载图像，请检查路径是否正确！")
     else:
         image = input_image_path  # 如果直接传入图像数据，则直接使用
 
+    # 背景模型在进程内只加载一次，按图像尺寸取缓存的缩放版本
+    if isinstance(background_model, BackgroundModel):
+        background_model = background_model.resized(image.shape)
+
+    # 分块并行处理，结果与整图处理一致
+    if (image_config.tile_mode if tile_mode is None else tile_mode) and not is_debug:
+        valid_contours, binary = pictures_handle_tiled(image, background_model, type, split_overlapping)
+        save_filled_contours(image.shape, valid_contours, output_image_path)
+        return valid_contours, binary
+
     # 图像预处理
     if is_debug:
         show_image(image)
@@ -372,13 +583,9 @@ def pictures_handle(
         save_image(image, r"C:\Users\ASUS\Desktop\test\erzhihua.jpg")
 
     # type =1 全部，= 局部
-    if type == 1:
-        # 形态学操作
-        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, image_config.global_ksize)
-        opening = cv2.morphologyEx(binary, cv2.MORPH_OPEN, kernel, iterations=image_config.global_iterations)
-    else:
-        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, image_config.local_ksize)
-        opening = cv2.morphologyEx(binary, cv2.MORPH_OPEN, kernel, iterations=image_config.local_iterations)
+    # 形态学操作
+    kernel, iterations = morphology_params(type)
+    opening = cv2.morphologyEx(binary, cv2.MORPH_OPEN, kernel, iterations=iterations)
 
     if is_debug:
         show_image(image)
@@ -386,18 +593,12 @@ def pictures_handle(
     # 提取轮廓
     contours, _ = cv2.findContours(opening, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     image_height, image_width = image.shape[:2]
-    valid_contours = []
     boundary_contours = []
 
     # 设置角度，夹角检测是否为粘连颗粒
-    if type == 1:
-        angle_k = image_config.global_angle_k
-    else:
-        angle_k = image_config.local_angle_k
-
-    mm_per_pixel = global_mm_per_pixel if type == 1 else local_mm_per_pixel
+    angle_k, mm_per_pixel = split_params(type)
 
-    contour_index = 0
+    inner_contours = []
     for i in range(len(contours)):
         if is_debug:
             print(fr"contour {input_image_path}    {i}")
@@ -407,24 +608,194 @@ def pictures_handle(
         if x == 0 or y == 0 or x + w >= image_width or y + h >= image_height:
             boundary_contours.append(contour)
             continue
+        inner_contours.append(contour)
 
-        split_contour(contour, valid_contours, contour_index, angle_k, mm_per_pixel, split_overlapping, is_debug)
+    # 所有内部轮廓放入同一个工作栈中分割
+    valid_contours = split_contours(inner_contours, angle_k, mm_per_pixel, split_overlapping, is_debug)
 
-    filled_image = np.zeros_like(image)
-    cv2.drawContours(filled_image, valid_contours, -1, (255, 255, 255), thickness=cv2.FILLED)
-    # cv2.drawContours(filled_image, boundary_contours, -1, (0, 0, 0), thickness=cv2.FILLED)
-    #
+    save_filled_contours(image.shape, valid_contours, output_image_path)
+
+    return valid_contours, binary
+
+
+def morphology_params(type):
+    """形态学开运算的核与迭代次数，type=1 为全局，其他为局部"""
+    if type == 1:
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, image_config.global_ksize)
+        return kernel, image_config.global_iterations
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, image_config.local_ksize)
+    return kernel, image_config.local_iterations
+
+
+def split_params(type):
+    """粘连颗粒分割的夹角阈值与像素尺寸，type=1 为全局，其他为局部"""
+    if type == 1:
+        return image_config.global_angle_k, global_mm_per_pixel
+    return image_config.local_angle_k, local_mm_per_pixel
+
+
+def save_filled_contours(image_shape, valid_contours, output_image_path):
+    """将分割后的轮廓填充绘制并保存，output_image_path 为 None 时不绘制"""
     # 保存二值化轮廓图像，能够正常使用的
-    if output_image_path is not None:
-        # 获取完整路径
-        full_path = os.path.join(output_image_path)
-        #
-        # 创建目录（如果不存在）
-        os.makedirs(os.path.dirname(full_path), exist_ok=True)
-        #
-        # 保存图像
-        cv2.imwrite(full_path, filled_image)
-        print('保存成功：', full_path)
+    if output_image_path is None:
+        return
+    filled_image = np.zeros(image_shape, dtype=np.uint8)
+    cv2.drawContours(filled_image, valid_contours, -1, (255, 255, 255), thickness=cv2.FILLED)
+    # 获取完整路径
+    full_path = os.path.join(output_image_path)
+    # 创建目录（如果不存在）
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    # 保存图像
+    cv2.imwrite(full_path, filled_image)
+    print('保存成功：', full_path)
+
+
+_tile_executor = None
+_tile_executor_workers = 0
+_tile_executor_lock = threading.Lock()
+
+
+def _get_tile_executor():
+    """
+    分块处理共用的线程池（OpenCV 运算会释放 GIL）
+    :return: (线程池, 线程数)
+    """
+    global _tile_executor, _tile_executor_workers
+    workers = image_config.tile_workers or os.cpu_count() or 4
+    with _tile_executor_lock:
+        if _tile_executor is None or _tile_executor_workers != workers:
+            # 线程数改变时不关闭旧线程池：其他线程可能刚取到它还未提交分块，关闭后提交会报错。
+            # 旧线程池不再被引用后，其工作线程在已提交的分块完成后自行退出
+            _tile_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tile")
+            _tile_executor_workers = workers
+        return _tile_executor, _tile_executor_workers
+
+
+def _tile_grid(height, width, tile_size):
+    """按 tile_size（整数或 (高, 宽)）划分的分块核心区域列表 [(y0, y1, x0, x1), ...]"""
+    tile_height, tile_width = tile_size if isinstance(tile_size, (tuple, list)) else (tile_size, tile_size)
+    return [(y0, min(y0 + tile_height, height), x0, min(x0 + tile_width, width))
+            for y0 in range(0, height, tile_height)
+            for x0 in range(0, width, tile_width)]
+
+
+def _outer_background(opening):
+    """与图像外框4连通的背景区域，用于判断轮廓在整图中是否为最外层轮廓"""
+    padded = cv2.copyMakeBorder(opening, 1, 1, 1, 1, cv2.BORDER_CONSTANT, value=0)
+    cv2.floodFill(padded, None, (0, 0), 128, flags=4)
+    return padded[1:-1, 1:-1] == 128
+
+
+def pictures_handle_tiled(image, background_model, type=None, split_overlapping=True):
+    """
+    分块并行版本的 pictures_handle 主体，返回的颗粒轮廓（包括顺序）与整图处理一致。
+    预处理按行带、开运算按带光晕的分块、轮廓提取按带重叠的分块在线程池中执行：
+    每个轮廓只由其起点（最上最左像素）所在分块保留；碰到分块接缝被截断的轮廓由整图轮廓补齐；
+    被截断轮廓所在分块中的轮廓再用外部背景判断是否嵌套在其他颗粒的孔洞中。
+    :param image: BGR 图像
+    :param background_model: 与图像同尺寸的背景
+    :param type: 图片类型，1为全局，其他为局部
+    :param split_overlapping: 是否分割粘连颗粒
+    :return: (valid_contours, binary)
+    """
+    executor, workers = _get_tile_executor()
+    image_height, image_width = image.shape[:2]
+
+    # 背景差分、灰度化、线性对比度增强均为逐像素运算，按行带并行
+    gray = np.empty((image_height, image_width), dtype=np.uint8)
+    band = -(-image_height // workers)
+
+    def preprocess(y0):
+        y1 = min(y0 + band, image_height)
+        diff = cv2.absdiff(image[y0:y1], background_model[y0:y1])
+        gray[y0:y1] = enhance_contrast_linear_transform(cv2.cvtColor(diff, cv2.COLOR_BGR2GRAY), alpha=0.4, beta=5)
+
+    list(executor.map(preprocess, range(0, image_height, band)))
+
+    # 分块阈值依赖全图的块网格，整图计算（已向量化）
+    binary = blockwise_thresholding(gray, block_size=8)
+
+    # 开运算：每个分块带上足够的光晕，核心区域结果与整图一致
+    kernel, iterations = morphology_params(type)
+    halo = 2 * iterations * (max(kernel.shape) // 2) + 1
+    tiles = _tile_grid(image_height, image_width, image_config.tile_size)
+    opening = np.empty_like(binary)
+
+    def open_tile(tile):
+        y0, y1, x0, x1 = tile
+        wy0, wy1 = max(y0 - halo, 0), min(y1 + halo, image_height)
+        wx0, wx1 = max(x0 - halo, 0), min(x1 + halo, image_width)
+        opened = cv2.morphologyEx(binary[wy0:wy1, wx0:wx1], cv2.MORPH_OPEN, kernel, iterations=iterations)
+        opening[y0:y1, x0:x1] = opened[y0 - wy0:y1 - wy0, x0 - wx0:x1 - wx0]
+
+    list(executor.map(open_tile, tiles))
+
+    # 轮廓提取：窗口为分块核心加上重叠区域
+    overlap = image_config.tile_overlap
+
+    def find_tile_contours(tile):
+        y0, y1, x0, x1 = tile
+        wy0, wy1 = max(y0 - overlap, 0), min(y1 + overlap, image_height)
+        wx0, wx1 = max(x0 - overlap, 0), min(x1 + overlap, image_width)
+        window = np.ascontiguousarray(opening[wy0:wy1, wx0:wx1])
+        contours, _ = cv2.findContours(window, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=(wx0, wy0))
+        kept = []
+        truncated = False
+        needs_full = False
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            start_x, start_y = contour[0, 0]
+            owned = y0 <= start_y < y1 and x0 <= start_x < x1
+            # 边界不完整颗粒（与整图处理的判断相同）
+            on_border = x == 0 or y == 0 or x + w >= image_width or y + h >= image_height
+            # 碰到窗口内部边缘（非图像边缘）的轮廓被截断
+            if ((x == wx0 and wx0 > 0) or (y == wy0 and wy0 > 0)
+                    or (x + w == wx1 and wx1 < image_width) or (y + h == wy1 and wy1 < image_height)):
+                truncated = True
+                needs_full = needs_full or (owned and not on_border)
+                continue
+            if owned and not on_border:
+                kept.append(contour)
+        return kept, truncated, needs_full
+
+    tile_results = list(executor.map(find_tile_contours, tiles))
+
+    full_contours = None
+    outer = None
+    inner_contours = []
+    for tile, (kept, truncated, needs_full) in zip(tiles, tile_results):
+        if needs_full:
+            # 颗粒大于重叠区域时，该分块的轮廓改用整图轮廓
+            if full_contours is None:
+                full_contours, _ = cv2.findContours(opening, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            y0, y1, x0, x1 = tile
+            for contour in full_contours:
+                start_x, start_y = contour[0, 0]
+                if not (y0 <= start_y < y1 and x0 <= start_x < x1):
+                    continue
+                x, y, w, h = cv2.boundingRect(contour)
+                if x == 0 or y == 0 or x + w >= image_width or y + h >= image_height:
+                    continue
+                inner_contours.append(contour)
+            continue
+        if truncated and kept:
+            # 被截断的颗粒可能包围了本分块中的轮廓，起点上方的像素不属于外部背景则为嵌套轮廓
+            if outer is None:
+                outer = _outer_background(opening)
+            kept = [contour for contour in kept if outer[contour[0, 0, 1] - 1, contour[0, 0, 0]]]
+        inner_contours.extend(kept)
+
+    # 按整图 findContours 的顺序（起点自下而上、自右向左）排列
+    inner_contours.sort(key=lambda contour: (int(contour[0, 0, 1]), int(contour[0, 0, 0])), reverse=True)
+
+    # 粘连颗粒分割：按顺序分组并行，拼接后顺序不变
+    angle_k, mm_per_pixel = split_params(type)
+    chunk = max(1, -(-len(inner_contours) // (workers * 4)))
+    chunks = [inner_contours[i:i + chunk] for i in range(0, len(inner_contours), chunk)]
+    valid_contours = []
+    for splited in executor.map(lambda contours: split_contours(contours, angle_k, mm_per_pixel, split_overlapping),
+                                chunks):
+        valid_contours.extend(splited)
 
     return valid_contours, binary
 
@@ -253,19 +253,14 @@ def calculate_mean_and_variance_origin(show_figure=True):
             distributions.append([0, 0, 0])
             continue
 
+        # 所有图片的颗粒值拼接为一维数组（特征存储直接内存映射读取）
+        values = reader.flat_values(data, prop)
         if show_figure:
-            datas.append([item for sublist in data[prop] for item in sublist])
-
-        sum = 0
-        cout = 0
-        varianceSum=0
-        for i in range(0,len(data[prop])):
-            sum += np.sum(data[prop][i])
-            cout += len(data[prop][i])
-        mean = sum/cout
-        for i in range(0,len(data[prop])):
-            varianceSum += np.sum((x - mean)**2 for x in data[prop][i])
-        variance = varianceSum/cout
+            datas.append(values.tolist())
+
+        cout = len(values)
+        mean = np.sum(values)/cout
+        variance = np.sum((values - mean)**2)/cout
         distributions.append([mean, math.sqrt(variance),cout])
 
     return distributions
@@ -623,27 +618,10 @@ def get_calibration_factors(particle_size):
     
     return calibration_factors[particle_size]
 
-def transform_contour_by_affine(contour, view_from="global", view_to="local"):
+def affine_scale(view_from="global", view_to="local"):
     """
-    使用仿射变换将轮廓从一个视图转换到另一个视图
-    
-    参数:
-    ----
-    contour: np.ndarray - 轮廓点集
-    view_from: str - 源视图类型，"global"或"local"
-    view_to: str - 目标视图类型，"global"或"local"
-    
-    返回:
-    ----
-    transformed_contour: np.ndarray - 变换后的轮廓
+    计算视图之间仿射变换的 X、Y 轴缩放比例
     """
-    import cv2
-    import numpy as np
-    
-    # 如果源视图和目标视图相同，则不需要转换
-    if view_from == view_to or contour is None or len(contour) < 5:
-        return contour
-    
     # 图像物理范围和分辨率参数
     # 局部相机参数
     A1, B1 = 38, 26      # 局部物理范围（mm）
@@ -661,20 +639,52 @@ def transform_contour_by_affine(contour, view_from="global", view_to="local"):
     if view_from == "local" and view_to == "global":
         scale_x = 1.0 / scale_x
         scale_y = 1.0 / scale_y
-    
-    # 拟合当前椭圆以获取中心点
+    return scale_x, scale_y
+
+
+def affine_center(contour):
+    """
+    仿射变换的缩放中心：拟合椭圆的中心，无法拟合时依次退化为质心、边界框中心
+    """
     try:
         ellipse = cv2.fitEllipse(contour)
-        center = ellipse[0]
+        return ellipse[0]
     except:
         # 如果无法拟合椭圆，使用轮廓的质心
         M = cv2.moments(contour)
         if M["m00"] != 0:
-            center = (M["m10"] / M["m00"], M["m01"] / M["m00"])
-        else:
-            # 如果无法计算质心，使用轮廓的边界框中心
-            x, y, w, h = cv2.boundingRect(contour)
-            center = (x + w/2, y + h/2)
+            return (M["m10"] / M["m00"], M["m01"] / M["m00"])
+        # 如果无法计算质心，使用轮廓的边界框中心
+        x, y, w, h = cv2.boundingRect(contour)
+        return (x + w/2, y + h/2)
+
+
+def transform_contour_by_affine(contour, view_from="global", view_to="local"):
+    """
+    使用仿射变换将轮廓从一个视图转换到另一个视图
+    
+    参数:
+    ----
+    contour: np.ndarray - 轮廓点集
+    view_from: str - 源视图类型，"global"或"local"
+    view_to: str - 目标视图类型，"global"或"local"
+    
+    返回:
+    ----
+    transformed_contour: np.ndarray - 变换后的轮廓
+    """
+    import cv2
+    import numpy as np
+    
+    # 如果源视图和目标视图相同，则不需要转换
+    if view_from == view_to or contour is None or len(contour) < 5:
+        return contour
+    
+    # 计算缩放比例
+    scale_x, scale_y = affine_scale(view_from, view_to)
+    
+    # 拟合当前椭圆以获取中心点
+    center = affine_center(contour)
     
     # 构建仿射变换矩阵（以椭圆中心为中心缩放）
     M = np.array([
@@ -688,3 +698,110 @@ def transform_contour_by_affine(contour, view_from="global", view_to="local"):
     return transformed_contour
 
 
+def _polygon_terms(points, starts, lengths):
+    """
+    拼接后的全部轮廓点的多边形叉积项 x_i*y_{i+1} - x_{i+1}*y_i（每个轮廓首尾相连）
+    """
+    next_index = np.arange(1, len(points) + 1)
+    next_index[starts + lengths - 1] = starts
+    x = points[:, 0].astype(np.float64)
+    y = points[:, 1].astype(np.float64)
+    return x, y, next_index, x * y[next_index] - x[next_index] * y
+
+
+def transform_points_by_affine(points, contour_index, contours, view_from="global", view_to="local"):
+    """
+    对拼接后的全部轮廓点做仿射变换，结果与逐个调用 transform_contour_by_affine 一致
+    :param points: (N, 2) int32，所有轮廓点拼接
+    :param contour_index: (N,) 每个点所属的轮廓序号
+    :param contours: 轮廓列表，用于拟合各轮廓的缩放中心
+    :return: (N, 2) int32 变换后的点
+    """
+    if view_from == view_to or len(points) == 0:
+        return points
+
+    scale_x, scale_y = affine_scale(view_from, view_to)
+    # 少于5个点的轮廓不做变换
+    centers = np.array([affine_center(c) if len(c) >= 5 else (np.nan, np.nan) for c in contours],
+                       dtype=np.float64).reshape(-1, 2)
+    keep = np.isnan(centers[:, 0])
+
+    # 与 cv2.transform 相同：float32 的变换矩阵元素，双精度计算后四舍六入五成双
+    m00 = np.float64(np.float32(scale_x))
+    m11 = np.float64(np.float32(scale_y))
+    m02 = (centers[:, 0] * (1 - scale_x)).astype(np.float32).astype(np.float64)
+    m12 = (centers[:, 1] * (1 - scale_y)).astype(np.float32).astype(np.float64)
+    transformed = np.empty_like(points)
+    transformed[:, 0] = np.rint(points[:, 0] * m00 + m02[contour_index])
+    transformed[:, 1] = np.rint(points[:, 1] * m11 + m12[contour_index])
+
+    unchanged = keep[contour_index]
+    transformed[unchanged] = points[unchanged]
+    return transformed
+
+
+def extract_features_batch(contours, view_from="local", view_to="local", expansion=0.5):
+    """
+    批量计算一张图片全部轮廓的颗粒特征，结果与逐个调用
+    transform_contour_by_affine、eqEllipticFeretCAD、expand_area 一致。
+    仿射变换、45度外扩半个像素和面积计算对所有轮廓点一次性向量化完成。
+    :param contours: 轮廓列表
+    :param view_from: 轮廓所在视图，"global"或"local"
+    :param view_to: 特征计算所在视图，不同于 view_from 时先做仿射变换
+    :param expansion: 外扩像素
+    :return: 列式特征字典 {
+        'short': 等效椭圆短轴, 'long': 等效椭圆长轴, 'area': 外扩后面积,
+        'centroid': (n, 2) 原始轮廓质心, 'angle': 等效椭圆角度
+    }，无法拟合椭圆的轮廓 short/long/angle 为 nan
+    """
+    count = len(contours)
+    features = {
+        'short': np.full(count, np.nan),
+        'long': np.full(count, np.nan),
+        'area': np.zeros(count),
+        'centroid': np.zeros((count, 2)),
+        'angle': np.full(count, np.nan),
+    }
+    if count == 0:
+        return features
+
+    lengths = np.array([len(c) for c in contours], dtype=np.intp)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    contour_index = np.repeat(np.arange(count), lengths)
+    points = np.concatenate([c.reshape(-1, 2) for c in contours]).astype(np.int32, copy=False)
+
+    # 原始轮廓的多边形质心，面积为0时取点的均值
+    x, y, next_index, cross = _polygon_terms(points, starts, lengths)
+    area2 = np.add.reduceat(cross, starts)
+    sum_x = np.add.reduceat((x + x[next_index]) * cross, starts)
+    sum_y = np.add.reduceat((y + y[next_index]) * cross, starts)
+    mean_x = np.add.reduceat(x, starts) / lengths
+    mean_y = np.add.reduceat(y, starts) / lengths
+    with np.errstate(divide='ignore', invalid='ignore'):
+        features['centroid'][:, 0] = np.where(area2 != 0, sum_x / (3 * area2), mean_x)
+        features['centroid'][:, 1] = np.where(area2 != 0, sum_y / (3 * area2), mean_y)
+
+    # 转换到目标视图
+    points = transform_points_by_affine(points, contour_index, contours, view_from, view_to)
+    transformed = np.split(points.reshape(-1, 1, 2), starts[1:])
+
+    # 等效椭圆和外扩中心仍需逐轮廓调用 OpenCV
+    centers = np.zeros((count, 2), dtype=np.float64)
+    for i, cnt in enumerate(transformed):
+        try:
+            minor_axis, major_axis, angle = eqEllipticFeretCAD(cnt, get_angle=True)
+            features['short'][i] = minor_axis
+            features['long'][i] = major_axis
+            features['angle'][i] = angle
+        except cv2.error:
+            pass
+        M = cv2.moments(cnt)
+        if M["m00"] != 0:
+            centers[i] = (int(M["m10"] / M["m00"]), int(M["m01"] / M["m00"]))
+
+    # 沿45度方向外扩半个像素点，int 截断与 expand_contour 一致
+    delta = points - centers[contour_index]
+    expanded = (points + expansion * np.sign(delta)).astype(np.int32)
+    _, _, _, cross = _polygon_terms(expanded, starts, lengths)
+    features['area'] = np.abs(np.add.reduceat(cross, starts)) / 2.0
+    return features
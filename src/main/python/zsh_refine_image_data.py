@@ -6,6 +6,7 @@ import functools
 import datetime  # 添加导入datetime模块用于获取时间戳
 
 import cv2
+import numpy as np
 from concurrent.futures import ProcessPoolExecutor, as_completed
 from multiprocessing import cpu_count
 
@@ -13,9 +14,11 @@ import image_config
 import zsh_methods
 from zsh_image_handle import pictures_handle
 from reader import save_pickle_to_file
+from feature_store import save_features
 from config.default_config import main_gradeNames, main_data_path, main_view, main_volume_corrections, main_LABELS, \
     main_input_image_path, background_path
-from background import read_backgrounds_single, read_backgrounds_mixture
+from background import read_backgrounds_single, read_backgrounds_mixture, SharedBackgrounds, \
+    attach_shared_backgrounds, get_shared_background
 
 """
 级配计算保存结果，保存到txt中
@@ -32,14 +35,15 @@ def get_background_model_key(view, sample):
     return f"{view}_s{sample}"
 
 
-def save_data_txt(file_path, data, name, type=None, save_pickle=True):
+def save_data_txt(file_path, data, name, type=None, save_pickle=True, save_text=True):
     """
-    保存计算结果到txt中
+    保存计算结果，同时写入列式特征存储 {name}.features（读取见 feature_store / reader.load_dict_from_file）
     :param file_path: 文件路径，需指明存储的结果路径, 相对路径
     :param data: 字典数据
     :param name: 保存文件名,不需加上扩展名
     :param type如果不是将结果保存到result目录下，可以传入，然后自定义相对路径
     :param save_pickle: 是否同时保存pickle文件
+    :param save_text: 是否同时保存txt文本
     :return:
     """
     dirs = os.path.join(zsh_methods.get_project_path(), "result")
@@ -57,10 +61,14 @@ def save_data_txt(file_path, data, name, type=None, save_pickle=True):
 
     filename = f"{file_path}/{name}.txt"
 
+    # 列式特征存储，按图片分段保存，可内存映射读取
+    save_features(filename, data)
+
     # 以追加模式打开文件，一次写入所有数据以减少IO操作
-    with open(filename, 'a', encoding='utf-8') as f:
-        for key, value in data.items():  # 使用 items() 方法迭代字典
-            f.write(f'{key}: {str(value)}\n')  # 将每个键值对的数据写入文件，并换行
+    if save_text:
+        with open(filename, 'a', encoding='utf-8') as f:
+            for key, value in data.items():  # 使用 items() 方法迭代字典
+                f.write(f'{key}: {str(value)}\n')  # 将每个键值对的数据写入文件，并换行
 
     # 只在需要时保存pickle文件
     if save_pickle:
@@ -108,67 +116,34 @@ def get_background_model(view, sample, background_models):
 def process_single_image(args):
     """处理单张图片并返回结果"""
     try:
-        image_path, image_name, sample, view, background_models, is_mixture, threshold = args
+        image_path, image_name, sample, view, background_key, split_flag, threshold = args
         full_image_path = os.path.join(image_path, image_name)
 
         print(full_image_path)
-        # 使用修改后的方式获取背景模型
-        # background_model = get_background_model(view, sample, background_models)
-
-        contours, binary = pictures_handle(full_image_path)
+        # 背景模型由进程池初始化时从共享内存挂载，任务参数中只携带键
+        background_model = get_shared_background(background_key)
 
-        # 预分配列表，避免动态扩展
-        short_temp = []
-        long_temp = []
-        area_temp = []
+        contours, binary = pictures_handle(full_image_path, background_model, 1 if view == "global" else 2,
+                                           split_overlapping=split_flag)
 
         # 只为有效轮廓分配内存
         valid_contours = [contour for contour in contours if len(contour) > 5]
 
-        # 批量处理轮廓
-        for contour in valid_contours:
-            # 如果是全局视图，先对轮廓进行仿射变换转换为局部视图
-            if view == "global":
-                # 使用仿射变换方法转换轮廓
-                transformed_contour = zsh_methods.transform_contour_by_affine(contour, view_from="global", view_to="local")
-                
-                # 对变换后的轮廓计算几何特征
-                short, long = zsh_methods.eqEllipticFeretCAD(transformed_contour)
-                area = zsh_methods.expand_area(transformed_contour)
-            else:
-                # 为局部视图轮廓计算几何特征
-                short, long = zsh_methods.eqEllipticFeretCAD(contour)
-                area = zsh_methods.expand_area(contour)
-                
-            if math.isnan(short):
-                continue
-
-            if short == float('inf'):
-                continue
-
-            if short < 2:
-                continue
+        # 批量计算几何特征，全局视图的轮廓先经仿射变换转换为局部视图
+        features = zsh_methods.extract_features_batch(valid_contours, view_from=view, view_to="local")
+        short = features['short']
+        long = features['long']
+        area = features['area']
 
-            # 确保无论是否有阈值筛选，都将三个值一起添加或不添加
+        # 去除 nan、inf 和过小的颗粒，三个特征始终同时保留或同时去除
+        with np.errstate(invalid='ignore'):
+            mask = ~np.isnan(short) & (short != float('inf')) & (short >= 2)
             if threshold is not None:
-                if short >= threshold[0] and long <= threshold[1]:
-                    short_temp.append(short)
-                    long_temp.append(long)
-                    area_temp.append(area)
-            else:
-                short_temp.append(short)
-                long_temp.append(long)
-                area_temp.append(area)
-
-        # 添加长度校验，确保三个列表长度一致
-        if len(short_temp) != len(area_temp) or len(long_temp) != len(area_temp):
-            print(
-                f"警告：图片 {image_name} 的特征列表长度不一致! short:{len(short_temp)}, long:{len(long_temp)}, area:{len(area_temp)}")
-            # 确保三个列表长度相同，取最小长度
-            min_len = min(len(short_temp), len(long_temp), len(area_temp))
-            short_temp = short_temp[:min_len]
-            long_temp = long_temp[:min_len]
-            area_temp = area_temp[:min_len]
+                mask &= (short >= threshold[0]) & (long <= threshold[1])
+
+        short_temp = short[mask].tolist()
+        long_temp = long[mask].tolist()
+        area_temp = area[mask].tolist()
 
         return short_temp, long_temp, area_temp
 
@@ -342,7 +317,8 @@ def process_single_data(base_path, output_root, step, background_models):
         threshold = local_threshold[diameter_index]
 
     # 准备处理参数
-    args_list = [(base_path, f"{img}.png", diameter, view, background_models, image_config.single_split, threshold) for
+    background_key = f"{view}_s{diameter}"
+    args_list = [(base_path, f"{img}.png", diameter, view, background_key, image_config.single_split, threshold) for
                  img in valid_images]
 
     # 批量处理参数，减少进程创建和通信开销
@@ -355,7 +331,10 @@ def process_single_data(base_path, output_root, step, background_models):
     max_workers = min(32, cpu_count() + 4)
 
     # 使用并行处理和进度跟踪
-    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+    # 背景图片只放入共享内存一次，工作进程在初始化时只读挂载
+    with SharedBackgrounds(background_models) as shared_backgrounds, \
+            ProcessPoolExecutor(max_workers=max_workers, initializer=attach_shared_backgrounds,
+                                initargs=(shared_backgrounds.specs,)) as executor:
         # 提交所有批次任务
         if batch_size > 1:
             futures = [executor.submit(process_image_batch, batch) for batch in batched_args]
@@ -517,7 +496,7 @@ def process_mixture_data(base_path, output_root, step, background_models):
             # 确保sample_id是字符串类型
             sample_id_str = str(sample[6:])
             args = (base_path, f"{img}.jpg", sample_id_str, view,
-                    background_models, image_config.mixture_split, None)
+                    f"{view}_s{sample_id_str}", image_config.mixture_split, None)
             args_list.append(args)
         except Exception as e:
             print(f"准备处理参数时出错(图片{img}): {str(e)}")
@@ -534,7 +513,10 @@ def process_mixture_data(base_path, output_root, step, background_models):
     print(f"开始处理混合级配数据，使用{max_workers}个并行进程...")
 
     # 并行处理图片，增加进程数并使用进度跟踪
-    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+    # 背景图片只放入共享内存一次，工作进程在初始化时只读挂载
+    with SharedBackgrounds(background_models) as shared_backgrounds, \
+            ProcessPoolExecutor(max_workers=max_workers, initializer=attach_shared_backgrounds,
+                                initargs=(shared_backgrounds.specs,)) as executor:
         # 提交所有批次任务
         if batch_size > 1:
             futures = [executor.submit(process_image_batch, batch) for batch in batched_args]
@@ -7,7 +7,7 @@ import numpy as np
 from matplotlib.pyplot import contour
 
 import image_config
-from background import read_backgrounds_mixture, read_backgrounds_single
+from background import load_view_background
 from zsh_image_handle import pictures_handle, split_contour
 # from zsh_image_handle_copy import pictures_handle
 # from zsh_image_handle import pictures_handle, show_image, calculate_shape_factor, split_contour
@@ -36,12 +36,8 @@ def process_sand_images(image_path,sample_index, start_index, num_images, output
 
     view_type = "global" if is_global else "local"
 
-    if is_single == False:
-        background_models = read_backgrounds_mixture(background_path)
-        background_model = background_models[f"{view_type}_s{sample_index}"]
-    else:
-        background_models = read_backgrounds_single(background_path)
-        background_model = background_models[f"{view_type}_s{sample_index}"]
+    # 单级配和混合级配都使用 G1.bmp / L1.bmp 作为背景，进程内只加载一次
+    background_model = load_view_background(background_path, view_type)
 
     # 检查输出路径是否存在
     if not output_path.exists():
@@ -64,6 +64,41 @@ export const getSystemMonitor = async () => {
   }
 }
 
+// 实验事件推送（Server-Sent Events）
+export const EVENT_TYPES = [
+  'photo_captured',
+  'image_analyzed',
+  'clean_completed',
+  'experiment_started',
+  'experiment_finished',
+  'error'
+]
+
+/**
+ * 订阅实验事件推送，断线后浏览器自动重连并补发缺失的事件
+ * @param {Object} handlers - 按事件类型的处理函数，如 { photo_captured: (data) => {} }
+ * @param {Object} [options] - { types: 只订阅的事件类型数组, onOpen, onError }
+ * @returns {EventSource} 事件源，调用 close() 取消订阅
+ */
+export const subscribeEvents = (handlers = {}, options = {}) => {
+  const types = options.types || Object.keys(handlers)
+  const query = types.length ? `?types=${encodeURIComponent(types.join(','))}` : ''
+  const source = new EventSource(`${API_BASE_URL}/events${query}`)
+  types.forEach((type) => {
+    if (!handlers[type]) return
+    source.addEventListener(type, (event) => {
+      try {
+        handlers[type](JSON.parse(event.data))
+      } catch (error) {
+        console.error(`处理事件 ${type} 失败:`, error)
+      }
+    })
+  })
+  if (options.onOpen) source.onopen = options.onOpen
+  if (options.onError) source.onerror = options.onError
+  return source
+}
+
 export const initializeSystem = async (config) => {
   try {
     const response = await api.post('/initialize', config || {})
@@ -222,10 +257,20 @@ export const getWeight = async () => {
 }
 
 // 图片相关 API
-export const getDirectoryImages = async (directory) => {
+/**
+ * 获取目录中的图片列表
+ * @param {string} directory - 目录路径
+ * @param {Object} [options] - 分页和排序
+ * @param {number} [options.offset] - 跳过的条数
+ * @param {number} [options.limit] - 每页条数，为空时返回全部
+ * @param {string} [options.sort] - name/mtime/size/group
+ * @param {string} [options.order] - asc/desc
+ * @returns {Promise<Object>} { data, total, offset, limit }
+ */
+export const getDirectoryImages = async (directory, options = {}) => {
   try {
     const response = await api.get('/images/list', {
-      params: { directory }
+      params: { directory, ...options }
     })
     return response.data
   } catch (error) {
@@ -234,7 +279,14 @@ export const getDirectoryImages = async (directory) => {
   }
 }
 
-export const getImageUrl = (imagePath) => {
+/**
+ * 构建图片URL
+ * @param {string} imagePath - 图片路径
+ * @param {number} [width] - 缩略图宽度，为空时获取原图
+ * @param {string} [version] - 图片版本（如 /images/list 返回的 modifiedTime），带版本的缩略图可由浏览器长期缓存
+ * @returns {string} 图片URL
+ */
+export const getImageUrl = (imagePath, width, version) => {
   if (!imagePath) {
     console.warn('getImageUrl: imagePath is empty');
     return '';
@@ -250,7 +302,9 @@ export const getImageUrl = (imagePath) => {
       .replace(/\/\.\//g, '/') // 移除 /./
       .replace(/^\.\/?/, ''); // 移除开头的 ./ 或 .
 
-    const url = `${API_BASE_URL}/images/file?path=${encodeURIComponent(cleanPath)}`;
+    const sizeQuery = width ? `&w=${Math.round(width)}` : '';
+    const versionQuery = version ? `&v=${encodeURIComponent(version)}` : '';
+    const url = `${API_BASE_URL}/images/file?path=${encodeURIComponent(cleanPath)}${sizeQuery}${versionQuery}`;
 
     // 只在开发模式下输出调试信息
     if (process.env.NODE_ENV === 'development') {
@@ -284,8 +338,8 @@ export const getProcessingResults = async () => {
   return sandImageApi.getProcessingResults()
 }
 
-export const getSandImageUrl = (imageName) => {
-  return sandImageApi.getSandImageUrl(imageName)
+export const getSandImageUrl = (imageName, width) => {
+  return sandImageApi.getSandImageUrl(imageName, width)
 }
 
 export const analyzeSandData = async (params) => {
@@ -301,6 +355,7 @@ export {
 const API = {
   getSystemStatus,
   getSystemMonitor,
+  subscribeEvents,
   chatWithXfyun,
   testServerConnection,
   initializeSystem,
@@ -24,19 +24,84 @@ export const getProcessingResults = async () => {
   }
 }
 
+/**
+ * 分页获取沙粒图像处理结果
+ * @param {Object} params - 查询参数
+ * @param {string} [params.view] - 视图类型 global/local
+ * @param {number} [params.group] - 组号
+ * @param {number} [params.since] - 只获取编号大于该值的结果（上次返回的 next_since）
+ * @param {number} [params.offset] - 跳过的条数
+ * @param {number} [params.limit] - 每页条数
+ * @param {string} [etag] - 上次响应的 ETag，数据未变化时返回 null
+ * @returns {Promise<{data: Object|null, etag: string}>} 分页结果和新的 ETag
+ */
+export const getResultsPage = async (params = {}, etag = null) => {
+  const response = await axios.get(`${baseURL}/results`, {
+    params,
+    headers: etag ? { 'If-None-Match': etag } : {},
+    validateStatus: (status) => (status >= 200 && status < 300) || status === 304
+  })
+  return {
+    data: response.status === 304 ? null : response.data,
+    etag: response.headers.etag || etag
+  }
+}
+
+/**
+ * 创建增量获取处理结果的轮询器，每次只获取上次之后新增的结果
+ * @param {Object} [filters] - 过滤条件 { view, group }
+ * @param {number} [limit] - 每次最多获取的条数
+ * @returns {{poll: Function, reset: Function}} poll 返回 { items, summaryStats, finished }，无变化时 items 为空
+ */
+export const createResultsPoller = (filters = {}, limit = 200) => {
+  let since = 0
+  let etag = null
+  let sessionId = null
+
+  const poll = async () => {
+    const { data, etag: newEtag } = await getResultsPage({ ...filters, since, limit }, etag)
+    etag = newEtag
+    if (!data) {
+      return { items: [], summaryStats: null, finished: false }
+    }
+    // 开始了新的实验，从头获取
+    if (sessionId !== null && data.session_id !== sessionId) {
+      sessionId = data.session_id
+      since = 0
+      etag = null
+      return poll()
+    }
+    sessionId = data.session_id
+    since = data.next_since
+    return { items: data.items, summaryStats: data.summaryStats, finished: data.finished }
+  }
+
+  const reset = () => {
+    since = 0
+    etag = null
+    sessionId = null
+  }
+
+  return { poll, reset }
+}
+
 /**
  * 获取沙粒图片URL
  * @param {string} filename - 图片文件名
+ * @param {number} [width] - 缩略图宽度，为空时获取原图
  * @returns {string} 图片的完整URL
  */
-export const getSandImageUrl = (filename) => {
+export const getSandImageUrl = (filename, width) => {
   // 统一路径分隔符为正斜杠，适合URL格式
   const normalizedFilename = filename.replace(/\\/g, '/');
+  const sizeQuery = width ? `&w=${Math.round(width)}` : ''
   // 使用正确的API端点 /images/file?path= 而不是 /images/
-  return `${baseURL}/images/file?path=${encodeURIComponent(normalizedFilename)}`
+  return `${baseURL}/images/file?path=${encodeURIComponent(normalizedFilename)}${sizeQuery}`
 }
 
 export default {
   getProcessingResults,
+  getResultsPage,
+  createResultsPoller,
   getSandImageUrl
 }
\ No newline at end of file
@@ -1,5 +1,6 @@
 import { createStore } from 'vuex'
 import axios from 'axios'
+import { EVENT_TYPES } from '../api'
 
 // API基础URL，根据实际情况调整
 const API_BASE_URL = 'http://127.0.0.1:8000'
@@ -19,7 +20,10 @@ export default createStore({
     error: null,
     initializationError: null, // 新增初始化错误状态
     errorType: null, // 新增错误类型
-    statusUpdateInterval: null
+    statusUpdateInterval: null,
+    eventSource: null,
+    lastEvent: null,
+    analyzedImages: []
   },
   getters: {
     isRunning: (state) => state.systemStatus.is_running,
@@ -52,6 +56,32 @@ export default createStore({
     },
     SET_STATUS_UPDATE_INTERVAL(state, interval) {
       state.statusUpdateInterval = interval
+    },
+    SET_EVENT_SOURCE(state, source) {
+      state.eventSource = source
+    },
+    APPLY_EVENT(state, event) {
+      state.lastEvent = event
+      if (event.type === 'photo_captured') {
+        state.systemStatus = {
+          ...state.systemStatus,
+          current_group: event.group,
+          current_photo: event.photo,
+          total_photos: event.total_photos,
+          analysis_backlog: event.backlog
+        }
+      } else if (event.type === 'image_analyzed') {
+        // 只保留最近的分析结果
+        state.analyzedImages = [...state.analyzedImages.slice(-199), event]
+        state.systemStatus = { ...state.systemStatus, analysis_backlog: event.backlog }
+      } else if (event.type === 'experiment_started') {
+        state.analyzedImages = []
+        state.systemStatus = { ...state.systemStatus, is_running: true }
+      } else if (event.type === 'experiment_finished') {
+        state.systemStatus = { ...state.systemStatus, is_running: false }
+      } else if (event.type === 'error') {
+        state.error = event.message
+      }
     }
   },
   actions: {
@@ -98,27 +128,45 @@ export default createStore({
       }
     },
 
-    // 开始状态更新
-    startStatusUpdate({ commit, state }) {
-      if (state.statusUpdateInterval) {
-        clearInterval(state.statusUpdateInterval)
-      }
+    // 开始状态更新：进度通过事件推送实时更新，运行时间等低频字段定时刷新
+    startStatusUpdate({ commit, state, dispatch }) {
+      dispatch('stopStatusUpdate')
 
       const updateStatus = async () => {
         try {
           const response = await axios.get(`${API_BASE_URL}/status`)
-          commit('SET_SYSTEM_STATUS', response.data)
+          commit('SET_SYSTEM_STATUS', { ...state.systemStatus, ...response.data })
         } catch (error) {
           console.error('获取状态更新失败:', error)
         }
       }
 
+      const setPollInterval = (ms) => {
+        if (state.statusUpdateInterval) {
+          clearInterval(state.statusUpdateInterval)
+        }
+        commit('SET_STATUS_UPDATE_INTERVAL', setInterval(updateStatus, ms))
+      }
+
       // 立即更新一次
       updateStatus()
 
-      // 设置定时更新
-      const interval = setInterval(updateStatus, 1000) // 每秒更新一次
-      commit('SET_STATUS_UPDATE_INTERVAL', interval)
+      if (typeof EventSource === 'undefined') {
+        setPollInterval(1000) // 不支持事件推送时每秒轮询
+        return
+      }
+
+      const source = new EventSource(`${API_BASE_URL}/events`)
+      EVENT_TYPES.forEach((type) => {
+        source.addEventListener(type, (event) => {
+          commit('APPLY_EVENT', JSON.parse(event.data))
+        })
+      })
+      // 推送连接正常时低频刷新，断开时恢复每秒轮询直到重连
+      source.onopen = () => setPollInterval(10000)
+      source.onerror = () => setPollInterval(1000)
+      commit('SET_EVENT_SOURCE', source)
+      setPollInterval(10000)
     },
 
     // 停止状态更新
@@ -127,6 +175,10 @@ export default createStore({
         clearInterval(state.statusUpdateInterval)
         commit('SET_STATUS_UPDATE_INTERVAL', null)
       }
+      if (state.eventSource) {
+        state.eventSource.close()
+        commit('SET_EVENT_SOURCE', null)
+      }
     },
 
     // 启动流程时开始状态更新